@@ -25,6 +25,19 @@ class AIPrompt:
 {code}
 
 注意，你只需要给出标题，禁止给出其它多余部分例如“标题：”，禁止给出其它任何解释。
+"""
+
+    @staticmethod
+    def TITLES(contents: list[str], code: bool = False) -> str:
+        """一次性为多段文字或代码生成标题，要求以 JSON 字符串数组返回"""
+
+        task = "使用 2~6 个字概括每段代码对应解法最根本的原理作为其标题" if code else "使用 2~6 个字概括每段文字作为其标题"
+        sections = "\n\n".join(f"【第{i + 1}段】\n{content}" for i, content in enumerate(contents))
+        return f"""{AIPrompt.BASE_ROLE}，现在请你阅读下面的 {len(contents)} 段{"代码" if code else "文字"}，{task}：
+
+{sections}
+
+注意，你只需要输出一个 JSON 字符串数组，按顺序包含恰好 {len(contents)} 个标题，例如 ["标题一", "标题二"]，禁止输出代码块标记，禁止给出其它任何解释。
 """
 
     @staticmethod
@@ -105,10 +118,10 @@ class AIPrompt:
 
 {f"你过往曾经分析过学生的代码风格，可以提供一些参考：{previous_str}" if previous_str else ""}
 
-学生当前的提交记录如下：
+学生自上次分析以来新增或修改的提交记录如下：
 {submission_str}
 
-请你根据以上信息，重新仔细分析学生的代码风格，输出一个简短的分析报告
+请你在过往分析的基础上结合这些新的提交，更新对学生代码风格的分析，输出一个简短的分析报告
 """
 
     @staticmethod
@@ -117,8 +130,8 @@ class AIPrompt:
 
 {f"你过往曾经分析过学生的知识掌握情况，可以提供一些参考：{previous_str}" if previous_str else ""}
 
-学生当前的提交记录如下：
+学生自上次分析以来新增或修改的提交记录如下：
 {submission_str}
 
-请你根据以上信息，重新仔细分析学生的知识掌握情况，输出一个简短的分析报告
+请你在过往分析的基础上结合这些新的提交，更新对学生知识掌握情况的分析，输出一个简短的分析报告
 """
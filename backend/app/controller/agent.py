@@ -8,6 +8,9 @@ from app.models.agent import AIAgent, AIAgentConservation, AIAgentConservationCh
 from app.models.assignment import Assignment
 from app.schemas.agent import AIAgentEvent
 from app.models.ai import AI
+from app.models.ai_budget import AIPromptType
+from app.models.ai_governor import AIPriority
+from app.models.ai_telemetry import AITelemetry
 
 
 class AIAgentController:
@@ -202,7 +205,9 @@ class AIAgentController:
         await cls._get_assignment_or_404(assignment_id)
 
         async def _stream() -> AsyncGenerator[str, None]:
-            async for chunk in AI.get_response_stream(messages):
+            AITelemetry.bind(assignment_id)
+            # 智能体对话依赖上下文与工具结果，不走响应缓存；历史过长时舍弃最早的轮次
+            async for chunk in AI.get_response_stream(messages, use_cache=False, priority=AIPriority.INTERACTIVE, prompt_type=AIPromptType.AGENT):
                 yield chunk
 
         return _stream()
@@ -1,13 +1,19 @@
 import json
+import asyncio
 import logging
 
-from typing import AsyncGenerator
+from typing import AsyncGenerator, Optional, Sequence
 from fastapi import HTTPException
 from tortoise import exceptions as torExceptions
+from tortoise.transactions import in_transaction
 
 from app.models.assignment import Assignment as AssignmentModel, Analysis
-from app.models.ai import AIAnalysisGenerator, Complexity, MatrixAnalysisContent, MatrixAnalysisProps
+from app.models.ai import AIAnalysisGenerator, AIQueue, Complexity, MatrixAnalysisContent, MatrixAnalysisProps
+from app.models.analysis import AIJob
+from app.models.ai_flight import AISingleFlight, content_version
+from app.models.ai_telemetry import AITelemetry
 from app.schemas.assignment import BasicAnalysis, AiGenAnalysis
+from app.schemas.ai import AIJobInfo
 
 import os
 from openai import OpenAI
@@ -15,6 +21,113 @@ from datetime import datetime, timezone
 
 class AIController:
     """用于控制测试相关的AI服务的控制器.由于申请api时间有限，现使用通义千问的统一模型接口进行测试"""
+    # 流式分析类型 -> (Analysis 字段, 事件中的类型标记, 生成器)
+    _STREAMS = {
+        "resolution": ("resolution", "resolution", AIAnalysisGenerator.genResolutionsStream),
+        "knowledge": ("knowledge_analysis", "knowledge", AIAnalysisGenerator.genKnowledgeAnalysisStream),
+        "code": ("code_analysis", "code_analysis", AIAnalysisGenerator.genCodeAnalysisStream),
+        "learning": ("learning_suggestions", "learning", AIAnalysisGenerator.genLearningSuggestionsStream),
+    }
+    _analysis_locks: dict[str, asyncio.Lock] = {}
+
+    @staticmethod
+    def _flight_key(assignment: AssignmentModel, analysis_type: str, *extra_versions) -> tuple[str, str, str]:
+        """合并键：作业、分析类型与内容版本，作业或提交更新后的请求会发起新的生成"""
+        version = content_version(assignment.title, assignment.description, assignment.updated_at, *extra_versions)
+        return assignment.id, analysis_type, version
+
+    @staticmethod
+    def _check_ai_gen_allowed(assignment: AssignmentModel) -> None:
+        """AI 生成分析需要已过截止时间且已提交（assignment 需预取 submissions）"""
+        # 检查截止时间
+        if assignment.end_date:
+            if assignment.end_date.tzinfo is None:
+                end_date_utc = assignment.end_date.replace(tzinfo=timezone.utc)
+            else:
+                end_date_utc = assignment.end_date.astimezone(timezone.utc)
+
+            if end_date_utc > datetime.now(timezone.utc):
+                logging.warning(f"Attempt to access AI analysis before deadline for assignment {assignment.id}")
+                raise HTTPException(status_code=400, detail="Deadline not meet yet")
+
+        # 检查是否已提交作业
+        submited = True if assignment.submissions and assignment.submissions[0] else False
+        if not submited:
+            logging.warning(f"Attempt to access AI analysis without submission for assignment {assignment.id}")
+            raise HTTPException(status_code=403, detail="AI生成分析功能需要在提交作业后才能使用哦~")
+
+    @classmethod
+    async def _save_analysis(cls, assign_id: str, **fields) -> None:
+        """
+        保存分析结果，只更新给定字段
+
+        不同类型的分析可能同时生成，整行保存会用旧值覆盖其它字段；
+        同一作业的写入串行进行，避免并发时重复创建分析记录
+        """
+        lock = cls._analysis_locks.setdefault(assign_id, asyncio.Lock())
+        async with lock:
+            async with in_transaction():
+                analysis = await Analysis.filter(assignment_id=assign_id).first()
+                if analysis is None:
+                    await Analysis.create(assignment_id=assign_id, **fields)
+                else:
+                    await Analysis.filter(id=analysis.id).update(**fields)
+
+    @classmethod
+    async def generateBasic(cls, assign_id: str) -> BasicAnalysis:
+        """生成解题分析与知识点分析并保存"""
+        with AITelemetry.scope(assign_id):
+            resol = await AIAnalysisGenerator.genResolutions(assign_id)
+            knowled = await AIAnalysisGenerator.genKnowledgeAnalysis(assign_id)
+        await cls._save_analysis(
+            assign_id,
+            resolution=resol.model_dump_json(),
+            knowledge_analysis=knowled.model_dump_json()
+        )
+        return BasicAnalysis(
+            resolution=resol,
+            knowledgeAnalysis=knowled
+        )
+
+    @classmethod
+    async def generateAiGen(cls, assign_id: str) -> AiGenAnalysis:
+        """生成代码分析与学习建议并保存"""
+        with AITelemetry.scope(assign_id):
+            codeAnal = await AIAnalysisGenerator.genCodeAnalysis(assign_id)
+            learnSug = await AIAnalysisGenerator.genLearningSuggestions(assign_id)
+        await cls._save_analysis(
+            assign_id,
+            code_analysis=codeAnal.model_dump_json(),
+            learning_suggestions=learnSug.model_dump_json()
+        )
+        return AiGenAnalysis(
+            codeAnalysis=codeAnal,
+            learningSuggestions=learnSug
+        )
+
+    @classmethod
+    async def _sharedBasic(cls, assignment: AssignmentModel) -> BasicAnalysis:
+        """同一作业同一版本的生成只进行一次，其余请求与队列任务等待同一个结果"""
+        return await AISingleFlight.do(cls._flight_key(assignment, "basic"), lambda: cls.generateBasic(assignment.id))
+
+    @classmethod
+    async def _sharedAiGen(cls, assignment: AssignmentModel) -> AiGenAnalysis:
+        """同 _sharedBasic，版本还包含各提交的时间（assignment 需预取 submissions）"""
+        return await AISingleFlight.do(
+            cls._flight_key(assignment, "aiGen", *[sub.submitted_at for sub in assignment.submissions]),
+            lambda: cls.generateAiGen(assignment.id),
+        )
+
+    @classmethod
+    async def _basicJob(cls, assign_id: str) -> BasicAnalysis:
+        """队列任务的处理函数，与 getBasic 合并到同一次生成"""
+        return await cls._sharedBasic(await AssignmentModel.get(id=assign_id))
+
+    @classmethod
+    async def _aiGenJob(cls, assign_id: str) -> AiGenAnalysis:
+        """队列任务的处理函数，与 getAiGen 合并到同一次生成"""
+        return await cls._sharedAiGen(await AssignmentModel.get(id=assign_id).prefetch_related("submissions"))
+
     @classmethod
     async def getBasic(cls, course_id: str, assign_id: str, re_gen: bool = False) -> BasicAnalysis:
         """获取基础分析（解题思路和知识点分析）"""
@@ -69,44 +182,13 @@ class AIController:
             assignment = await AssignmentModel.get(id=assign_id).prefetch_related("analysis")
             analysis = assignment.analysis[0] if assignment.analysis else None
 
-            if re_gen:
-                resol = await AIAnalysisGenerator.genResolutions(assign_id)
-                knowled = await AIAnalysisGenerator.genKnowledgeAnalysis(assign_id)
-                if analysis:
-                    analysis.resolution = resol.model_dump_json()
-                    analysis.knowledge_analysis = knowled.model_dump_json()
-                    await analysis.save()
-                else:
-                    #@todo add to queue instead
-                    analysis = await Analysis.create(
-                        assignment=assignment,
-                        resolution=resol.model_dump_json(),
-                        knowledge_analysis=knowled.model_dump_json()
-                    )
-                    await analysis.save()
-                return BasicAnalysis(
-                    resolution=resol,
-                    knowledgeAnalysis=knowled
-                )
-            elif analysis:
+            if analysis and not re_gen:
                 return BasicAnalysis(
                     resolution=analysis.resolution,
                     knowledgeAnalysis=analysis.knowledge_analysis
                 )
-            else:
-                resol = await AIAnalysisGenerator.genResolutions(assign_id)
-                knowled = await AIAnalysisGenerator.genKnowledgeAnalysis(assign_id)
-                #@todo add to queue instead
-                analysis = await Analysis.create(
-                    assignment=assignment,
-                    resolution=resol.model_dump_json(),
-                    knowledge_analysis=knowled.model_dump_json()
-                )
-                await analysis.save()
-                return BasicAnalysis(
-                    resolution=resol,
-                    knowledgeAnalysis=knowled
-                )
+
+            return await cls._sharedBasic(assignment)
         except torExceptions.DoesNotExist:
             logging.error(f"Assignment with id {assign_id} not found")
             raise HTTPException(status_code=404, detail=f"Assignment with id {assign_id} not found")
@@ -125,22 +207,7 @@ class AIController:
         try:
             assignment = await AssignmentModel.get(id=assign_id).prefetch_related("analysis","submissions")
 
-            # 检查截止时间
-            if assignment.end_date:
-                if assignment.end_date.tzinfo is None:
-                    end_date_utc = assignment.end_date.replace(tzinfo=timezone.utc)
-                else:
-                    end_date_utc = assignment.end_date.astimezone(timezone.utc)
-
-                if end_date_utc > datetime.now(timezone.utc):
-                    logging.warning(f"Attempt to access AI analysis before deadline for assignment {assign_id}")
-                    raise HTTPException(status_code=400, detail="Deadline not meet yet")
-
-            # 检查是否已提交作业
-            submited = True if assignment.submissions and assignment.submissions[0] else False
-            if not submited:
-                logging.warning(f"Attempt to access AI analysis without submission for assignment {assign_id}")
-                raise HTTPException(status_code=403, detail="AI生成分析功能需要在提交作业后才能使用哦~")
+            cls._check_ai_gen_allowed(assignment)
 
             analysis = assignment.analysis[0] if assignment.analysis else None
             if analysis and analysis.code_analysis and analysis.learning_suggestions:
@@ -148,25 +215,8 @@ class AIController:
                     codeAnalysis=analysis.code_analysis,
                     learningSuggestions=analysis.learning_suggestions
                 )
-            else:
-                #@todo add to queue instead
-                codeAnal = await AIAnalysisGenerator.genCodeAnalysis(assign_id)
-                learnSug = await AIAnalysisGenerator.genLearningSuggestions(assign_id)
-                if analysis:
-                    analysis.code_analysis = codeAnal.model_dump_json()
-                    analysis.learning_suggestions = learnSug.model_dump_json()
-                    await analysis.save()
-                else:
-                    analysis = await Analysis.create(
-                        assignment=assignment,
-                        code_analysis=codeAnal.model_dump_json(),
-                        learning_suggestions=learnSug.model_dump_json()
-                    )
-                    await analysis.save()
-                return AiGenAnalysis(
-                    codeAnalysis=codeAnal,
-                    learningSuggestions=learnSug
-                )
+
+            return await cls._sharedAiGen(assignment)
         except HTTPException:
             # 重新抛出 HTTP 异常（业务逻辑异常）
             raise
@@ -181,7 +231,9 @@ class AIController:
             raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
     @classmethod
-    async def getBasicStream(cls, course_id: str, assign_id: str, analysis_type: str) -> AsyncGenerator[str, None]:
+    async def getBasicStream(
+        cls, course_id: str, assign_id: str, analysis_type: str, last_event_id: Optional[str] = None
+    ) -> AsyncGenerator[str, None]:
         """
         流式获取基础分析
 
@@ -189,18 +241,23 @@ class AIController:
             course_id: 课程ID
             assign_id: 作业ID
             analysis_type: 分析类型 (resolution 或 knowledge)
+            last_event_id: 断线重连时客户端收到的最后一条事件 ID
         """
-        if analysis_type == "resolution":
-            async for chunk in AIAnalysisGenerator.genResolutionsStream(assign_id):
-                yield chunk
-        elif analysis_type == "knowledge":
-            async for chunk in AIAnalysisGenerator.genKnowledgeAnalysisStream(assign_id):
-                yield chunk
-        else:
+        if analysis_type not in ("resolution", "knowledge"):
             yield f"event: error\ndata: {{\"error\": \"Invalid analysis type\"}}\n\n"
+            return
+
+        assignment = await AssignmentModel.get_or_none(id=assign_id)
+        if assignment is None:
+            yield f"event: error\ndata: {{\"error\": \"Assignment with id {assign_id} not found\"}}\n\n"
+            return
+        async for chunk in cls._streamAnalysis(assignment, analysis_type, last_event_id=last_event_id):
+            yield chunk
 
     @classmethod
-    async def getAiGenStream(cls, course_id: str, assign_id: str, analysis_type: str) -> AsyncGenerator[str, None]:
+    async def getAiGenStream(
+        cls, course_id: str, assign_id: str, analysis_type: str, last_event_id: Optional[str] = None
+    ) -> AsyncGenerator[str, None]:
         """
         流式获取AI生成分析
 
@@ -208,6 +265,7 @@ class AIController:
             course_id: 课程ID
             assign_id: 作业ID
             analysis_type: 分析类型 (code 或 learning)
+            last_event_id: 断线重连时客户端收到的最后一条事件 ID
         """
         # 检查是否已提交
         assignment = await AssignmentModel.get(id=assign_id).prefetch_related("submissions")
@@ -221,12 +279,108 @@ class AIController:
             yield f"event: error\ndata: {{\"error\": \"AI生成分析功能需要在提交作业后才能使用哦~\"}}\n\n"
             return
 
-        if analysis_type == "code":
-            async for chunk in AIAnalysisGenerator.genCodeAnalysisStream(assign_id):
-                yield chunk
-        elif analysis_type == "learning":
-            async for chunk in AIAnalysisGenerator.genLearningSuggestionsStream(assign_id):
-                yield chunk
-        else:
+        if analysis_type not in ("code", "learning"):
             yield f"event: error\ndata: {{\"error\": \"Invalid analysis type\"}}\n\n"
+            return
+
+        async for chunk in cls._streamAnalysis(
+            assignment, analysis_type,
+            extra_versions=[sub.submitted_at for sub in assignment.submissions],
+            last_event_id=last_event_id,
+        ):
+            yield chunk
+
+    @classmethod
+    async def _streamAnalysis(
+        cls,
+        assignment: AssignmentModel,
+        analysis_type: str,
+        extra_versions: Sequence = (),
+        last_event_id: Optional[str] = None,
+    ) -> AsyncGenerator[str, None]:
+        """
+        断线重连且事件记录仍在时从断点续接；否则已保存的分析直接快速回放，
+        都不满足时加入（或发起）同一次流式生成，完成时保存结果
+        """
+        field, event_type, generator = cls._STREAMS[analysis_type]
+        key = cls._flight_key(assignment, analysis_type, *extra_versions)
+        # 生成任务在首个订阅者的上下文中创建，其中的模型调用记入该作业
+        AITelemetry.bind(assignment.id)
+
+        resuming = AISingleFlight.resumable(key, last_event_id)
+        stored = None if resuming else await Analysis.filter(assignment_id=assignment.id).first()
+        value = getattr(stored, field) if stored else None
+        if value:
+            try:
+                props = (MatrixAnalysisProps.model_validate_json(value) if isinstance(value, str)
+                         else MatrixAnalysisProps.model_validate(value))
+            except ValueError as e:
+                logging.warning(f"Stored {field} for assignment {assignment.id} is invalid, regenerating: {e}")
+            else:
+                async for chunk in AIAnalysisGenerator.replayStream(event_type, props):
+                    yield chunk
+                return
+
+        async def _persist(props: MatrixAnalysisProps) -> None:
+            await cls._save_analysis(assignment.id, **{field: props.model_dump_json()})
+
+        # 同一作业同一版本的请求共享同一次流式生成；结果会保存，所有订阅者断开后仍继续生成
+        async for chunk in AISingleFlight.stream(
+            key,
+            lambda: generator(assignment.id, on_complete=_persist),
+            persist=True,
+            last_event_id=last_event_id,
+        ):
+            yield chunk
+
+    @staticmethod
+    def _job_info(job: AIJob) -> AIJobInfo:
+        return AIJobInfo(
+            jobId=job.id,
+            kind=job.kind,
+            assignId=job.assignment_id,
+            status=job.status.value if hasattr(job.status, "value") else job.status,
+            attempts=job.attempts,
+            error=job.error,
+            createdAt=job.created_at,
+            finishedAt=job.finished_at,
+        )
+
+    @classmethod
+    async def createJob(cls, course_id: str, assign_id: str, kind: str) -> AIJobInfo:
+        """
+        提交后台生成任务，立即返回任务句柄
+
+        Args:
+            kind: basic（解题分析与知识点分析）或 aiGen（代码分析与学习建议）
+        """
+        if kind not in ("basic", "aiGen"):
+            raise HTTPException(status_code=400, detail=f"Invalid job kind: {kind}")
+        try:
+            assignment = await AssignmentModel.get(id=assign_id).prefetch_related("submissions")
+            extra_versions = []
+            if kind == "aiGen":
+                cls._check_ai_gen_allowed(assignment)
+                extra_versions = [sub.submitted_at for sub in assignment.submissions]
+            key = ":".join(cls._flight_key(assignment, kind, *extra_versions))
+            job = await AIQueue.enqueue(kind, assign_id, key)
+            return cls._job_info(job)
+        except HTTPException:
+            raise
+        except torExceptions.DoesNotExist:
+            logging.error(f"Assignment with id {assign_id} not found")
+            raise HTTPException(status_code=404, detail=f"Assignment with id {assign_id} not found")
+        except Exception as e:
+            logging.error(f"Error occurred in createJob for assignment {assign_id}: {str(e)}")
+            raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+
+    @classmethod
+    async def getJob(cls, job_id: str) -> AIJobInfo:
+        job = await AIQueue.get_job(job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail=f"AI job with id {job_id} not found")
+        return cls._job_info(job)
+
 
+AIQueue.register("basic", AIController._basicJob)
+AIQueue.register("aiGen", AIController._aiGenJob)
@@ -8,12 +8,15 @@ from tortoise import exceptions as torExceptions
 
 # from app.controller.ai import AIAnalysisGenerator
 from app.models.course import Course as CourseModel
-from app.models.assignment import Assignment as AssignmentModel, AssignmentCode, AssignmentSubmission
+from app.models.assignment import Assignment as AssignmentModel, AssignmentCode, AssignmentSubmission, AssignmentTestGenerator
 from app.models.playground import Playground
+from app.models.judge_scheduler import JudgeScheduler
+from app.models.profile_scheduler import ProfileScheduler
 from app.schemas.general import CourseId, AssignId
-from app.schemas.assignment import AssignData, Submit, TestSubmitRequest,SubmitRequest, TestSample, TestSampleCreate, TestSampleResult, CodeFileInfo, JudgeResult, MdCodeContent
+from app.schemas.assignment import AssignData, Submit, TestSubmitRequest, TestBatchSubmitRequest,SubmitRequest, TestSample, TestSampleCreate, TestSampleResult, CodeFileInfo, JudgeResult, MdCodeContent, TestGenerator
 
 from app.utils.assign import listStrToList, testSampleToResultList
+from app.constants.user import UserMatrixAI
 
 
 class AssignmentController:
@@ -67,6 +70,7 @@ class AssignmentController:
         testSample: TestSampleCreate,
         # testSample: TestSampleCreate,
         ddl: Optional[str],
+        testGenerators: Optional[list[TestGenerator]] = None,
     ) -> bool:
         try:
             course = await CourseModel.get(id=courseId)
@@ -74,6 +78,12 @@ class AssignmentController:
 
             if assignId:
                 assignment = await AssignmentModel.get(id=assignId).prefetch_related("codes")
+                # 基础分析只依赖题干与初始代码，内容未变时无需重新生成
+                content_changed = (
+                    assignment.title != title
+                    or assignment.description != description
+                    or assignment.codes[0].original_code != assignOriginalCode
+                )
                 assignment.title = title
                 assignment.description = description
                 assignment.end_date = ddl if ddl else None
@@ -106,6 +116,11 @@ class AssignmentController:
                     sample_expect_output=json.dumps(testSample.expectOutput, ensure_ascii=False),
                 )
                 await course.assignments.add(assignment)
+                content_changed = True
+            if testGenerators is not None:
+                await cls.set_test_generators(assignment, testGenerators)
+            if content_changed:
+                await cls.pregen_basic_analysis(courseId, assignment.id)
             try:
                 listStrToList(assignOriginalCode)
             except Exception:
@@ -133,6 +148,44 @@ class AssignmentController:
             logging.error(f"Error occurred while creating assignment: {str(e)}")
             raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
+    @classmethod
+    async def pregen_basic_analysis(cls, course_id: str, assign_id: str) -> None:
+        """将基础分析的生成放入 AI 任务队列，学生打开题目时结果已就绪；入队失败不影响作业保存"""
+        from app.controller.ai import AIController
+        try:
+            job = await AIController.createJob(course_id, assign_id, "basic")
+            logging.info(f"Queued basic analysis pre-generation for assignment {assign_id}: job {job.jobId}")
+        except Exception as e:
+            logging.warning(f"Failed to queue basic analysis for assignment {assign_id}: {e}")
+
+    @classmethod
+    async def set_test_generators(cls, assignment: AssignmentModel, testGenerators: list[TestGenerator]) -> None:
+        """整体替换作业的测试输入生成器"""
+        await AssignmentTestGenerator.filter(assignment=assignment).delete()
+        for generator in testGenerators:
+            await AssignmentTestGenerator.create(
+                id=uuid.uuid4().hex,
+                assignment=assignment,
+                generator_code=generator.generatorCode,
+                reference_code=generator.referenceCode,
+                seeds=generator.seeds,
+                cache_expected=generator.cacheExpected,
+            )
+
+    @classmethod
+    async def get_test_generators(cls, assign_id: str) -> list[TestGenerator]:
+        """获取作业的测试输入生成器"""
+        generators = await AssignmentTestGenerator.filter(assignment_id=assign_id).all()
+        return [
+            TestGenerator(
+                generatorCode=generator.generator_code,
+                referenceCode=generator.reference_code,
+                seeds=generator.seeds,
+                cacheExpected=generator.cache_expected,
+            )
+            for generator in generators
+        ]
+
     @classmethod
     async def delete_assignment(cls, course_id: str, assign_id: str) -> None:
         try:
@@ -147,20 +200,45 @@ class AssignmentController:
             raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
     @classmethod
-    async def test_submit(cls, submitRequest: TestSubmitRequest) -> str:
+    async def test_submit(cls, submitRequest: TestSubmitRequest, user_id: str = UserMatrixAI.username) -> str:
         try:
-            # 处理提交逻辑
-            output = await Playground.run_code(
-                code=submitRequest.codeFile.content,
-                input=submitRequest.input,
-                language=submitRequest.language,
+            # 处理提交逻辑，自测运行优先级最低
+            output = await JudgeScheduler.submit(
+                user_id=user_id,
+                job_class=JudgeScheduler.classify(graded=False),
+                factory=lambda: Playground.run_code(
+                    code=submitRequest.codeFile.content,
+                    input=submitRequest.input,
+                    language=submitRequest.language,
+                ),
             )
             return output
         except Exception as e:
             logging.error(f"Error occurred while testing code submission: {str(e)}")
             raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
     @classmethod
-    async def submit_code(cls, course_id: CourseId, assign_id: AssignId, submitRequest: SubmitRequest):
+    async def test_submit_batch(cls, submitRequest: TestBatchSubmitRequest, user_id: str = UserMatrixAI.username) -> list[str]:
+        try:
+            # 整批作为一个自测任务排队，开销按输入组数计；占用的槽位数即整批的并发上限
+            width = JudgeScheduler.width(len(submitRequest.inputs))
+            outputs = await JudgeScheduler.submit(
+                user_id=user_id,
+                job_class=JudgeScheduler.classify(graded=False),
+                factory=lambda: Playground.run_code_batch(
+                    code=submitRequest.codeFile.content,
+                    inputs=submitRequest.inputs,
+                    language=submitRequest.language,
+                    concurrency=width,
+                ),
+                cost=len(submitRequest.inputs),
+                width=width,
+            )
+            return outputs
+        except Exception as e:
+            logging.error(f"Error occurred while testing batch code submission: {str(e)}")
+            raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+    @classmethod
+    async def submit_code(cls, course_id: CourseId, assign_id: AssignId, submitRequest: SubmitRequest, user_id: str = UserMatrixAI.username):
         try:
             assignment = await AssignmentModel.get(id=assign_id)
             if(assignment.end_date and assignment.end_date < datetime.now(timezone.utc)):
@@ -172,9 +250,17 @@ class AssignmentController:
             sample_input = listStrToList(codes.sample_input)
             sample_output = listStrToList(codes.sample_expect_output)
 
-            judgeRes:JudgeResult = await Playground.judge_code(
-                code=submitRequest.codeFile.content,
-                testSample=TestSampleCreate(input=sample_input, expectOutput=sample_output),
+            generators = await cls.get_test_generators(assign_id)
+            # 正式提交经调度器排队，临近截止的提交优先，同类提交按用户公平轮询
+            judgeRes:JudgeResult = await JudgeScheduler.submit(
+                user_id=user_id,
+                job_class=JudgeScheduler.classify(graded=True, deadline=assignment.end_date),
+                factory=lambda: Playground.judge_code(
+                    code=submitRequest.codeFile.content,
+                    testSample=TestSampleCreate(input=sample_input, expectOutput=sample_output),
+                    generators=generators,
+                ),
+                cost=len(sample_input) + sum(len(g.seeds) for g in generators),
             )
             submit = Submit(
                 score=judgeRes.score,
@@ -190,6 +276,7 @@ class AssignmentController:
                 submission = _submission[0]
                 # 更新现有提交
                 submission.score = submit.score
+                submission.student_id = user_id
                 submission.sample_real_output = json.dumps(judgeRes.testRealOutput, ensure_ascii=False)
                 submission.submit_code = json.dumps([submitRequest.codeFile.model_dump()], ensure_ascii=False)
                 #~~ 确实需要手动更新 因为设置了 auto_now_add 而非 auto_now
@@ -200,28 +287,18 @@ class AssignmentController:
                 submitModel = await AssignmentSubmission.create(
                     id=uuid.uuid4().hex,
                     assignment=assignment,
-                    student_id="Matrix AI",
+                    student_id=user_id,
                     score=submit.score,
                     sample_real_output=json.dumps(judgeRes.testRealOutput, ensure_ascii=False),
                     submit_code=json.dumps([submitRequest.codeFile.model_dump()], ensure_ascii=False),
                 )
             await submitModel.save()
 
-            #! 使用线程池执行后台任务，避免阻塞事件循环
-            import concurrent.futures
-
-            # 创建线程池并提交任务，但不等待完成
-            #! 上个实现用 with 会等待全部完成才返回没真正实现 异步
-            executor = concurrent.futures.ThreadPoolExecutor()
-            loop = asyncio.get_event_loop()
+            # 清除基于旧提交的 AI 生成分析，之后读取的都是新提交的分析
+            await cls.remove_previous_ai_gen_by_id(assignment.id)
 
-            # 删除之前的 AI 分析 - 传递 assignment.id 而不是 assignment 对象
-            assignment_id = assignment.id
-            loop.run_in_executor(executor, lambda: asyncio.run(cls.remove_previous_ai_gen_by_id(assignment_id)))
-
-            # 生成用户画像 - 创建独立的任务，避免事件循环绑定问题
-            from app.controller.ai import AIAnalysisGenerator
-            loop.run_in_executor(executor, lambda: asyncio.run(cls.gen_user_profile_safe()))
+            # 用户画像按用户防抖更新，连续提交只触发一次
+            ProfileScheduler.request(user_id, lambda: cls.gen_user_profile_safe(user_id))
 
             return submit
         except HTTPException as he:
@@ -246,9 +323,8 @@ class AssignmentController:
 
     @classmethod
     async def remove_previous_ai_gen_by_id(cls, assignment_id: str):
-        """通过 ID 删除之前的 AI 生成分析，避免事件循环绑定问题"""
+        """通过 ID 删除之前的 AI 生成分析"""
         try:
-            # 在新的事件循环中重新查询数据，避免绑定到不同事件循环的问题
             assignment = await AssignmentModel.get(id=assignment_id)
             _analysis = await assignment.analysis.all()
 
@@ -262,11 +338,11 @@ class AssignmentController:
             logging.error(f"清除 {assignment_id} 的 AI 分析缓存时出错: {e}")
 
     @classmethod
-    async def gen_user_profile_safe(cls):
-        """线程安全的用户画像生成方法，避免事件循环绑定问题"""
+    async def gen_user_profile_safe(cls, user_id: str = UserMatrixAI.username):
+        """生成用户画像，出错只记录日志"""
         try:
             from app.controller.ai import AIAnalysisGenerator
-            await AIAnalysisGenerator.genUserProfile()
+            await AIAnalysisGenerator.genUserProfile(user_id)
         except Exception as e:
             # 静默处理错误，不影响主流程
             logging.error(f"生成用户画像时出错: {e}")
@@ -33,11 +33,43 @@ TORTOISE_ORM = {
 }
 
 
+# 后来加到已有表上的列（模型名, 字段名）：generate_schemas 只会创建缺失的表，已部署的旧表需要在启动时补列
+ADDED_COLUMNS = [
+    ("User", "profile_watermark"),
+]
+
+
 async def init_db():
     """初始化数据库连接"""
     await Tortoise.init(config=TORTOISE_ORM)
     # 生成数据库表
     await Tortoise.generate_schemas()
+    await add_missing_columns()
+
+
+async def _table_columns(conn, table: str) -> set[str]:
+    if conn.capabilities.dialect == "sqlite":
+        _, rows = await conn.execute_query(f'PRAGMA table_info("{table}")')
+        return {row["name"] for row in rows}
+    _, rows = await conn.execute_query(
+        "SELECT column_name FROM information_schema.columns WHERE table_schema = current_schema() AND table_name = $1",
+        [table],
+    )
+    return {row["column_name"] for row in rows}
+
+
+async def add_missing_columns():
+    """为旧表补上 ADDED_COLUMNS 中缺失的列（只增加可空列，可重复执行）"""
+    for model_name, field_name in ADDED_COLUMNS:
+        meta = Tortoise.apps["models"][model_name]._meta
+        conn = meta.db
+        field = meta.fields_map[field_name]
+        column = field.source_field or field_name
+        if column in await _table_columns(conn, meta.db_table):
+            continue
+        sql_type = field.get_for_dialect(conn.capabilities.dialect, "SQL_TYPE")
+        await conn.execute_script(f'ALTER TABLE "{meta.db_table}" ADD COLUMN "{column}" {sql_type} NULL')
+        logging.info(f"已为表 {meta.db_table} 补充列: {column}")
 
 async def ensure_user_table():
     """初始化默认数据，避免重复创建"""
@@ -31,6 +31,11 @@ from app.routers.assignment import assign_router
 from app.routers.ai import ai_route
 from app.routers.agent import agent_route
 from app.database import init_db, close_db, ensure_user_table
+from app.models.playground import JudgeCorePool
+from app.models.ai import AI, AIQueue
+from app.models.ai_provider import AIProviderPool
+from app.models.profile_scheduler import ProfileScheduler
+from app.utils.tokens import load_encoding
 
 
 api_key=os.getenv("OPENAI_API_KEY", "Your-api-key")
@@ -43,7 +48,20 @@ async def lifespan(app: FastAPI):
     await init_db()
     # 初始化默认数据（避免重复创建）
     await ensure_user_table()
+    # 显式配置了保留核时，将 Web 进程限制在保留核上，评测运行使用其余的核
+    if os.getenv("JUDGE_RESERVED_CPUS"):
+        JudgeCorePool.pin_web_process()
+    # 在线程中加载分词器编码表（需预先缓存到 TIKTOKEN_CACHE_DIR），不可用时按启发式估算 token
+    await load_encoding(AI.AIConfig.MODEL)
+    # 启动 AI 生成任务队列，恢复上次未完成的任务
+    await AIQueue.start()
+    # 配置了多个模型端点时后台探测端点健康状况
+    AIProviderPool.start()
     yield
+    await ProfileScheduler.stop()
+    await AIQueue.stop()
+    # 停止端点探测并关闭 AI 客户端的连接池
+    await AI.close()
     # 关闭时清理数据库连接
     await close_db()
 
@@ -1,6 +1,6 @@
 from .course import Course
-from .assignment import Assignment,AssignmentCode, AssignmentSubmission
-from .analysis import Analysis
+from .assignment import Assignment,AssignmentCode, AssignmentSubmission, AssignmentTestGenerator
+from .analysis import Analysis, AIJob
 from .agent import AIAgentConservation, AIAgentConservationCheckpoint
 from .user import User
 
@@ -9,7 +9,9 @@ __all__ = [
     "Assignment",
     "AssignmentCode",
     "AssignmentSubmission",
+    "AssignmentTestGenerator",
     "Analysis",
+    "AIJob",
     "AIAgentConservation",
     "AIAgentConservationCheckpoint",
     "User"
@@ -4,6 +4,8 @@ from tortoise import fields
 from tortoise.models import Model
 
 from app.models.ai import AI
+from app.models.ai_budget import AIPromptType
+from app.models.ai_governor import AIPriority
 from app.schemas.agent import AIAgentEvent, AIAgentEventType
 
 
@@ -135,4 +137,5 @@ class AIAgent:
                 case AIAgentEventType.TURN_END.value:
                     continue
 
-        return AI.get_response_stream(messages)
+        # 智能体对话依赖上下文与工具结果，不走响应缓存；历史过长时舍弃最早的轮次
+        return AI.get_response_stream(messages, use_cache=False, priority=AIPriority.INTERACTIVE, prompt_type=AIPromptType.AGENT)
@@ -1,25 +1,36 @@
 
 import os, logging
+import asyncio
 from openai.types.chat import ChatCompletionMessageParam
 import requests
 import json
-from queue import Queue
-from typing import Any, Dict, Iterable, List, Optional,AsyncGenerator
+import uuid
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterable, List, Optional,AsyncGenerator
 
 from fastapi import HTTPException
-from openai import OpenAI
 from pydantic import BaseModel, Field
 
 from app.controller.assignment import AssignmentController
 from app.constants.prompt import AIPrompt
 from app.models.assignment import AssignmentSubmission
+from app.models.analysis import AIJob, AIJobStatus
 from app.models.user import User
 from app.schemas.assignment import (
     AssignData, BasicAnalysis, CodeFileInfo, Complexity, MatrixAnalysisContent,
     MatrixAnalysisProps, Submit, TestSample, TestSampleCreate, TestSubmitRequest,
     SubmitRequest
 )
-from app.utils.ai import code_md_wrapper
+from app.models.profiler import ComplexityProfiler, InputGenerator
+from app.models.ai_cache import AICache
+from app.models.ai_budget import AIBudget, AIPromptType
+from app.models.ai_governor import AIGovernor, AIPriority
+from app.models.ai_hedge import AIDeadlineExceeded, AIHedge
+from app.models.ai_provider import AIProvider, AIProviderPool
+from app.models.ai_telemetry import AICallRecord, AITelemetry
+from app.utils.ai import MicroBatcher, coalesce_chunks, code_md_strip, code_md_wrapper, gather_bounded, parse_complexity, parse_titles, pipeline_sections
+from app.utils.tokens import count_message_tokens, count_tokens
 from app.constants.user import UserMatrixAI
 
 
@@ -49,8 +60,13 @@ class AI:
     class AIConfig:
         """AI配置类"""
         MODEL = os.getenv("OPENAI_MODEL", "qwen3-max")
-        MAX_TOKENS = 1000
+        # 各类提示词的输入与最大输出 token 数见 AIBudget
         TEMPERATURE = 0.7
+        # 各小节标题/复杂度等子请求的最大并发数
+        SECTION_CONCURRENCY = int(os.getenv("AI_SECTION_CONCURRENCY", "4"))
+        # 流式输出合并：累计满 STREAM_FLUSH_BYTES 字节或距首块超过 STREAM_FLUSH_MS 毫秒时推送一帧，0 毫秒表示逐块推送
+        STREAM_FLUSH_MS = int(os.getenv("AI_STREAM_FLUSH_MS", "50"))
+        STREAM_FLUSH_BYTES = int(os.getenv("AI_STREAM_FLUSH_BYTES", "512"))
 
         @classmethod
         def messages(cls, prompt: str) -> List[Dict[str, str]]:
@@ -60,51 +76,199 @@ class AI:
                 # {"role": "user", "content": "请给出详细的解题步骤和思路。"}
             ]
 
-    # 从环境变量获取API密钥，提高安全性
-    client = OpenAI(
-        api_key=os.getenv("OPENAI_API_KEY", ""),
-        base_url=os.getenv(
-            "OPENAI_BASE_URL",
-            "https://dashscope.aliyuncs.com/compatible-mode/v1"
-        )
-    )
-    @classmethod
-    async def get_response(cls, prompt: str) -> str:
-        """获取AI响应"""
-        response = cls.client.chat.completions.create(
-            model=cls.AIConfig.MODEL,
-            messages=cls.AIConfig.messages(prompt),
-            max_tokens=cls.AIConfig.MAX_TOKENS,
-            temperature=cls.AIConfig.TEMPERATURE,
-        )
+    # 模型端点由 AIProviderPool 管理（主端点来自 OPENAI_BASE_URL 等环境变量），这里保留主端点的客户端
+    client = AIProviderPool.primary().client
+
+    @classmethod
+    def _cache_key(cls, model: str, messages: list, use_cache: bool, max_tokens: int) -> Optional[str]:
+        """缓存键包含实际应答的模型，备用端点上其它模型的回答不会被当作主模型的回答返回"""
+        if not (use_cache and AICache.ENABLED):
+            return None
+        return AICache.key(model, messages, cls.AIConfig.TEMPERATURE, max_tokens)
+
+    @staticmethod
+    def _routed_model(streaming: bool = False) -> str:
+        """当前会处理请求的端点的模型，查询缓存时使用"""
+        return AIProviderPool.candidates(streaming)[0].model
+
+    @classmethod
+    def _prepare(cls, messages: list, prompt_type: AIPromptType) -> tuple[list, int, int]:
+        """按提示词类型的预算裁剪消息，返回 (消息, 输入 token 数, 最大输出 token 数)，并记录发送的 token 数"""
+        messages = AIBudget.fit_messages(prompt_type, messages, cls.AIConfig.MODEL)
+        prompt_tokens = count_message_tokens(messages, cls.AIConfig.MODEL)
+        AIBudget.record(prompt_type, prompt_tokens)
+        return messages, prompt_tokens, AIBudget.output_tokens(prompt_type)
+
+    @classmethod
+    async def get_response(
+        cls,
+        prompt: str,
+        use_cache: bool = True,
+        priority: AIPriority = AIPriority.ANALYSIS,
+        prompt_type: AIPromptType = AIPromptType.ANALYSIS,
+        label: Optional[str] = None,
+    ) -> str:
+        """
+        获取AI响应，相同的提示词与参数优先返回缓存结果；输入与输出长度按提示词类型的预算控制
+
+        label 为调用统计中的提示词标签（如 RESOLUTION、COMPLEXITY），默认使用提示词类型
+        """
+        record = AITelemetry.start(label or prompt_type.name, prompt_type)
+        messages, prompt_tokens, max_tokens = cls._prepare(cls.AIConfig.messages(prompt), prompt_type)
+        cache_key = cls._cache_key(cls._routed_model(), messages, use_cache, max_tokens)
+        if cache_key:
+            cached = await AICache.get(cache_key)
+            if cached is not None:
+                AITelemetry.finish(record, "cached")
+                return cached
+
+        attempts: list[Optional[AICallRecord]] = []
+
+        async def _attempt() -> tuple[str, Any, Optional[AICallRecord]]:
+            # 第二次起为对冲请求，单独记录为 <标签>:hedge，计入其自身的 token 用量
+            hedge = None
+            if attempts:
+                hedge = AITelemetry.start(f"{record.label}:hedge", prompt_type)
+                AITelemetry.sent(hedge, 0.0)
+            attempts.append(hedge)
+            try:
+                model, response = await AIProviderPool.call(lambda provider: cls._create(provider, messages, max_tokens))
+            except BaseException as e:
+                if hedge is not None:
+                    AITelemetry.finish(
+                        hedge, AITelemetry.outcome_of(e), prompt_tokens, error=e if isinstance(e, Exception) else None
+                    )
+                raise
+            if hedge is not None:
+                AITelemetry.finish(hedge, "ok", *cls._tokens_used(response, prompt_tokens))
+            return model, response, hedge
+
+        try:
+            async with AIGovernor.slot(priority, prompt_tokens + max_tokens) as lease:
+                AITelemetry.sent(record, lease.waited)
+                # 端点出错或超时时由端点池换下一个端点重试；超过该类提示词的截止时间抛出 AIDeadlineExceeded，
+                # 短回答超过近期 p95 延迟时另发一次对冲请求
+                model, response, hedge = await AIHedge.run(prompt_type, priority, prompt_tokens + max_tokens, _attempt)
+                usage = getattr(response, "usage", None)
+                if hedge is None and usage is not None and getattr(usage, "total_tokens", None):
+                    lease.used_tokens = usage.total_tokens
+        except BaseException as e:
+            AITelemetry.finish(
+                record, AITelemetry.outcome_of(e), prompt_tokens, error=e if isinstance(e, Exception) else None
+            )
+            raise
 
-        return (response.choices[0].message.content
+        content = (response.choices[0].message.content
                 if response.choices[0].message.content else "")
+        # 对冲请求先返回时其用量已单独记录，首个请求被取消，只计已发送的输入
+        AITelemetry.finish(record, "ok", *(cls._tokens_used(response, prompt_tokens) if hedge is None else (prompt_tokens, 0)))
+        if cache_key:
+            await AICache.set(cls._cache_key(model, messages, use_cache, max_tokens), content)
+        return content
 
     @classmethod
-    async def get_response_stream(cls, messages: Iterable[ChatCompletionMessageParam] | str) -> AsyncGenerator[str, None]:
+    async def get_response_stream(
+        cls,
+        messages: Iterable[ChatCompletionMessageParam] | str,
+        use_cache: bool = True,
+        priority: AIPriority = AIPriority.ANALYSIS,
+        prompt_type: AIPromptType = AIPromptType.ANALYSIS,
+        label: Optional[str] = None,
+    ) -> AsyncGenerator[str, None]:
     # async def get_response_stream(cls, ) -> AsyncGenerator[str, None]:
-        """获取AI流式响应（使用官方SDK的stream模式）"""
+        """获取AI流式响应（使用官方SDK的stream模式），命中缓存时直接回放；对话历史超出预算时舍弃最早的轮次"""
+        record = AITelemetry.start(label or prompt_type.name, prompt_type, streaming=True)
+        prompt_tokens = 0
+        full_content = ""
         try:
-            request_messages = cls.AIConfig.messages(messages) if isinstance(messages, str) else list(messages)
-            stream = cls.client.chat.completions.create(
-                model=cls.AIConfig.MODEL,
-                messages=request_messages,
-                max_tokens=cls.AIConfig.MAX_TOKENS,
-                temperature=cls.AIConfig.TEMPERATURE,
-                stream=True
+            request_messages, prompt_tokens, max_tokens = cls._prepare(
+                cls.AIConfig.messages(messages) if isinstance(messages, str) else list(messages), prompt_type
             )
+            cache_key = cls._cache_key(cls._routed_model(streaming=True), request_messages, use_cache, max_tokens)
+            if cache_key:
+                cached = await AICache.get(cache_key)
+                if cached is not None:
+                    AITelemetry.finish(record, "cached")
+                    async for piece in AICache.replay(cached):
+                        yield piece
+                    return
+
+            # 整个流式输出期间占用一个调用额度
+            async with AIGovernor.slot(priority, prompt_tokens + max_tokens) as lease:
+                AITelemetry.sent(record, lease.waited)
+                # 收到第一块之前端点出错或超时时由端点池换下一个端点，最后一个被调用的端点即应答的端点
+                served: list[str] = []
+
+                def _stream(provider: AIProvider) -> AsyncGenerator[str, None]:
+                    served.append(provider.model)
+                    return cls._stream_from(provider, request_messages, max_tokens)
+
+                async for content in AIProviderPool.stream(_stream):
+                    AITelemetry.first_token(record)
+                    full_content += content
+                    yield content
+                completion_tokens = count_tokens(full_content, cls.AIConfig.MODEL)
+                lease.used_tokens = prompt_tokens + completion_tokens
+                AITelemetry.finish(record, "ok", prompt_tokens, completion_tokens)
+            # 只缓存完整接收的响应
+            if cache_key:
+                await AICache.set(cls._cache_key(served[-1], request_messages, use_cache, max_tokens), full_content)
+        except BaseException as e:
+            # 客户端断开时生成器被关闭，记为 cancelled
+            AITelemetry.finish(
+                record, AITelemetry.outcome_of(e), prompt_tokens,
+                count_tokens(full_content, cls.AIConfig.MODEL), error=e if isinstance(e, Exception) else None,
+            )
+            if isinstance(e, Exception):
+                logging.error(f"Stream error: {e}")
+            raise
+
+    @classmethod
+    def _tokens_used(cls, response: Any, prompt_tokens: int) -> tuple[int, int]:
+        """响应的输入与输出 token 数，服务端未返回用量时按本地估算"""
+        usage = getattr(response, "usage", None)
+        content = response.choices[0].message.content or ""
+        return (
+            getattr(usage, "prompt_tokens", None) or prompt_tokens,
+            getattr(usage, "completion_tokens", None) or count_tokens(content, cls.AIConfig.MODEL),
+        )
 
-            for chunk in stream:
+    @classmethod
+    async def _create(cls, provider: AIProvider, messages: list, max_tokens: int) -> tuple[str, Any]:
+        """在指定端点上发起一次非流式调用，返回 (应答的模型, 响应)"""
+        response = await provider.client.chat.completions.create(
+            model=provider.model,
+            messages=messages,
+            max_tokens=max_tokens,
+            temperature=cls.AIConfig.TEMPERATURE,
+        )
+        return provider.model, response
+
+    @classmethod
+    async def _stream_from(cls, provider: AIProvider, messages: list, max_tokens: int) -> AsyncGenerator[str, None]:
+        """在指定端点上发起流式调用，逐块产出文本"""
+        stream = await provider.client.chat.completions.create(
+            model=provider.model,
+            messages=messages,
+            max_tokens=max_tokens,
+            temperature=cls.AIConfig.TEMPERATURE,
+            stream=True
+        )
+
+        # 客户端提前断开时关闭响应，连接归还连接池
+        async with stream:
+            async for chunk in stream:
                 if not getattr(chunk, "choices", None):
                     continue
                 delta = getattr(chunk.choices[0], "delta", None)
                 content = getattr(delta, "content", None)
                 if content:
                     yield content
-        except Exception as e:
-            logging.error(f"Stream error: {e}")
-            raise
+
+    @classmethod
+    async def close(cls) -> None:
+        """停止端点探测并关闭当前事件循环上的连接池，客户端本身仍可继续使用"""
+        await AIProviderPool.stop()
 
 
 
@@ -141,32 +305,142 @@ class AI:
 
 
 class AIQueue:
-    """AI任务队列，用于管理和处理多个AI请求"""
-    num_tasks: int = 0
+    """
+    AI 生成任务队列
+
+    任务记录持久化在 AIJob 表中，同一去重键同时只有一个未完成的任务；
+    若干个 worker 从队列取任务执行，服务重启时未完成的任务重新入队
+    """
+
+    WORKERS = int(os.getenv("AI_QUEUE_WORKERS", "2"))
+    # 失败后最多执行的次数
+    MAX_ATTEMPTS = int(os.getenv("AI_QUEUE_MAX_ATTEMPTS", "2"))
 
-    def __init__(self) -> None:
-        """初始化任务队列"""
-        self.queue: Queue = Queue()
-        self.num_tasks = 0
+    _queue: Optional[asyncio.Queue] = None
+    _workers: list[asyncio.Task] = []
+    _handlers: dict[str, Callable[[str], Awaitable[Any]]] = {}
+    _enqueue_lock: Optional[asyncio.Lock] = None
 
-    def add_to_queue(self, item: Any) -> None:
-        """添加项目到队列"""
-        self.queue.put(item)
-        self.num_tasks += 1
-        self.process_queue()
+    @classmethod
+    def register(cls, kind: str, handler: Callable[[str], Awaitable[Any]]) -> None:
+        """注册任务类型的处理函数，处理函数接收作业 ID，负责生成并保存结果"""
+        cls._handlers[kind] = handler
+
+    @classmethod
+    async def start(cls, workers: Optional[int] = None) -> None:
+        """启动 worker，并将上次未完成的任务重新入队"""
+        cls._queue = asyncio.Queue()
+        cls._enqueue_lock = asyncio.Lock()
+        pending = await AIJob.filter(
+            status__in=[AIJobStatus.QUEUED, AIJobStatus.RUNNING]
+        ).order_by("created_at")
+        for job in pending:
+            if job.status == AIJobStatus.RUNNING:
+                job.status = AIJobStatus.QUEUED
+                await job.save(update_fields=["status", "updated_at"])
+            cls._queue.put_nowait(job.id)
+        if pending:
+            logging.info(f"Recovered {len(pending)} unfinished AI jobs")
+
+        cls._workers = [
+            asyncio.create_task(cls._worker(i)) for i in range(workers or cls.WORKERS)
+        ]
+
+    @classmethod
+    async def stop(cls) -> None:
+        """停止 worker，执行中的任务保持 running 状态，下次启动时重新入队"""
+        for worker in cls._workers:
+            worker.cancel()
+        await asyncio.gather(*cls._workers, return_exceptions=True)
+        cls._workers = []
+
+    @classmethod
+    async def enqueue(cls, kind: str, assignment_id: str, key: str) -> AIJob:
+        """
+        提交任务，已有相同去重键的未完成任务时直接返回该任务
+
+        Raises:
+            RuntimeError: 队列未启动或任务类型未注册
+        """
+        if cls._queue is None or cls._enqueue_lock is None:
+            raise RuntimeError("AI queue is not started")
+        if kind not in cls._handlers:
+            raise RuntimeError(f"Unknown AI job kind: {kind}")
+
+        async with cls._enqueue_lock:
+            existing = await AIJob.filter(
+                key=key, status__in=[AIJobStatus.QUEUED, AIJobStatus.RUNNING]
+            ).first()
+            if existing:
+                return existing
+            job = await AIJob.create(id=str(uuid.uuid4()), key=key, kind=kind, assignment_id=assignment_id)
+        cls._queue.put_nowait(job.id)
+        return job
+
+    @classmethod
+    async def get_job(cls, job_id: str) -> Optional[AIJob]:
+        return await AIJob.get_or_none(id=job_id)
+
+    @classmethod
+    def stats(cls) -> dict:
+        return {
+            "workers": len(cls._workers),
+            "queued": cls._queue.qsize() if cls._queue else 0,
+        }
 
-    def process_queue(self) -> None:
-        """处理队列中的任务"""
-        while not self.queue.empty():
-            item: Any = self.queue.get()
-            # 处理任务
+    @classmethod
+    async def _worker(cls, index: int) -> None:
+        while True:
+            job_id = await cls._queue.get()
+            try:
+                await cls._run(job_id)
+            except Exception as e:
+                logging.error(f"AI queue worker {index} failed on job {job_id}: {e}")
+            finally:
+                cls._queue.task_done()
+
+    @classmethod
+    async def _run(cls, job_id: str) -> None:
+        job = await AIJob.get_or_none(id=job_id)
+        if job is None or job.status != AIJobStatus.QUEUED:
+            return
+
+        job.status = AIJobStatus.RUNNING
+        job.attempts += 1
+        await job.save(update_fields=["status", "attempts", "updated_at"])
+        try:
+            await cls._handlers[job.kind](job.assignment_id)
+        except Exception as e:
+            logging.error(f"AI job {job.id} ({job.kind}) failed: {e}")
+            job.error = str(e)
+            if job.attempts < cls.MAX_ATTEMPTS:
+                job.status = AIJobStatus.QUEUED
+                await job.save(update_fields=["status", "error", "updated_at"])
+                cls._queue.put_nowait(job.id)
+            else:
+                job.status = AIJobStatus.FAILED
+                job.finished_at = datetime.now(timezone.utc)
+                await job.save(update_fields=["status", "error", "finished_at", "updated_at"])
+            return
 
-            self.queue.task_done()
+        job.status = AIJobStatus.DONE
+        job.finished_at = datetime.now(timezone.utc)
+        await job.save(update_fields=["status", "finished_at", "updated_at"])
+
+
+# 流式生成完成后的回调，接收最终的分析结果
+AnalysisCallback = Callable[[MatrixAnalysisProps], Awaitable[None]]
 
 
 class AIAnalysisGenerator:
     """AI分析生成器，提供各种类型的分析功能"""
 
+    # 实时生成时逐项推送 item 事件的流，回放时同样推送
+    _ITEM_STREAMS = ("resolution",)
+    # 流式输出帧统计
+    _frame_totals = {"streams": 0, "chunks": 0, "frames": 0, "bytes": 0}
+    _recent_frames: deque = deque(maxlen=20)
+
     @classmethod
     async def genResolutions(
         cls, assign_id: str
@@ -195,39 +469,32 @@ class AIAnalysisGenerator:
                     assign_data.title,
                     assign_data.description,
                     assign_data.assignOriginalCode[0].content
-                )
+                ),
+                label="RESOLUTION",
             )
             resol_contents = [
                 c.strip() for c in resol_content.split("---") if c.strip()
             ]
 
-            # 生成标题
-            resol_titles = [
-                await AI.get_response(AIPrompt.TITLE_CODE(code))
-                for code in resol_contents
-            ]
-            # 生成复杂度
-            resol_complexities = [
-                await AI.get_response(AIPrompt.COMPLEXITY(code))
-                for code in resol_contents
-            ]
+            # 批量生成标题，同时并发生成复杂度，作业配置了输入生成器时实测复杂度
+            generators = await AssignmentController.get_test_generators(assign_id)
+            resol_titles, resol_complexities = await asyncio.gather(
+                cls.genTitles(resol_contents, code=True),
+                gather_bounded(
+                    [cls.genComplexity(code, generators[0] if generators else None) for code in resol_contents],
+                    AI.AIConfig.SECTION_CONCURRENCY,
+                ),
+            )
 
             # 构建分析内容
             content = []
-            for title, content_text, complexity_text in zip(
+            for title, content_text, complexity in zip(
                 resol_titles, resol_contents, resol_complexities
             ):
-                lines = complexity_text.split("\n")
-                time_complexity = lines[0].split(":")[-1].strip()
-                space_complexity = lines[1].split(":")[-1].strip()
-
                 content.append(MatrixAnalysisContent(
                     title=title,
                     content=code_md_wrapper(content_text),
-                    complexity=Complexity(
-                        time=time_complexity,
-                        space=space_complexity
-                    )
+                    complexity=complexity
                 ))
 
             analysis = MatrixAnalysisProps(
@@ -251,6 +518,89 @@ class AIAnalysisGenerator:
                 detail=f"Internal server error: {str(e)}"
             )
 
+    @classmethod
+    async def genComplexity(
+        cls, code: str, input_generator: Optional[InputGenerator] = None
+    ) -> Complexity:
+        """
+        生成解法的复杂度
+
+        提供输入生成器时编译并实测复杂度，实测失败或未提供生成器时回退为询问 AI
+
+        Args:
+            code: 解法代码（可包含 Markdown 代码块标记）
+            input_generator: 输入生成器函数或作业的生成器程序
+
+        Returns:
+            Complexity: 时间与空间复杂度
+        """
+        if input_generator is not None:
+            measured = await ComplexityProfiler.profile(code_md_strip(code), input_generator)
+            if measured:
+                return measured
+            logging.info("Complexity profiling unavailable, falling back to AI")
+
+        try:
+            complexity_text = await AI.get_response(AIPrompt.COMPLEXITY(code), prompt_type=AIPromptType.SHORT, label="COMPLEXITY")
+        except AIDeadlineExceeded as e:
+            # 单个慢回答不拖住整份分析，按缺失处理
+            logging.warning(f"{e}, using the default complexity")
+            complexity_text = ""
+        return parse_complexity(complexity_text)
+
+    @classmethod
+    async def genTitles(cls, contents: list[str], code: bool = False, indices: Optional[list[int]] = None) -> list[str]:
+        """
+        为各小节生成标题
+
+        先用一次请求批量生成全部标题，返回结果无法解析时回退为逐节并发请求
+
+        Args:
+            contents: 各小节内容
+            code: 小节内容是否为解法代码
+            indices: 各小节在全文中的下标，用于默认标题的编号，默认为 0..n-1
+
+        Returns:
+            list[str]: 与 contents 一一对应的标题
+        """
+        if not contents:
+            return []
+        indices = indices if indices is not None else list(range(len(contents)))
+
+        try:
+            titles = parse_titles(
+                await AI.get_response(AIPrompt.TITLES(contents, code=code), prompt_type=AIPromptType.SHORT, label="TITLES"),
+                len(contents),
+            )
+        except AIDeadlineExceeded as e:
+            # 批量请求已经超时，逐节重试多半同样慢，直接使用默认标题
+            logging.warning(f"{e}, using default titles")
+            return [cls._defaultTitle(i, code) for i in indices]
+        if titles is not None:
+            return titles
+
+        logging.warning("Batched titles could not be parsed, falling back to per-section requests")
+        return await gather_bounded(
+            [cls.genTitle(content, code, i) for i, content in zip(indices, contents)],
+            AI.AIConfig.SECTION_CONCURRENCY,
+        )
+
+    @classmethod
+    async def genTitle(cls, content: str, code: bool = False, index: int = 0) -> str:
+        """为单个小节生成标题，超时时使用按下标编号的默认标题"""
+        title_prompt = AIPrompt.TITLE_CODE if code else AIPrompt.TITLE
+        try:
+            return await AI.get_response(
+                title_prompt(content), prompt_type=AIPromptType.SHORT, label="TITLE_CODE" if code else "TITLE"
+            )
+        except AIDeadlineExceeded as e:
+            logging.warning(f"{e}, using a default title")
+            return cls._defaultTitle(index, code)
+
+    @staticmethod
+    def _defaultTitle(index: int, code: bool) -> str:
+        return f"解法 {index + 1}" if code else f"第 {index + 1} 节"
+
     @classmethod
     async def genKnowledgeAnalysis(
         cls,  assign_id: str
@@ -276,17 +626,15 @@ class AIAnalysisGenerator:
                     assign_data.title,
                     assign_data.description,
                     assign_data.assignOriginalCode[0].content
-                )
+                ),
+                label="KNOWLEDGEANALYSIS",
             )
             knowledge_contents = [
                 c.strip() for c in knowledge_content.split("---") if c.strip()
             ]
 
-            # 生成标题
-            knowledge_titles = [
-                await AI.get_response(AIPrompt.TITLE(content))
-                for content in knowledge_contents
-            ]
+            # 批量生成标题
+            knowledge_titles = await cls.genTitles(knowledge_contents)
             # 构建分析内容
             content = []
             for title, content_text in zip(knowledge_titles, knowledge_contents):
@@ -347,17 +695,15 @@ class AIAnalysisGenerator:
                     assign_data.description,
                     submitted_code,
                     user.code_style
-                )
+                ),
+                label="CODEANALYSIS",
             )
             code_analysis_contents = [
                 c.strip() for c in code_analysis_content.split("---") if c.strip()
             ]
 
-            # 生成标题
-            code_analysis_titles = [
-                await AI.get_response(AIPrompt.TITLE(content))
-                for content in code_analysis_contents
-            ]
+            # 批量生成标题
+            code_analysis_titles = await cls.genTitles(code_analysis_contents)
             # 构建分析内容
             content = []
             for title, content_text in zip(code_analysis_titles, code_analysis_contents):
@@ -418,18 +764,15 @@ class AIAnalysisGenerator:
                     assign_data.description,
                     submitted_code,
                     user.knowledge_status
-                )
+                ),
+                label="LEARNING_SUGGESTIONS",
             )
             learning_suggestion_contents = [
                 c.strip() for c in learning_suggestion_content.split("---") if c.strip()
             ]
 
-            # 生成标题
-            learning_suggestion_titles = [
-                #queue here
-                await AI.get_response(AIPrompt.TITLE(content))
-                for content in learning_suggestion_contents
-            ]
+            # 批量生成标题
+            learning_suggestion_titles = await cls.genTitles(learning_suggestion_contents)
             # 构建分析内容
             content = []
             for title, content_text in zip(learning_suggestion_titles, learning_suggestion_contents):
@@ -455,72 +798,86 @@ class AIAnalysisGenerator:
             )
     @classmethod
     async def genUserCodeStyle(cls, previous_analysis: str, submission_str: str):
-        return await AI.get_response(AIPrompt.CODE_STYLE(previous_analysis, submission_str))
+        return await AI.get_response(
+            AIPrompt.CODE_STYLE(previous_analysis, submission_str),
+            priority=AIPriority.BACKGROUND, prompt_type=AIPromptType.PROFILE, label="CODE_STYLE",
+        )
 
     @classmethod
     async def genUserKnowledgeStatus(cls, previous_analysis: str, submission_str: str):
-        return await AI.get_response(AIPrompt.KNOWLEDGE_STATUS(previous_analysis, submission_str))
+        return await AI.get_response(
+            AIPrompt.KNOWLEDGE_STATUS(previous_analysis, submission_str),
+            priority=AIPriority.BACKGROUND, prompt_type=AIPromptType.PROFILE, label="KNOWLEDGE_STATUS",
+        )
 
-    @classmethod
-    async def genUserProfile(cls):
-        logging.info(f"Received user profile generate request")
+    @staticmethod
+    def _submissionSections(submissions: Iterable[AssignmentSubmission]) -> list[str]:
+        """将提交记录转为画像提示词中的提交列表，每个提交一段，无法解析的提交跳过"""
+        sections = []
+        for submission in submissions:
+            try:
+                submit_code_data = json.loads(submission.submit_code)
+                if submit_code_data and len(submit_code_data) > 0:
+                    content = submit_code_data[0].get('content', '')
+                    sections.append(f"""【{submission.assignment.title}】
 
-        try:
-            # 完全重新初始化数据库连接，避免事件循环绑定问题
-            from tortoise import Tortoise
-            from app.database import TORTOISE_ORM
+用户提交的代码：
+{content}
 
-            # 重新初始化
-            if not Tortoise._inited:
-                await Tortoise.init(config=TORTOISE_ORM)
+---
+""")
+            except (json.JSONDecodeError, IndexError, AttributeError) as e:
+                logging.warning(f"Failed to parse submission code: {e}")
+                continue
+        return sections
 
-            # 重新导入模型以确保使用新的连接
-            #! 其实关键在于用户模块() 重新导入即可不用重新连接数据库
-            from app.models.user import User as UserModel
-            from app.models.assignment import AssignmentSubmission as SubmissionModel
+    @classmethod
+    async def genUserProfile(cls, user_id: str = UserMatrixAI.username):
+        """增量更新 user_id 的画像；没有该用户的画像记录时不生成"""
+        logging.info(f"Received user profile generate request for {user_id}")
 
-            _user = await UserModel.filter(username=UserMatrixAI.username).first()
-            if not _user:
-                logging.error("No user found")
+        try:
+            user = await User.filter(username=user_id).first()
+            if not user:
+                logging.error(f"No user found: {user_id}")
                 return
-            user = _user
 
+            # 只处理上次更新画像之后新增或修改的提交（重新提交会刷新提交时间）
+            query = AssignmentSubmission.filter(student_id=user_id)
+            if user.profile_watermark:
+                query = query.filter(submitted_at__gt=user.profile_watermark)
             # 使用 prefetch_related 避免 N+1 查询
-            submissions = await SubmissionModel.filter(
-                student_id=UserMatrixAI.username
-            ).prefetch_related('assignment').all()
+            submissions = await query.order_by("submitted_at").prefetch_related('assignment')
 
             if not submissions:
-                logging.error("No submissions found for user")
+                logging.info("No new submissions since last profile update")
                 return
 
-            submission_str = ""
-            for submission in submissions:
-                try:
-                    submit_code_data = json.loads(submission.submit_code)
-                    if submit_code_data and len(submit_code_data) > 0:
-                        content = submit_code_data[0].get('content', '')
-                        submission_str += f"""【{submission.assignment.title}】
-
-用户提交的代码：
-{content}
-
----
-"""
-                except (json.JSONDecodeError, IndexError, AttributeError) as e:
-                    logging.warning(f"Failed to parse submission code: {e}")
-                    continue
+            # 超出画像的输入预算时舍弃最早的提交，两份提示词按较长的一份计算
+            submission_str, _ = AIBudget.fit_sections(
+                AIPromptType.PROFILE,
+                lambda text: max(
+                    AIPrompt.CODE_STYLE(user.code_style, text),
+                    AIPrompt.KNOWLEDGE_STATUS(user.knowledge_status, text),
+                    key=len,
+                ),
+                cls._submissionSections(submissions),
+                AI.AIConfig.MODEL,
+            )
+            # 生成期间到达的提交时间更晚，会在下一次更新中处理
+            user.profile_watermark = submissions[-1].submitted_at
 
             if not submission_str.strip():
                 logging.warning("No valid submission content found")
+                await user.save(update_fields=["profile_watermark"])
                 return
 
-            code_style = await cls.genUserCodeStyle(user.code_style, submission_str)
-            knowledge_status = await cls.genUserKnowledgeStatus(user.knowledge_status, submission_str)
-
-            user.code_style = code_style
-            user.knowledge_status = knowledge_status
-            await user.save()
+            # 两份总结互不依赖，并发生成
+            user.code_style, user.knowledge_status = await asyncio.gather(
+                cls.genUserCodeStyle(user.code_style, submission_str),
+                cls.genUserKnowledgeStatus(user.knowledge_status, submission_str),
+            )
+            await user.save(update_fields=["code_style", "knowledge_status", "profile_watermark"])
 
             logging.info("User profile updated successfully")
 
@@ -528,15 +885,72 @@ class AIAnalysisGenerator:
             logging.error(f"Error in genUserProfile: {e}")
             # 不抛出异常，避免影响主流程
 
+    @classmethod
+    async def _coalesced(cls, chunks: AsyncIterator[str], stream_type: str) -> AsyncGenerator[str, None]:
+        """合并模型输出的小块后再推送，并记录该流的输入块数与推送帧数"""
+        stats = {"type": stream_type, "chunks": 0, "frames": 0, "bytes": 0}
+        try:
+            async for text in coalesce_chunks(
+                chunks, AI.AIConfig.STREAM_FLUSH_MS / 1000, AI.AIConfig.STREAM_FLUSH_BYTES, stats
+            ):
+                yield text
+        finally:
+            cls._frame_totals["streams"] += 1
+            for field in ("chunks", "frames", "bytes"):
+                cls._frame_totals[field] += stats[field]
+            cls._recent_frames.append(stats)
+
+    @classmethod
+    def frameStats(cls) -> dict:
+        """流式输出的帧统计：累计值与最近若干个流"""
+        return {**cls._frame_totals, "recent": list(cls._recent_frames)}
+
+    @classmethod
+    async def _completeEvent(
+        cls, result_contents: list[dict], summary: Optional[str], on_complete: Optional[AnalysisCallback]
+    ) -> str:
+        """构建 complete 事件；提供回调时先保存结果，保存失败只记录日志，不影响本次推送"""
+        payload = {'content': result_contents, 'summary': summary, 'showInEditor': False}
+        if on_complete:
+            try:
+                await on_complete(MatrixAnalysisProps.model_validate(payload))
+            except Exception as e:
+                logging.error(f"Failed to persist streamed analysis: {e}")
+        return f"event: complete\ndata: {json.dumps(payload)}\n\n"
+
+    @classmethod
+    async def replayStream(cls, stream_type: str, analysis: MatrixAnalysisProps) -> AsyncGenerator[str, None]:
+        """
+        将已保存的分析按流式接口的事件格式快速回放
+
+        Args:
+            stream_type: 事件中的类型标记，如 resolution、knowledge
+            analysis: 已保存的分析结果
+        """
+        total = len(analysis.content)
+        yield f"event: section\ndata: {{\"type\": \"{stream_type}\", \"status\": \"generating\"}}\n\n"
+        full_content = "\n---\n".join(item.content for item in analysis.content)
+        yield f"data: {json.dumps({'chunk': full_content, 'type': stream_type})}\n\n"
+        yield f"event: section\ndata: {{\"type\": \"processing\", \"total\": {total}}}\n\n"
+        if stream_type in cls._ITEM_STREAMS:
+            # 与实时生成一致，逐项推送 item 事件
+            for index, item in enumerate(analysis.content):
+                yield f"event: item\ndata: {json.dumps({'type': stream_type, 'index': index, **item.model_dump()})}\n\n"
+                yield f"event: progress\ndata: {{\"current\": {index + 1}, \"total\": {total}}}\n\n"
+        else:
+            yield f"event: progress\ndata: {{\"current\": {total}, \"total\": {total}}}\n\n"
+        yield f"event: complete\ndata: {json.dumps(analysis.model_dump())}\n\n"
+
     @classmethod
     async def genResolutionsStream(
-        cls, assign_id: str
+        cls, assign_id: str, on_complete: Optional[AnalysisCallback] = None
     ) -> AsyncGenerator[str, None]:
         """
         流式生成解题分析
 
         Args:
             assign_id: 作业ID
+            on_complete: 生成完成后、推送 complete 事件前调用，用于保存结果
 
         Yields:
             SSE格式的数据流
@@ -548,47 +962,52 @@ class AIAnalysisGenerator:
             # 1. 流式获取所有可能解法
             yield f"event: section\ndata: {{\"type\": \"resolution\", \"status\": \"generating\"}}\n\n"
 
-            full_content = ""
-            async for chunk in AI.get_response_stream(
+            generators = await AssignmentController.get_test_generators(assign_id)
+            limit = asyncio.Semaphore(AI.AIConfig.SECTION_CONCURRENCY)
+            # 标题请求进行期间完成的解法合并成下一次批量请求，而不是每个解法单独一次短请求
+            titles = MicroBatcher(lambda batch: cls.genTitles(
+                [code for _, code in batch], code=True, indices=[index for index, _ in batch]
+            ))
+
+            async def _section(index: int, code: str) -> dict:
+                async with limit:
+                    title, complexity = await asyncio.gather(
+                        titles.submit((index, code)),
+                        cls.genComplexity(code, generators[0] if generators else None),
+                    )
+                return {"title": title, "content": code_md_wrapper(code), "complexity": complexity.model_dump()}
+
+            # 2. 边输出边切分解法，每个解法完整后立即并行生成标题和复杂度，不等待其余解法输出
+            sections: dict[int, dict] = {}
+            total: Optional[int] = None
+            async for kind, value in pipeline_sections(cls._coalesced(AI.get_response_stream(
                 messages=AIPrompt.RESOLUTION(
                     assign_data.title,
                     assign_data.description,
                     assign_data.assignOriginalCode[0].content
-                )
-            ):
-                full_content += chunk
-                yield f"data: {json.dumps({'chunk': chunk, 'type': 'resolution'})}\n\n"
-
-            # 2. 分割解法
-            resol_contents = [c.strip() for c in full_content.split("---") if c.strip()]
-
-            yield f"event: section\ndata: {{\"type\": \"processing\", \"total\": {len(resol_contents)}}}\n\n"
-
-            # 3. 为每个解法生成标题和复杂度
-            result_contents = []
-            for idx, code in enumerate(resol_contents):
-                yield f"event: progress\ndata: {{\"current\": {idx + 1}, \"total\": {len(resol_contents)}}}\n\n"
-
-                # 生成标题
-                title = await AI.get_response(AIPrompt.TITLE_CODE(code))
-
-                # 生成复杂度
-                complexity_text = await AI.get_response(AIPrompt.COMPLEXITY(code))
-                lines = complexity_text.split("\n")
-                time_complexity = lines[0].split(":")[-1].strip() if lines else "O(n)"
-                space_complexity = lines[1].split(":")[-1].strip() if len(lines) > 1 else "O(1)"
-
-                result_contents.append({
-                    "title": title,
-                    "content": code_md_wrapper(code),
-                    "complexity": {
-                        "time": time_complexity,
-                        "space": space_complexity
-                    }
-                })
-
-            # 4. 发送最终结果
-            yield f"event: complete\ndata: {json.dumps({'content': result_contents, 'summary': None, 'showInEditor': False})}\n\n"
+                ),
+                label="RESOLUTION",
+            ), "resolution"), _section):
+                if kind == "chunk":
+                    yield f"data: {json.dumps({'chunk': value, 'type': 'resolution'})}\n\n"
+                elif kind == "total":
+                    # 3. 输出结束后才能确定解法总数，补发输出期间已完成解法的进度
+                    total = value
+                    yield f"event: section\ndata: {{\"type\": \"processing\", \"total\": {total}}}\n\n"
+                    for done in range(1, len(sections) + 1):
+                        yield f"event: progress\ndata: {{\"current\": {done}, \"total\": {total}}}\n\n"
+                else:
+                    index, section = value
+                    sections[index] = section
+                    # 每个解法就绪时单独推送，前端可先展示已完成的解法
+                    yield f"event: item\ndata: {json.dumps({'type': 'resolution', 'index': index, **section})}\n\n"
+                    if total is not None:
+                        yield f"event: progress\ndata: {{\"current\": {len(sections)}, \"total\": {total}}}\n\n"
+
+            result_contents = [sections[index] for index in sorted(sections)]
+
+            # 4. 保存并发送最终结果
+            yield await cls._completeEvent(result_contents, None, on_complete)
 
         except Exception as e:
             error_msg = f"Internal server error: {str(e)}"
@@ -597,7 +1016,7 @@ class AIAnalysisGenerator:
 
     @classmethod
     async def genKnowledgeAnalysisStream(
-        cls, assign_id: str
+        cls, assign_id: str, on_complete: Optional[AnalysisCallback] = None
     ) -> AsyncGenerator[str, None]:
         """流式生成知识点分析"""
         try:
@@ -607,13 +1026,14 @@ class AIAnalysisGenerator:
             yield f"event: section\ndata: {{\"type\": \"knowledge\", \"status\": \"generating\"}}\n\n"
 
             full_content = ""
-            async for chunk in AI.get_response_stream(
+            async for chunk in cls._coalesced(AI.get_response_stream(
                 messages=AIPrompt.KNOWLEDGEANALYSIS(
                     assign_data.title,
                     assign_data.description,
                     assign_data.assignOriginalCode[0].content
-                )
-            ):
+                ),
+                label="KNOWLEDGEANALYSIS",
+            ), "knowledge"):
                 full_content += chunk
                 yield f"data: {json.dumps({'chunk': chunk, 'type': 'knowledge'})}\n\n"
 
@@ -621,18 +1041,20 @@ class AIAnalysisGenerator:
 
             yield f"event: section\ndata: {{\"type\": \"processing\", \"total\": {len(knowledge_contents)}}}\n\n"
 
-            result_contents = []
-            for idx, content_text in enumerate(knowledge_contents):
-                yield f"event: progress\ndata: {{\"current\": {idx + 1}, \"total\": {len(knowledge_contents)}}}\n\n"
+            # 批量生成标题
+            titles = await cls.genTitles(knowledge_contents)
+            yield f"event: progress\ndata: {{\"current\": {len(knowledge_contents)}, \"total\": {len(knowledge_contents)}}}\n\n"
 
-                title = await AI.get_response(AIPrompt.TITLE(content_text))
-                result_contents.append({
+            result_contents = [
+                {
                     "title": title,
                     "content": content_text,
                     "complexity": None
-                })
+                }
+                for title, content_text in zip(titles, knowledge_contents)
+            ]
 
-            yield f"event: complete\ndata: {json.dumps({'content': result_contents, 'summary': '', 'showInEditor': False})}\n\n"
+            yield await cls._completeEvent(result_contents, "", on_complete)
 
         except Exception as e:
             error_msg = f"Internal server error: {str(e)}"
@@ -641,7 +1063,7 @@ class AIAnalysisGenerator:
 
     @classmethod
     async def genCodeAnalysisStream(
-        cls, assign_id: str
+        cls, assign_id: str, on_complete: Optional[AnalysisCallback] = None
     ) -> AsyncGenerator[str, None]:
         """流式生成代码分析"""
         try:
@@ -663,14 +1085,15 @@ class AIAnalysisGenerator:
             yield f"event: section\ndata: {{\"type\": \"code_analysis\", \"status\": \"generating\"}}\n\n"
 
             full_content = ""
-            async for chunk in AI.get_response_stream(
+            async for chunk in cls._coalesced(AI.get_response_stream(
                 messages=AIPrompt.CODEANALYSIS(
                     assign_data.title,
                     assign_data.description,
                     submitted_code,
                     user.code_style
-                )
-            ):
+                ),
+                label="CODEANALYSIS",
+            ), "code_analysis"):
                 full_content += chunk
                 yield f"data: {json.dumps({'chunk': chunk, 'type': 'code_analysis'})}\n\n"
 
@@ -678,18 +1101,20 @@ class AIAnalysisGenerator:
 
             yield f"event: section\ndata: {{\"type\": \"processing\", \"total\": {len(code_analysis_contents)}}}\n\n"
 
-            result_contents = []
-            for idx, content_text in enumerate(code_analysis_contents):
-                yield f"event: progress\ndata: {{\"current\": {idx + 1}, \"total\": {len(code_analysis_contents)}}}\n\n"
+            # 批量生成标题
+            titles = await cls.genTitles(code_analysis_contents)
+            yield f"event: progress\ndata: {{\"current\": {len(code_analysis_contents)}, \"total\": {len(code_analysis_contents)}}}\n\n"
 
-                title = await AI.get_response(AIPrompt.TITLE(content_text))
-                result_contents.append({
+            result_contents = [
+                {
                     "title": title,
                     "content": content_text,
                     "complexity": None
-                })
+                }
+                for title, content_text in zip(titles, code_analysis_contents)
+            ]
 
-            yield f"event: complete\ndata: {json.dumps({'content': result_contents, 'summary': '', 'showInEditor': False})}\n\n"
+            yield await cls._completeEvent(result_contents, "", on_complete)
 
         except Exception as e:
             error_msg = f"Internal server error: {str(e)}"
@@ -698,7 +1123,7 @@ class AIAnalysisGenerator:
 
     @classmethod
     async def genLearningSuggestionsStream(
-        cls, assign_id: str
+        cls, assign_id: str, on_complete: Optional[AnalysisCallback] = None
     ) -> AsyncGenerator[str, None]:
         """流式生成学习建议"""
         try:
@@ -720,14 +1145,15 @@ class AIAnalysisGenerator:
             yield f"event: section\ndata: {{\"type\": \"learning\", \"status\": \"generating\"}}\n\n"
 
             full_content = ""
-            async for chunk in AI.get_response_stream(
+            async for chunk in cls._coalesced(AI.get_response_stream(
                 messages=AIPrompt.LEARNING_SUGGESTIONS(
                     assign_data.title,
                     assign_data.description,
                     submitted_code,
                     user.knowledge_status
-                )
-            ):
+                ),
+                label="LEARNING_SUGGESTIONS",
+            ), "learning"):
                 full_content += chunk
                 yield f"data: {json.dumps({'chunk': chunk, 'type': 'learning'})}\n\n"
 
@@ -735,18 +1161,20 @@ class AIAnalysisGenerator:
 
             yield f"event: section\ndata: {{\"type\": \"processing\", \"total\": {len(learning_contents)}}}\n\n"
 
-            result_contents = []
-            for idx, content_text in enumerate(learning_contents):
-                yield f"event: progress\ndata: {{\"current\": {idx + 1}, \"total\": {len(learning_contents)}}}\n\n"
+            # 批量生成标题
+            titles = await cls.genTitles(learning_contents)
+            yield f"event: progress\ndata: {{\"current\": {len(learning_contents)}, \"total\": {len(learning_contents)}}}\n\n"
 
-                title = await AI.get_response(AIPrompt.TITLE(content_text))
-                result_contents.append({
+            result_contents = [
+                {
                     "title": title,
                     "content": content_text,
                     "complexity": None
-                })
+                }
+                for title, content_text in zip(titles, learning_contents)
+            ]
 
-            yield f"event: complete\ndata: {json.dumps({'content': result_contents, 'summary': '', 'showInEditor': False})}\n\n"
+            yield await cls._completeEvent(result_contents, "", on_complete)
 
         except Exception as e:
             error_msg = f"Internal server error: {str(e)}"
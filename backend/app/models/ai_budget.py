@@ -0,0 +1,146 @@
+import os
+import logging
+import threading
+from dataclasses import dataclass
+from enum import Enum
+from typing import Callable
+
+from app.utils.tokens import count_message_tokens, count_tokens, truncate_tokens
+
+
+class AIPromptType(str, Enum):
+    """提示词类型，决定输入与输出的 token 预算"""
+    ANALYSIS = "analysis"  # 解法、知识点、代码分析、学习建议
+    SHORT = "short"        # 标题、复杂度等短回答
+    PROFILE = "profile"    # 用户画像
+    AGENT = "agent"        # 智能体对话
+
+
+@dataclass(frozen=True)
+class PromptBudget:
+    input_tokens: int
+    output_tokens: int
+
+
+def _budget(prompt_type: AIPromptType, input_tokens: int, output_tokens: int) -> PromptBudget:
+    prefix = f"AI_BUDGET_{prompt_type.name}"
+    return PromptBudget(
+        int(os.getenv(f"{prefix}_INPUT", str(input_tokens))),
+        int(os.getenv(f"{prefix}_OUTPUT", str(output_tokens))),
+    )
+
+
+TRUNCATED_MARK = "\n……（内容过长，已截断）\n"
+
+
+class AIBudget:
+    """
+    按提示词类型控制 token 预算
+
+    超出输入预算时先舍弃价值最低的部分：画像中最早的提交、对话中最早的轮次；
+    每次调用实际发送的 token 数按类型统计
+    """
+
+    BUDGETS = {
+        AIPromptType.ANALYSIS: _budget(AIPromptType.ANALYSIS, 6000, 1000),
+        AIPromptType.SHORT: _budget(AIPromptType.SHORT, 3000, 300),
+        AIPromptType.PROFILE: _budget(AIPromptType.PROFILE, 8000, 800),
+        AIPromptType.AGENT: _budget(AIPromptType.AGENT, 12000, 2000),
+    }
+
+    # 统计可能被其它线程中的事件循环更新
+    _lock = threading.Lock()
+    _stats = {
+        t: {"calls": 0, "promptTokens": 0, "maxPromptTokens": 0, "trimmedCalls": 0, "droppedParts": 0}
+        for t in AIPromptType
+    }
+
+    @classmethod
+    def output_tokens(cls, prompt_type: AIPromptType) -> int:
+        return cls.BUDGETS[prompt_type].output_tokens
+
+    @classmethod
+    def fit_sections(
+        cls, prompt_type: AIPromptType, render: Callable[[str], str], sections: list[str], model: str
+    ) -> tuple[str, int]:
+        """
+        在预算内拼接尽量多的分段
+
+        Args:
+            render: 由拼接后的分段生成完整提示词
+            sections: 按价值从低到高排列（如最早的提交在前）
+
+        Returns:
+            (拼接后的分段, 舍弃的分段数)；只剩一段仍超出时截断其结尾
+        """
+        budget = cls.BUDGETS[prompt_type].input_tokens
+        kept = list(sections)
+        while len(kept) > 1 and count_tokens(render("".join(kept)), model) > budget:
+            kept.pop(0)
+        dropped = len(sections) - len(kept)
+
+        text = "".join(kept)
+        if kept and count_tokens(render(text), model) > budget:
+            available = budget - count_tokens(render(""), model) - count_tokens(TRUNCATED_MARK, model)
+            text = truncate_tokens(text, available, model) + TRUNCATED_MARK
+        if dropped:
+            logging.info(f"{prompt_type.value} prompt over budget, dropped {dropped} oldest sections")
+            cls._record_trim(prompt_type, dropped)
+        return text, dropped
+
+    @classmethod
+    def fit_messages(cls, prompt_type: AIPromptType, messages: list[dict], model: str) -> list[dict]:
+        """
+        舍弃最早的对话轮次直到不超过预算
+
+        系统消息与最后一条消息始终保留；舍弃后开头不留下失去对应调用的工具结果
+        """
+        budget = cls.BUDGETS[prompt_type].input_tokens
+        if count_message_tokens(messages, model) <= budget:
+            return messages
+
+        system = [m for m in messages if m.get("role") == "system"]
+        turns = [m for m in messages if m.get("role") != "system"]
+        dropped = 0
+        while len(turns) > 1 and count_message_tokens(system + turns, model) > budget:
+            turns.pop(0)
+            dropped += 1
+            while len(turns) > 1 and turns[0].get("role") == "tool":
+                turns.pop(0)
+                dropped += 1
+
+        if count_message_tokens(system + turns, model) > budget:
+            logging.warning(f"{prompt_type.value} prompt still exceeds {budget} tokens after trimming history")
+        if dropped:
+            logging.info(f"{prompt_type.value} prompt over budget, dropped {dropped} oldest messages")
+            cls._record_trim(prompt_type, dropped)
+        return system + turns
+
+    @classmethod
+    def _record_trim(cls, prompt_type: AIPromptType, dropped: int) -> None:
+        with cls._lock:
+            stats = cls._stats[prompt_type]
+            stats["trimmedCalls"] += 1
+            stats["droppedParts"] += dropped
+
+    @classmethod
+    def record(cls, prompt_type: AIPromptType, prompt_tokens: int) -> None:
+        """记录一次调用实际发送的输入 token 数"""
+        with cls._lock:
+            stats = cls._stats[prompt_type]
+            stats["calls"] += 1
+            stats["promptTokens"] += prompt_tokens
+            stats["maxPromptTokens"] = max(stats["maxPromptTokens"], prompt_tokens)
+
+    @classmethod
+    def stats(cls) -> dict:
+        with cls._lock:
+            return {
+                t.value: {
+                    **s,
+                    "avgPromptTokens": round(s["promptTokens"] / s["calls"]) if s["calls"] else 0,
+                    "inputBudget": cls.BUDGETS[t].input_tokens,
+                    "outputBudget": cls.BUDGETS[t].output_tokens,
+                }
+                for t, s in cls._stats.items()
+            }
@@ -0,0 +1,172 @@
+import os
+import json
+import time
+import asyncio
+import hashlib
+import logging
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import AsyncGenerator, Iterable, Optional
+
+
+class AICache:
+    """
+    AI 响应缓存：进程内 LRU + 磁盘两级
+
+    键由模型、规范化后的消息与采样参数（temperature、max_tokens）哈希得到；
+    两级缓存都按 TTL 过期，内存按条数、磁盘按总大小淘汰最久未写入的项
+    """
+
+    ENABLED = os.getenv("AI_CACHE_ENABLED", "1").lower() not in ("0", "false", "no")
+    CACHE_DIR = Path(os.getenv("AI_CACHE_DIR", os.path.join(tempfile.gettempdir(), "matrix-ai-llm")))
+    TTL_SECONDS = int(os.getenv("AI_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+    MEMORY_ENTRIES = int(os.getenv("AI_CACHE_MEMORY_ENTRIES", "512"))
+    DISK_MAX_BYTES = int(os.getenv("AI_CACHE_DISK_MAX_MB", "256")) * 1024 * 1024
+    # 每写入多少次检查一次磁盘占用
+    EVICT_EVERY = 64
+    # 命中后按流式回放时每块的字符数
+    REPLAY_CHUNK = 64
+
+    # 内存层可能被其它线程中的事件循环（如同步代码里的 asyncio.run）访问，使用线程锁
+    _lock = threading.Lock()
+    _memory: "OrderedDict[str, tuple[float, str]]" = OrderedDict()
+    _writes = 0
+    _hits = {"memory": 0, "disk": 0}
+    _misses = 0
+
+    @staticmethod
+    def key(model: str, messages: Iterable[dict], temperature: float, max_tokens: int) -> str:
+        """计算缓存键，消息只保留角色与去除首尾空白的内容"""
+        normalized = [
+            {"role": m.get("role"), "content": (m.get("content") or "").strip()}
+            for m in messages
+        ]
+        payload = json.dumps(
+            {"model": model, "messages": normalized, "temperature": temperature, "max_tokens": max_tokens},
+            ensure_ascii=False,
+            sort_keys=True,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    @classmethod
+    def _path(cls, key: str) -> Path:
+        return cls.CACHE_DIR / key[:2] / f"{key}.json"
+
+    @classmethod
+    async def get(cls, key: str) -> Optional[str]:
+        """查询缓存，未命中或已过期返回 None"""
+        now = time.time()
+        with cls._lock:
+            entry = cls._memory.get(key)
+            if entry is not None:
+                created, text = entry
+                if now - created <= cls.TTL_SECONDS:
+                    cls._memory.move_to_end(key)
+                    cls._hits["memory"] += 1
+                    return text
+                del cls._memory[key]
+
+        entry = await asyncio.to_thread(cls._load_disk, key, now)
+        with cls._lock:
+            if entry is None:
+                cls._misses += 1
+                return None
+            cls._hits["disk"] += 1
+            cls._remember(key, *entry)
+        return entry[1]
+
+    @classmethod
+    async def set(cls, key: str, text: str) -> None:
+        """写入缓存，空响应不缓存"""
+        if not text:
+            return
+        created = time.time()
+        with cls._lock:
+            cls._remember(key, created, text)
+            cls._writes += 1
+            evict = cls._writes % cls.EVICT_EVERY == 0
+        try:
+            await asyncio.to_thread(cls._store_disk, key, created, text)
+            if evict:
+                await asyncio.to_thread(cls._evict_disk)
+        except OSError as e:
+            # 磁盘层只是加速手段，写失败不影响本次请求
+            logging.warning(f"AI cache disk write failed: {e}")
+
+    @staticmethod
+    async def replay(text: str) -> AsyncGenerator[str, None]:
+        """将缓存的完整响应按块回放为流"""
+        for start in range(0, len(text), AICache.REPLAY_CHUNK):
+            yield text[start:start + AICache.REPLAY_CHUNK]
+
+    @classmethod
+    def clear(cls) -> None:
+        """清空内存层，磁盘层保留"""
+        with cls._lock:
+            cls._memory.clear()
+
+    @classmethod
+    def stats(cls) -> dict:
+        with cls._lock:
+            return {
+                "enabled": cls.ENABLED,
+                "memoryEntries": len(cls._memory),
+                "memoryHits": cls._hits["memory"],
+                "diskHits": cls._hits["disk"],
+                "misses": cls._misses,
+            }
+
+    @classmethod
+    def _remember(cls, key: str, created: float, text: str) -> None:
+        """写入内存层（调用方需持有锁）"""
+        cls._memory[key] = (created, text)
+        cls._memory.move_to_end(key)
+        while len(cls._memory) > cls.MEMORY_ENTRIES:
+            cls._memory.popitem(last=False)
+
+    @classmethod
+    def _load_disk(cls, key: str, now: float) -> Optional[tuple[float, str]]:
+        path = cls._path(key)
+        try:
+            entry = json.loads(path.read_text(encoding="utf-8"))
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        if now - entry["created"] > cls.TTL_SECONDS:
+            path.unlink(missing_ok=True)
+            return None
+        return entry["created"], entry["text"]
+
+    @classmethod
+    def _store_disk(cls, key: str, created: float, text: str) -> None:
+        path = cls._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # 先写临时文件再原子替换，避免并发读到写了一半的文件
+        staging = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        staging.write_text(json.dumps({"created": created, "text": text}, ensure_ascii=False), encoding="utf-8")
+        os.replace(staging, path)
+
+    @classmethod
+    def _evict_disk(cls) -> None:
+        """删除过期项；总大小超限时按写入时间从旧到新删除，直到降到上限的 90%"""
+        now = time.time()
+        entries: list[tuple[float, int, Path]] = []
+        for path in cls.CACHE_DIR.glob("*/*.json"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            if now - stat.st_mtime > cls.TTL_SECONDS:
+                path.unlink(missing_ok=True)
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        if total <= cls.DISK_MAX_BYTES:
+            return
+        for _, size, path in sorted(entries):
+            path.unlink(missing_ok=True)
+            total -= size
+            if total <= cls.DISK_MAX_BYTES * 0.9:
+                break
@@ -0,0 +1,237 @@
+import os
+import asyncio
+import uuid
+import hashlib
+import logging
+from collections import deque
+from typing import Any, AsyncGenerator, Awaitable, Callable, Hashable, Optional
+
+
+def content_version(*parts: Any) -> str:
+    """由影响生成结果的内容计算版本号，内容变化后不会合并到旧的生成上"""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(str(part).encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()[:16]
+
+
+class _StreamFlight:
+    """
+    一次正在进行的流式生成：生产者写入事件，任意多个订阅者回放缓冲区中的事件并跟随后续事件
+
+    缓冲区只保留最近 max_events 条，落后过多的订阅者从仍保留的最早事件继续。
+    推送的每条事件带有 `id: <生成 ID>:<序号>`，断线重连时据此从下一条继续
+    """
+
+    def __init__(self, key: Hashable, max_events: int, persist: bool) -> None:
+        self.key = key
+        self.gen = uuid.uuid4().hex[:12]
+        self.events: deque[str] = deque(maxlen=max_events)
+        # events[0] 对应的全局序号与下一条事件的序号
+        self.first_seq = 0
+        self.next_seq = 0
+        self.done = False
+        self.persist = persist
+        self.subscribers = 0
+        self.task: asyncio.Task | None = None
+        self._updated = asyncio.Event()
+
+    def _notify(self) -> None:
+        updated, self._updated = self._updated, asyncio.Event()
+        updated.set()
+
+    def append(self, event: str) -> None:
+        if len(self.events) == self.events.maxlen:
+            self.first_seq += 1
+        self.events.append(event)
+        self.next_seq += 1
+        self._notify()
+
+    def finish(self) -> None:
+        self.done = True
+        self._notify()
+
+    async def subscribe(self, after: Optional[int] = None) -> AsyncGenerator[str, None]:
+        """从序号 after 之后（默认从缓冲区最早的事件）开始推送"""
+        seq = self.first_seq if after is None else after + 1
+        while True:
+            seq = max(seq, self.first_seq)
+            if seq < self.next_seq:
+                event = self.events[seq - self.first_seq]
+                yield f"id: {self.gen}:{seq}\n{event}"
+                seq += 1
+                continue
+            if self.done:
+                return
+            await self._updated.wait()
+
+
+class AISingleFlight:
+    """
+    相同生成的合并：按 (作业, 分析类型, 内容版本) 登记正在进行的生成
+
+    第一个请求真正发起生成，之后到达的请求挂到同一次生成上：
+    非流式接口等待同一个结果，流式接口回放已产生的事件并跟随后续事件。
+    生成与请求解耦，发起者断开也会继续完成，供其余等待者使用；
+    流式生成的结果不需要保存时，最后一个订阅者断开并超过重连等待时间后取消上游生成。
+    流式生成结束后事件记录再保留一段时间，带 Last-Event-ID 重连的请求从断点继续
+    """
+
+    # 每个流式生成保留的最近事件条数
+    REPLAY_EVENTS = int(os.getenv("AI_STREAM_REPLAY_EVENTS", "4096"))
+    # 生成结束后事件记录的保留时间（秒）
+    LOG_TTL = float(os.getenv("AI_STREAM_LOG_TTL", "300"))
+    # 所有订阅者断开后等待重连的时间（秒），之后才取消不需保存的生成
+    RESUME_GRACE = float(os.getenv("AI_STREAM_RESUME_GRACE", "15"))
+
+    _calls: dict[Hashable, asyncio.Task] = {}
+    _streams: dict[Hashable, _StreamFlight] = {}
+    # 生成 ID -> 进行中或刚结束的流式生成
+    _generations: dict[str, _StreamFlight] = {}
+    _joined = 0
+    _resumed = 0
+    _cancelled = 0
+
+    @classmethod
+    async def do(cls, key: Hashable, factory: Callable[[], Awaitable[Any]]) -> Any:
+        """执行或加入一次非流式生成"""
+        task = cls._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(factory())
+            cls._calls[key] = task
+            task.add_done_callback(lambda t: cls._finish_call(key, t))
+        else:
+            cls._joined += 1
+            logging.info(f"Joined in-flight generation {key}")
+        return await asyncio.shield(task)
+
+    @classmethod
+    def _finish_call(cls, key: Hashable, task: asyncio.Task) -> None:
+        if cls._calls.get(key) is task:
+            del cls._calls[key]
+        # 所有等待者都已断开时也要取回异常，避免未处理异常的警告
+        if not task.cancelled():
+            task.exception()
+
+    @staticmethod
+    def parse_event_id(value: Optional[str]) -> Optional[tuple[str, int]]:
+        """解析 `<生成 ID>:<序号>` 格式的事件 ID，格式不符返回 None"""
+        if not value:
+            return None
+        gen, _, seq = value.strip().rpartition(":")
+        if not gen or not seq.isdigit():
+            return None
+        return gen, int(seq)
+
+    @classmethod
+    def _resume_point(cls, key: Hashable, last_event_id: Optional[str]) -> Optional[tuple[_StreamFlight, int]]:
+        parsed = cls.parse_event_id(last_event_id)
+        if parsed is None:
+            return None
+        flight = cls._generations.get(parsed[0])
+        # 只能续接同一作业同一分析的生成
+        if flight is None or flight.key != key or parsed[1] >= flight.next_seq:
+            return None
+        # 下一条事件已被挤出缓冲区，续接会悄悄丢失中间的事件，交由调用方回放已保存的结果或重新生成
+        if parsed[1] + 1 < flight.first_seq:
+            return None
+        return flight, parsed[1]
+
+    @classmethod
+    def resumable(cls, key: Hashable, last_event_id: Optional[str]) -> bool:
+        """Last-Event-ID 对应的事件记录是否仍然可用"""
+        return cls._resume_point(key, last_event_id) is not None
+
+    @classmethod
+    async def stream(
+        cls,
+        key: Hashable,
+        factory: Callable[[], AsyncGenerator[str, None]],
+        persist: bool = False,
+        last_event_id: Optional[str] = None,
+    ) -> AsyncGenerator[str, None]:
+        """
+        执行、加入或续接一次流式生成
+
+        Args:
+            key: 生成的标识
+            factory: 创建上游事件流
+            persist: 生成结果会被保存；为 True 时所有订阅者断开后仍继续生成
+            last_event_id: 客户端重连时带上的最后一条事件 ID，记录仍在时从下一条继续
+        """
+        after: Optional[int] = None
+        resume = cls._resume_point(key, last_event_id)
+        if resume is not None:
+            flight, after = resume
+            cls._resumed += 1
+            logging.info(f"Resuming stream {key} after event {last_event_id}")
+        else:
+            flight = cls._streams.get(key)
+            if flight is None:
+                flight = _StreamFlight(key, cls.REPLAY_EVENTS, persist)
+                cls._streams[key] = flight
+                cls._generations[flight.gen] = flight
+                # 持有任务引用，避免生产者在无人等待时被回收
+                flight.task = asyncio.ensure_future(cls._produce(key, flight, factory))
+            else:
+                cls._joined += 1
+                logging.info(f"Joined in-flight stream {key}")
+        flight.persist = flight.persist or persist
+
+        flight.subscribers += 1
+        try:
+            async for event in flight.subscribe(after):
+                yield event
+        finally:
+            flight.subscribers -= 1
+            if flight.subscribers == 0 and not flight.done and not flight.persist:
+                if cls.RESUME_GRACE > 0:
+                    asyncio.get_running_loop().call_later(cls.RESUME_GRACE, cls._cancel_if_idle, key, flight)
+                else:
+                    cls._cancel_if_idle(key, flight)
+
+    @classmethod
+    def _cancel_if_idle(cls, key: Hashable, flight: _StreamFlight) -> None:
+        """等待重连的时间内没有订阅者回来，取消上游生成"""
+        if flight.subscribers > 0 or flight.done or flight.persist:
+            return
+        logging.info(f"Cancelling in-flight stream {key}: no subscribers left")
+        cls._cancelled += 1
+        # 立即注销，之后到达的请求重新发起生成而不是加入或续接正在取消的这次
+        if cls._streams.get(key) is flight:
+            del cls._streams[key]
+        cls._generations.pop(flight.gen, None)
+        flight.task.cancel()
+
+    @classmethod
+    async def _produce(cls, key: Hashable, flight: _StreamFlight, factory: Callable[[], AsyncGenerator[str, None]]) -> None:
+        try:
+            async for event in factory():
+                flight.append(event)
+        except Exception as e:
+            logging.error(f"In-flight stream {key} failed: {e}")
+            flight.append(f"event: error\ndata: {{\"error\": \"Internal server error\"}}\n\n")
+        finally:
+            if cls._streams.get(key) is flight:
+                del cls._streams[key]
+            flight.finish()
+            if cls._generations.get(flight.gen) is flight:
+                asyncio.get_running_loop().call_later(cls.LOG_TTL, cls._expire_log, flight)
+
+    @classmethod
+    def _expire_log(cls, flight: _StreamFlight) -> None:
+        if cls._generations.get(flight.gen) is flight:
+            del cls._generations[flight.gen]
+
+    @classmethod
+    def stats(cls) -> dict:
+        return {
+            "inFlightCalls": len(cls._calls),
+            "inFlightStreams": len(cls._streams),
+            "streamSubscribers": sum(f.subscribers for f in cls._streams.values()),
+            "streamLogs": len(cls._generations),
+            "joined": cls._joined,
+            "resumed": cls._resumed,
+            "cancelledStreams": cls._cancelled,
+        }
@@ -0,0 +1,276 @@
+import os
+import time
+import heapq
+import asyncio
+import itertools
+import threading
+from enum import IntEnum
+from dataclasses import dataclass, field
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
+
+
+class AIPriority(IntEnum):
+    """AI 调用优先级，数值越小越优先"""
+    INTERACTIVE = 0  # 智能体对话
+    ANALYSIS = 1     # 按需生成的分析
+    BACKGROUND = 2   # 后台用户画像等
+
+
+class AIGovernorTimeout(Exception):
+    """排队超时仍未获得调用额度"""
+
+
+class _TokenBucket:
+    """令牌桶，按每分钟额度匀速补充；容量为 0 表示不限制"""
+
+    def __init__(self, per_minute: int) -> None:
+        self.capacity = float(per_minute)
+        self.level = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.updated = time.monotonic()
+
+    @property
+    def unlimited(self) -> bool:
+        return self.capacity <= 0
+
+    def _refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """还需等待多少秒才能取出 amount，超过容量的请求按容量计"""
+        if self.unlimited:
+            return 0.0
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        return 0.0 if self.level >= amount else (amount - self.level) / self.rate
+
+    def take(self, amount: float) -> None:
+        if not self.unlimited:
+            self.level -= min(amount, self.capacity)
+
+    def refund(self, amount: float) -> None:
+        if not self.unlimited and amount > 0:
+            self.level = min(self.capacity, self.level + amount)
+
+
+@dataclass
+class AILease:
+    """一次调用占用的额度，调用结束后可回填实际 token 用量以退还多预留的部分"""
+    priority: AIPriority
+    reserved_tokens: int
+    waited: float = 0.0
+    used_tokens: Optional[int] = None
+
+
+@dataclass(order=True)
+class _Waiter:
+    priority: int
+    seq: int
+    tokens: int = field(compare=False)
+    loop: asyncio.AbstractEventLoop = field(compare=False)
+    future: asyncio.Future = field(compare=False)
+    enqueued_at: float = field(compare=False, default_factory=time.monotonic)
+    granted: bool = field(compare=False, default=False)
+
+
+class AIGovernor:
+    """
+    全局 AI 调用调度：限制同时进行的请求数、每分钟请求数与每分钟 token 数
+
+    - 按优先级排队：智能体对话 > 按需分析 > 后台任务，同优先级先到先得
+    - 各优先级有独立的排队超时
+    - 状态由线程锁保护，放行时通过 call_soon_threadsafe 唤醒等待者所在的事件循环，
+      其它线程中的事件循环（如同步代码里的 asyncio.run）也可以安全使用
+    """
+
+    MAX_CONCURRENCY = int(os.getenv("AI_MAX_CONCURRENCY", "8"))
+    QUEUE_TIMEOUT = {
+        AIPriority.INTERACTIVE: float(os.getenv("AI_QUEUE_TIMEOUT_INTERACTIVE", "30")),
+        AIPriority.ANALYSIS: float(os.getenv("AI_QUEUE_TIMEOUT_ANALYSIS", "120")),
+        AIPriority.BACKGROUND: float(os.getenv("AI_QUEUE_TIMEOUT_BACKGROUND", "600")),
+    }
+
+    _lock = threading.Lock()
+    _rpm = _TokenBucket(int(os.getenv("AI_RPM", "60")))
+    _tpm = _TokenBucket(int(os.getenv("AI_TPM", "100000")))
+    _waiters: list[_Waiter] = []
+    _seq = itertools.count()
+    _running = 0
+    _timer: Optional[threading.Timer] = None
+    _metrics = {
+        p: {"granted": 0, "timeouts": 0, "waitTotal": 0.0, "waitMax": 0.0}
+        for p in AIPriority
+    }
+
+    @classmethod
+    def configure(cls, max_concurrency: Optional[int] = None, rpm: Optional[int] = None, tpm: Optional[int] = None) -> None:
+        """调整额度并重置令牌桶"""
+        with cls._lock:
+            if max_concurrency is not None:
+                cls.MAX_CONCURRENCY = max_concurrency
+            if rpm is not None:
+                cls._rpm = _TokenBucket(rpm)
+            if tpm is not None:
+                cls._tpm = _TokenBucket(tpm)
+
+    @classmethod
+    @asynccontextmanager
+    async def slot(cls, priority: AIPriority = AIPriority.ANALYSIS, tokens: int = 0) -> AsyncIterator[AILease]:
+        """
+        获取一次 AI 调用的额度，退出时释放
+
+        Args:
+            priority: 调用优先级
+            tokens: 预估的 token 数（提示词 + 最大输出），用于每分钟 token 限额
+
+        Raises:
+            AIGovernorTimeout: 排队超过该优先级的超时时间
+        """
+        lease = await cls._acquire(priority, tokens)
+        try:
+            yield lease
+        finally:
+            unused = lease.reserved_tokens - lease.used_tokens if lease.used_tokens is not None else 0
+            cls._release(unused)
+
+    @classmethod
+    @asynccontextmanager
+    async def try_slot(cls, priority: AIPriority = AIPriority.ANALYSIS, tokens: int = 0) -> AsyncIterator[Optional[AILease]]:
+        """
+        不排队地获取一次额度，退出时释放；有人排队或额度已满时得到 None
+
+        用于对冲请求等可有可无的调用，不挤占正在排队的请求
+        """
+        with cls._lock:
+            now = time.monotonic()
+            available = (
+                cls._running < cls.MAX_CONCURRENCY
+                and not any(not w.future.done() for w in cls._waiters)
+                and cls._rpm.wait_time(1, now) == 0
+                and cls._tpm.wait_time(tokens, now) == 0
+            )
+            if available:
+                cls._rpm.take(1)
+                cls._tpm.take(tokens)
+                cls._running += 1
+                cls._metrics[priority]["granted"] += 1
+
+        if not available:
+            yield None
+            return
+        lease = AILease(priority=priority, reserved_tokens=tokens)
+        try:
+            yield lease
+        finally:
+            unused = lease.reserved_tokens - lease.used_tokens if lease.used_tokens is not None else 0
+            cls._release(unused)
+
+    @classmethod
+    async def _acquire(cls, priority: AIPriority, tokens: int) -> AILease:
+        loop = asyncio.get_running_loop()
+        waiter = _Waiter(int(priority), next(cls._seq), tokens, loop, loop.create_future())
+        with cls._lock:
+            heapq.heappush(cls._waiters, waiter)
+            cls._dispatch_locked()
+
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), cls.QUEUE_TIMEOUT[priority])
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            with cls._lock:
+                granted = waiter.granted
+                if not granted:
+                    cls._waiters.remove(waiter)
+                    heapq.heapify(cls._waiters)
+                    if isinstance(e, asyncio.TimeoutError):
+                        cls._metrics[priority]["timeouts"] += 1
+            if granted:
+                # 放行与超时/取消同时发生，归还刚拿到的额度
+                cls._release(tokens)
+            if isinstance(e, asyncio.TimeoutError):
+                raise AIGovernorTimeout(f"AI request queued for more than {cls.QUEUE_TIMEOUT[priority]}s") from None
+            raise
+
+        waited = time.monotonic() - waiter.enqueued_at
+        with cls._lock:
+            metrics = cls._metrics[priority]
+            metrics["granted"] += 1
+            metrics["waitTotal"] += waited
+            metrics["waitMax"] = max(metrics["waitMax"], waited)
+        return AILease(priority=priority, reserved_tokens=tokens, waited=waited)
+
+    @classmethod
+    def _release(cls, unused_tokens: int = 0) -> None:
+        with cls._lock:
+            cls._running -= 1
+            cls._tpm.refund(unused_tokens)
+            cls._dispatch_locked()
+
+    @classmethod
+    def _dispatch(cls) -> None:
+        with cls._lock:
+            cls._timer = None
+            cls._dispatch_locked()
+
+    @classmethod
+    def _dispatch_locked(cls) -> None:
+        """按优先级放行队首等待者（调用方需持有锁）；额度不足时定时重试"""
+        now = time.monotonic()
+        while cls._waiters and cls._running < cls.MAX_CONCURRENCY:
+            head = cls._waiters[0]
+            if head.future.done():
+                heapq.heappop(cls._waiters)
+                continue
+            delay = max(cls._rpm.wait_time(1, now), cls._tpm.wait_time(head.tokens, now))
+            if delay > 0:
+                if cls._timer is None:
+                    cls._timer = threading.Timer(delay, cls._dispatch)
+                    cls._timer.daemon = True
+                    cls._timer.start()
+                return
+
+            heapq.heappop(cls._waiters)
+            cls._rpm.take(1)
+            cls._tpm.take(head.tokens)
+            cls._running += 1
+            head.granted = True
+            try:
+                head.loop.call_soon_threadsafe(cls._grant, head)
+            except RuntimeError:
+                # 等待者所在的事件循环已关闭
+                cls._running -= 1
+                cls._tpm.refund(head.tokens)
+
+    @staticmethod
+    def _grant(waiter: _Waiter) -> None:
+        if not waiter.future.done():
+            waiter.future.set_result(None)
+
+    @classmethod
+    def stats(cls) -> dict:
+        """各优先级的排队与等待时间统计"""
+        with cls._lock:
+            now = time.monotonic()
+            cls._rpm._refill(now)
+            cls._tpm._refill(now)
+            queued = {p: 0 for p in AIPriority}
+            for waiter in cls._waiters:
+                if not waiter.future.done():
+                    queued[AIPriority(waiter.priority)] += 1
+            return {
+                "maxConcurrency": cls.MAX_CONCURRENCY,
+                "running": cls._running,
+                "rpmAvailable": None if cls._rpm.unlimited else round(cls._rpm.level, 2),
+                "tpmAvailable": None if cls._tpm.unlimited else round(cls._tpm.level),
+                "priorities": {
+                    p.name.lower(): {
+                        "queued": queued[p],
+                        "granted": m["granted"],
+                        "timeouts": m["timeouts"],
+                        "waitAvgSeconds": round(m["waitTotal"] / m["granted"], 4) if m["granted"] else 0.0,
+                        "waitMaxSeconds": round(m["waitMax"], 4),
+                    }
+                    for p, m in cls._metrics.items()
+                },
+            }
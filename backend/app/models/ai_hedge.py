@@ -0,0 +1,164 @@
+import os
+import math
+import time
+import asyncio
+import logging
+from collections import deque
+from typing import Awaitable, Callable, Optional, TypeVar
+
+from app.models.ai_budget import AIPromptType
+from app.models.ai_governor import AIGovernor, AIPriority
+
+T = TypeVar("T")
+
+
+class AIDeadlineExceeded(Exception):
+    """调用超过该类提示词的截止时间仍未返回"""
+
+
+def _deadline(prompt_type: AIPromptType, seconds: float) -> float:
+    return float(os.getenv(f"AI_DEADLINE_{prompt_type.name}", str(seconds)))
+
+
+_WINDOW = int(os.getenv("AI_HEDGE_WINDOW", "200"))
+
+
+class AIHedge:
+    """
+    按提示词类型的调用截止时间与对冲请求
+
+    - 每类调用有截止时间（不含排队），超时抛出 AIDeadlineExceeded；0 表示不限
+    - 可对冲的类型（默认只有标题、复杂度等短回答）超过该类近期 p95 延迟仍未返回时，
+      再发一次相同请求，取先成功的结果并取消另一个
+    - 对冲请求不排队，只在调度器当前有空闲额度时发出
+    """
+
+    DEADLINES = {
+        AIPromptType.ANALYSIS: _deadline(AIPromptType.ANALYSIS, 180),
+        AIPromptType.SHORT: _deadline(AIPromptType.SHORT, 30),
+        AIPromptType.PROFILE: _deadline(AIPromptType.PROFILE, 300),
+        AIPromptType.AGENT: _deadline(AIPromptType.AGENT, 0),
+    }
+    HEDGE_TYPES = {
+        AIPromptType(t.strip()) for t in os.getenv("AI_HEDGE_TYPES", "short").split(",") if t.strip()
+    }
+    # 按最近 WINDOW 次调用估计 p95，样本少于 MIN_SAMPLES 时不对冲
+    WINDOW = _WINDOW
+    MIN_SAMPLES = int(os.getenv("AI_HEDGE_MIN_SAMPLES", "20"))
+    # 对冲前至少等待的秒数，避免延迟普遍很低时频繁重复请求
+    MIN_DELAY = float(os.getenv("AI_HEDGE_MIN_DELAY", "0.5"))
+    PERCENTILE = 0.95
+
+    _latencies = {t: deque(maxlen=_WINDOW) for t in AIPromptType}
+    _stats = {
+        t: {"calls": 0, "deadlineExceeded": 0, "hedged": 0, "hedgeWins": 0, "hedgeSkipped": 0}
+        for t in AIPromptType
+    }
+
+    @classmethod
+    def hedge_delay(cls, prompt_type: AIPromptType) -> Optional[float]:
+        """该类调用多久未返回时发出对冲请求；不对冲时返回 None"""
+        if prompt_type not in cls.HEDGE_TYPES or len(cls._latencies[prompt_type]) < cls.MIN_SAMPLES:
+            return None
+        return max(cls.MIN_DELAY, cls._percentile(prompt_type))
+
+    @classmethod
+    def _percentile(cls, prompt_type: AIPromptType) -> Optional[float]:
+        samples = sorted(cls._latencies[prompt_type])
+        return samples[math.ceil(cls.PERCENTILE * len(samples)) - 1] if samples else None
+
+    @classmethod
+    async def run(
+        cls, prompt_type: AIPromptType, priority: AIPriority, tokens: int, call: Callable[[], Awaitable[T]]
+    ) -> T:
+        """
+        在截止时间内执行一次调用，必要时对冲
+
+        Args:
+            priority: 对冲请求申请额度时使用的优先级
+            tokens: 对冲请求预留的 token 数
+            call: 每次调用发起一个新请求；第一个请求的额度由调用方持有
+
+        Raises:
+            AIDeadlineExceeded: 超过该类提示词的截止时间
+        """
+        cls._stats[prompt_type]["calls"] += 1
+        deadline = cls.DEADLINES[prompt_type]
+        started = time.monotonic()
+        try:
+            result = await asyncio.wait_for(cls._hedged(prompt_type, priority, tokens, call), deadline or None)
+        except asyncio.TimeoutError:
+            # 请求自身抛出的超时按原样上抛，只有到达截止时间才算超时
+            if not deadline or time.monotonic() - started < deadline:
+                raise
+            cls._stats[prompt_type]["deadlineExceeded"] += 1
+            raise AIDeadlineExceeded(f"{prompt_type.value} AI call exceeded its {deadline}s deadline") from None
+        cls._latencies[prompt_type].append(time.monotonic() - started)
+        return result
+
+    @classmethod
+    async def _hedged(
+        cls, prompt_type: AIPromptType, priority: AIPriority, tokens: int, call: Callable[[], Awaitable[T]]
+    ) -> T:
+        delay = cls.hedge_delay(prompt_type)
+        if delay is None:
+            return await call()
+
+        stats = cls._stats[prompt_type]
+        first = asyncio.ensure_future(call())
+        try:
+            done, _ = await asyncio.wait({first}, timeout=delay)
+            if done:
+                return first.result()
+
+            async with AIGovernor.try_slot(priority, tokens) as lease:
+                if lease is None:
+                    stats["hedgeSkipped"] += 1
+                    return await first
+
+                stats["hedged"] += 1
+                logging.info(f"{prompt_type.value} AI call slower than {delay:.2f}s, sending a hedged request")
+                second = asyncio.ensure_future(call())
+                try:
+                    winner = await cls._first_success(first, second)
+                finally:
+                    await cls._cancel(second)
+                if winner is second:
+                    stats["hedgeWins"] += 1
+                return winner.result()
+        finally:
+            await cls._cancel(first)
+
+    @staticmethod
+    async def _first_success(*tasks: asyncio.Future) -> asyncio.Future:
+        """返回最先成功的任务；全部失败时抛出最先出现的异常"""
+        pending = set(tasks)
+        error: Optional[BaseException] = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task
+                error = error or task.exception()
+        raise error
+
+    @staticmethod
+    async def _cancel(task: asyncio.Future) -> None:
+        if not task.done():
+            task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    @classmethod
+    def stats(cls) -> dict:
+        """各类调用的截止时间、近期 p95 延迟与对冲次数，hedgeWins 为对冲请求先返回的次数"""
+        result = {}
+        for t, s in cls._stats.items():
+            p95 = cls._percentile(t)
+            result[t.value] = {
+                **s,
+                "deadlineSeconds": cls.DEADLINES[t] or None,
+                "hedging": t in cls.HEDGE_TYPES,
+                "p95Seconds": None if p95 is None else round(p95, 4),
+                "hedgeWinRate": round(s["hedgeWins"] / s["hedged"], 4) if s["hedged"] else 0.0,
+            }
+        return result
@@ -0,0 +1,293 @@
+import os
+import json
+import time
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from typing import Any, AsyncGenerator, Awaitable, Callable, Optional, TypeVar
+
+import httpx
+import openai
+from openai import AsyncOpenAI
+
+from app.utils.http import LoopLocalTransport, pool_limits, timeouts
+
+T = TypeVar("T")
+
+
+class AIProviderUnavailable(Exception):
+    """没有任何端点可供尝试（未配置端点）"""
+
+
+@dataclass
+class AIProvider:
+    """一个 OpenAI 兼容的模型服务端点及其健康状态"""
+    name: str
+    base_url: str
+    model: str
+    api_key: str = ""
+    client: Optional[AsyncOpenAI] = None
+    # 非流式调用的总耗时与流式调用的首块耗时，分别做指数加权平均
+    latency_ewma: Optional[float] = None
+    ttft_ewma: Optional[float] = None
+    error_ewma: float = 0.0
+    consecutive_failures: int = 0
+    # 熔断截止时间（time.monotonic），期间只作为最后的备选
+    down_until: float = 0.0
+    in_flight: int = 0
+    calls: int = 0
+    failures: int = 0
+    last_error: Optional[str] = field(default=None, repr=False)
+
+    def healthy(self, now: float) -> bool:
+        return self.down_until <= now
+
+
+class AIProviderPool:
+    """
+    多个 OpenAI 兼容端点组成的模型服务池
+
+    - OPENAI_BASE_URL/OPENAI_MODEL/OPENAI_API_KEY 为主端点，AI_PROVIDERS（JSON 列表）追加备用端点
+    - 按延迟与错误率的指数加权平均选择端点，尚无数据的端点按配置顺序优先尝试
+    - 连接失败、超时、限流与 5xx 时换下一个端点重试；请求本身有误（400）不重试
+    - 连续失败达到阈值的端点熔断一段时间，后台定时探测恢复
+    - 流式调用只在收到第一块之前切换端点
+    """
+
+    EWMA_ALPHA = float(os.getenv("AI_PROVIDER_EWMA_ALPHA", "0.3"))
+    # 错误率对延迟评分的放大系数
+    ERROR_PENALTY = float(os.getenv("AI_PROVIDER_ERROR_PENALTY", "4"))
+    FAILURE_THRESHOLD = int(os.getenv("AI_PROVIDER_FAILURE_THRESHOLD", "3"))
+    COOLDOWN_SECONDS = float(os.getenv("AI_PROVIDER_COOLDOWN_SECONDS", "30"))
+    PROBE_INTERVAL = float(os.getenv("AI_PROVIDER_PROBE_INTERVAL", "30"))
+    PROBE_TIMEOUT = float(os.getenv("AI_PROVIDER_PROBE_TIMEOUT", "5"))
+
+    _transport = LoopLocalTransport(pool_limits("AI_HTTP"))
+    providers: list[AIProvider] = []
+    _probe_task: Optional[asyncio.Task] = None
+    _failovers = 0
+
+    @classmethod
+    def _client(cls, provider: AIProvider, max_retries: int) -> AsyncOpenAI:
+        # 所有端点共享同一个按事件循环区分的连接池
+        return AsyncOpenAI(
+            api_key=provider.api_key,
+            base_url=provider.base_url,
+            timeout=timeouts("AI_HTTP"),
+            max_retries=max_retries,
+            http_client=httpx.AsyncClient(transport=cls._transport, timeout=timeouts("AI_HTTP")),
+        )
+
+    @classmethod
+    def configure(cls, providers: list[AIProvider]) -> None:
+        """替换端点列表；未提供客户端的端点按其地址创建"""
+        # 有备用端点时由端点池负责重试，SDK 内部不再对同一端点重试
+        max_retries = 0 if len(providers) > 1 else 2
+        for provider in providers:
+            if provider.client is None:
+                provider.client = cls._client(provider, max_retries)
+        cls.providers = providers
+
+    @classmethod
+    def from_env(cls) -> list[AIProvider]:
+        primary = AIProvider(
+            name="default",
+            base_url=os.getenv("OPENAI_BASE_URL", "https://dashscope.aliyuncs.com/compatible-mode/v1"),
+            model=os.getenv("OPENAI_MODEL", "qwen3-max"),
+            api_key=os.getenv("OPENAI_API_KEY", ""),
+        )
+        extra = []
+        try:
+            for i, item in enumerate(json.loads(os.getenv("AI_PROVIDERS") or "[]")):
+                extra.append(AIProvider(
+                    name=item.get("name") or f"provider-{i + 1}",
+                    base_url=item["baseUrl"],
+                    model=item.get("model") or primary.model,
+                    api_key=item.get("apiKey") or os.getenv(item.get("apiKeyEnv", ""), "") or "",
+                ))
+        except (json.JSONDecodeError, KeyError, TypeError, AttributeError) as e:
+            logging.error(f"Invalid AI_PROVIDERS, using the default endpoint only: {e}")
+            extra = []
+        return [primary, *extra]
+
+    @classmethod
+    def primary(cls) -> AIProvider:
+        return cls.providers[0]
+
+    @staticmethod
+    def _retryable(e: BaseException) -> bool:
+        """是否是端点侧的问题，可以换一个端点重试"""
+        if isinstance(e, openai.BadRequestError):
+            return False
+        return isinstance(e, (openai.APIError, httpx.HTTPError, asyncio.TimeoutError))
+
+    @classmethod
+    def _score(cls, provider: AIProvider, streaming: bool) -> float:
+        latency = provider.ttft_ewma if streaming else provider.latency_ewma
+        return (latency or 0.0) * (1 + cls.ERROR_PENALTY * provider.error_ewma) * (1 + provider.in_flight)
+
+    @classmethod
+    def candidates(cls, streaming: bool = False) -> list[AIProvider]:
+        """按优先顺序排列的端点：健康的按评分，熔断中的按恢复时间排在最后"""
+        now = time.monotonic()
+        healthy = [p for p in cls.providers if p.healthy(now)]
+        down = [p for p in cls.providers if not p.healthy(now)]
+        return sorted(healthy, key=lambda p: cls._score(p, streaming)) + sorted(down, key=lambda p: p.down_until)
+
+    @classmethod
+    def _ewma(cls, current: Optional[float], sample: float) -> float:
+        return sample if current is None else cls.EWMA_ALPHA * sample + (1 - cls.EWMA_ALPHA) * current
+
+    @classmethod
+    def _record_success(cls, provider: AIProvider, elapsed: float, streaming: bool) -> None:
+        provider.calls += 1
+        if streaming:
+            provider.ttft_ewma = cls._ewma(provider.ttft_ewma, elapsed)
+        else:
+            provider.latency_ewma = cls._ewma(provider.latency_ewma, elapsed)
+        provider.error_ewma = cls._ewma(provider.error_ewma, 0.0)
+        provider.consecutive_failures = 0
+        provider.down_until = 0.0
+
+    @classmethod
+    def _record_failure(cls, provider: AIProvider, error: BaseException) -> None:
+        provider.calls += 1
+        provider.failures += 1
+        provider.error_ewma = cls._ewma(provider.error_ewma, 1.0)
+        provider.consecutive_failures += 1
+        provider.last_error = f"{type(error).__name__}: {error}"
+        if provider.consecutive_failures >= cls.FAILURE_THRESHOLD:
+            provider.down_until = time.monotonic() + cls.COOLDOWN_SECONDS
+            logging.warning(f"AI provider {provider.name} marked down for {cls.COOLDOWN_SECONDS}s: {provider.last_error}")
+
+    @classmethod
+    async def call(cls, fn: Callable[[AIProvider], Awaitable[T]]) -> T:
+        """在最合适的端点上执行一次调用，端点侧出错时依次换下一个端点"""
+        last_error: Optional[BaseException] = None
+        for provider in cls.candidates():
+            if last_error is not None:
+                cls._failovers += 1
+                logging.warning(f"Failing over to AI provider {provider.name}: {last_error}")
+            started = time.monotonic()
+            provider.in_flight += 1
+            try:
+                result = await fn(provider)
+            except Exception as e:
+                if not cls._retryable(e):
+                    raise
+                cls._record_failure(provider, e)
+                last_error = e
+                continue
+            finally:
+                provider.in_flight -= 1
+            cls._record_success(provider, time.monotonic() - started, streaming=False)
+            return result
+        # 熔断中的端点也会作为最后的备选尝试，走到这里说明全部端点都失败了，抛出最后一个端点的错误
+        if last_error is None:
+            raise AIProviderUnavailable("no available AI provider")
+        raise last_error
+
+    @classmethod
+    async def stream(cls, factory: Callable[[AIProvider], AsyncGenerator[Any, None]]) -> AsyncGenerator[Any, None]:
+        """在最合适的端点上执行一次流式调用，收到第一块之前出错时换下一个端点"""
+        last_error: Optional[BaseException] = None
+        for provider in cls.candidates(streaming=True):
+            if last_error is not None:
+                cls._failovers += 1
+                logging.warning(f"Failing over to AI provider {provider.name}: {last_error}")
+            started = time.monotonic()
+            received = False
+            provider.in_flight += 1
+            upstream = factory(provider)
+            try:
+                async for piece in upstream:
+                    if not received:
+                        received = True
+                        cls._record_success(provider, time.monotonic() - started, streaming=True)
+                    yield piece
+                if not received:
+                    cls._record_success(provider, time.monotonic() - started, streaming=True)
+                return
+            except Exception as e:
+                retryable = cls._retryable(e)
+                if retryable:
+                    cls._record_failure(provider, e)
+                # 已经推送过内容的流无法无缝切换到其它端点
+                if received or not retryable:
+                    raise
+                last_error = e
+            finally:
+                provider.in_flight -= 1
+                await upstream.aclose()
+        if last_error is None:
+            raise AIProviderUnavailable("no available AI provider")
+        raise last_error
+
+    @classmethod
+    async def probe(cls) -> None:
+        """探测所有端点，能正常应答的端点解除熔断"""
+        async def _probe(provider: AIProvider) -> None:
+            try:
+                await asyncio.wait_for(provider.client.models.list(), cls.PROBE_TIMEOUT)
+            except openai.NotFoundError:
+                # 部分兼容服务没有模型列表接口，能返回 404 说明服务在线
+                pass
+            except Exception as e:
+                provider.error_ewma = cls._ewma(provider.error_ewma, 1.0)
+                provider.last_error = f"probe {type(e).__name__}: {e}"
+                provider.down_until = time.monotonic() + cls.COOLDOWN_SECONDS
+                return
+            if not provider.healthy(time.monotonic()):
+                logging.info(f"AI provider {provider.name} is back")
+            provider.consecutive_failures = 0
+            provider.down_until = 0.0
+
+        await asyncio.gather(*[_probe(p) for p in cls.providers])
+
+    @classmethod
+    async def _probe_loop(cls) -> None:
+        while True:
+            await asyncio.sleep(cls.PROBE_INTERVAL)
+            try:
+                await cls.probe()
+            except Exception as e:
+                logging.error(f"AI provider probe failed: {e}")
+
+    @classmethod
+    def start(cls) -> None:
+        """只有多个端点时才需要后台探测"""
+        if len(cls.providers) > 1 and cls._probe_task is None:
+            cls._probe_task = asyncio.ensure_future(cls._probe_loop())
+
+    @classmethod
+    async def stop(cls) -> None:
+        if cls._probe_task is not None:
+            cls._probe_task.cancel()
+            await asyncio.gather(cls._probe_task, return_exceptions=True)
+            cls._probe_task = None
+        await cls._transport.aclose()
+
+    @classmethod
+    def stats(cls) -> dict:
+        now = time.monotonic()
+        return {
+            "failovers": cls._failovers,
+            "providers": [
+                {
+                    "name": p.name,
+                    "model": p.model,
+                    "healthy": p.healthy(now),
+                    "latencyEwma": None if p.latency_ewma is None else round(p.latency_ewma, 4),
+                    "ttftEwma": None if p.ttft_ewma is None else round(p.ttft_ewma, 4),
+                    "errorRate": round(p.error_ewma, 4),
+                    "inFlight": p.in_flight,
+                    "calls": p.calls,
+                    "failures": p.failures,
+                    "lastError": p.last_error,
+                }
+                for p in cls.providers
+            ],
+        }
+
+
+AIProviderPool.configure(AIProviderPool.from_env())
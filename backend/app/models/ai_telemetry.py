@@ -0,0 +1,272 @@
+import os
+import math
+import time
+import asyncio
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Iterator, Optional
+
+import openai
+
+from app.models.ai_budget import AIPromptType
+from app.models.ai_governor import AIGovernorTimeout
+from app.models.ai_hedge import AIDeadlineExceeded
+
+# 当前调用所属的作业，由控制器在请求或任务入口处设置，子任务自动继承
+_assignment: ContextVar[Optional[str]] = ContextVar("ai_call_assignment", default=None)
+
+
+@dataclass
+class AICallRecord:
+    """一次模型调用的记录，时间均为 time.monotonic 秒数"""
+    label: str
+    prompt_type: AIPromptType
+    streaming: bool
+    assign_id: Optional[str]
+    started: float
+    # 获得调用额度、开始请求模型的时间
+    sent_at: Optional[float] = None
+    queue_wait: Optional[float] = None
+    ttft: Optional[float] = None
+    latency: Optional[float] = None
+    tokens_in: int = 0
+    tokens_out: int = 0
+    outcome: Optional[str] = None
+    error: Optional[str] = None
+
+    @property
+    def tokens_per_second(self) -> Optional[float]:
+        """输出速度：流式调用不计首 token 之前的等待"""
+        if self.latency is None or not self.tokens_out:
+            return None
+        seconds = self.latency - (self.ttft or 0.0) if self.streaming else self.latency
+        return self.tokens_out / seconds if seconds > 0 else None
+
+    def as_dict(self) -> dict:
+        def _round(value: Optional[float]) -> Optional[float]:
+            return None if value is None else round(value, 4)
+
+        return {
+            "label": self.label,
+            "promptType": self.prompt_type.value,
+            "streaming": self.streaming,
+            "assignmentId": self.assign_id,
+            "queueWait": _round(self.queue_wait),
+            "ttft": _round(self.ttft),
+            "latency": _round(self.latency),
+            "tokensIn": self.tokens_in,
+            "tokensOut": self.tokens_out,
+            "tokensPerSecond": _round(self.tokens_per_second),
+            "outcome": self.outcome,
+            "error": self.error,
+        }
+
+
+@dataclass
+class _Aggregate:
+    calls: int = 0
+    outcomes: dict = field(default_factory=dict)
+    tokens_in: int = 0
+    tokens_out: int = 0
+    queue_wait: float = 0.0
+    latency: float = 0.0
+    # 有模型耗时的调用数（不含命中缓存与排队超时）
+    timed: int = 0
+    # 输出 token 的生成耗时，用于计算平均输出速度
+    generating: float = 0.0
+
+    def add(self, record: AICallRecord) -> None:
+        self.calls += 1
+        self.outcomes[record.outcome] = self.outcomes.get(record.outcome, 0) + 1
+        self.tokens_in += record.tokens_in
+        self.tokens_out += record.tokens_out
+        self.queue_wait += record.queue_wait or 0.0
+        if record.latency is not None:
+            self.timed += 1
+            self.latency += record.latency
+            if record.tokens_per_second:
+                self.generating += record.tokens_out / record.tokens_per_second
+
+    def merge(self, other: "_Aggregate") -> None:
+        self.calls += other.calls
+        for outcome, count in other.outcomes.items():
+            self.outcomes[outcome] = self.outcomes.get(outcome, 0) + count
+        self.tokens_in += other.tokens_in
+        self.tokens_out += other.tokens_out
+        self.queue_wait += other.queue_wait
+        self.latency += other.latency
+        self.timed += other.timed
+        self.generating += other.generating
+
+    def as_dict(self) -> dict:
+        return {
+            "calls": self.calls,
+            "outcomes": dict(self.outcomes),
+            "tokensIn": self.tokens_in,
+            "tokensOut": self.tokens_out,
+            "queueWaitAvg": round(self.queue_wait / self.calls, 4) if self.calls else 0.0,
+            "latencyAvg": round(self.latency / self.timed, 4) if self.timed else None,
+            "tokensPerSecond": round(self.tokens_out / self.generating, 2) if self.generating else None,
+        }
+
+
+def _percentile(values: list[float], p: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return round(ordered[math.ceil(p * len(ordered)) - 1], 4)
+
+
+class AITelemetry:
+    """
+    模型调用的逐次记录与汇总
+
+    - 每次调用带有提示词标签（RESOLUTION、TITLES、COMPLEXITY、CODE_STYLE、AGENT 等），
+      记录排队等待、首 token 耗时、总耗时、输入与输出 token 数、输出速度与结果
+    - 按提示词标签与作业累计汇总，按课程的汇总在导出时由作业所属课程合并得到
+    - 最近 RECENT 次调用保留明细，用于计算各标签的延迟分位数
+    - 只保留最近有调用的 ASSIGNMENTS 个作业的汇总，导出时默认只列出 token 用量最多的 TOP 个
+    """
+
+    RECENT = int(os.getenv("AI_TELEMETRY_RECENT", "1000"))
+    ASSIGNMENTS = int(os.getenv("AI_TELEMETRY_ASSIGNMENTS", "500"))
+    TOP = int(os.getenv("AI_TELEMETRY_TOP", "20"))
+
+    _recent: deque = deque(maxlen=RECENT)
+    _by_label: dict[str, _Aggregate] = {}
+    # 按最近调用时间排序，超出 ASSIGNMENTS 时淘汰最久没有调用的作业
+    _by_assignment: OrderedDict[str, _Aggregate] = OrderedDict()
+
+    @classmethod
+    @contextmanager
+    def scope(cls, assign_id: Optional[str]) -> Iterator[None]:
+        """在代码块内发起的调用（包括其中创建的子任务）记入该作业"""
+        token = _assignment.set(assign_id)
+        try:
+            yield
+        finally:
+            _assignment.reset(token)
+
+    @classmethod
+    def bind(cls, assign_id: Optional[str]) -> None:
+        """
+        将当前上下文中之后的调用记入该作业，用于异步生成器
+
+        生成器可能在其它上下文中被关闭，无法可靠地恢复原值；请求与任务各有独立的上下文，绑定不会影响其它请求
+        """
+        _assignment.set(assign_id)
+
+    @classmethod
+    def start(cls, label: str, prompt_type: AIPromptType, streaming: bool = False) -> AICallRecord:
+        return AICallRecord(label, prompt_type, streaming, _assignment.get(), time.monotonic())
+
+    @staticmethod
+    def sent(record: AICallRecord, queue_wait: float) -> None:
+        """已获得调用额度，开始请求模型"""
+        record.sent_at = time.monotonic()
+        record.queue_wait = queue_wait
+
+    @staticmethod
+    def first_token(record: AICallRecord) -> None:
+        if record.ttft is None and record.sent_at is not None:
+            record.ttft = time.monotonic() - record.sent_at
+
+    @staticmethod
+    def outcome_of(e: BaseException) -> str:
+        if isinstance(e, (AIDeadlineExceeded, AIGovernorTimeout, asyncio.TimeoutError, openai.APITimeoutError)):
+            return "timeout"
+        if isinstance(e, (asyncio.CancelledError, GeneratorExit)):
+            return "cancelled"
+        return "error"
+
+    @classmethod
+    def finish(
+        cls,
+        record: AICallRecord,
+        outcome: str,
+        tokens_in: int = 0,
+        tokens_out: int = 0,
+        error: Optional[BaseException] = None,
+    ) -> None:
+        """结束一次调用并计入汇总；同一记录只计一次"""
+        if record.outcome is not None:
+            return
+        now = time.monotonic()
+        record.outcome = outcome
+        record.tokens_in = tokens_in
+        record.tokens_out = tokens_out
+        if error is not None:
+            record.error = f"{type(error).__name__}: {error}"[:200]
+        if record.sent_at is None:
+            # 命中缓存或未能获得调用额度，没有模型耗时
+            if outcome != "cached":
+                record.queue_wait = now - record.started
+        else:
+            record.latency = now - record.sent_at
+
+        cls._recent.append(record)
+        cls._by_label.setdefault(record.label, _Aggregate()).add(record)
+        if record.assign_id:
+            cls._by_assignment.setdefault(record.assign_id, _Aggregate()).add(record)
+            cls._by_assignment.move_to_end(record.assign_id)
+            while len(cls._by_assignment) > cls.ASSIGNMENTS:
+                cls._by_assignment.popitem(last=False)
+
+    @classmethod
+    def stats(cls) -> dict:
+        """按提示词标签的汇总与最近调用的延迟分位数"""
+        recent = list(cls._recent)
+        by_label = {}
+        for label, aggregate in cls._by_label.items():
+            latencies = [r.latency for r in recent if r.label == label and r.latency is not None]
+            ttfts = [r.ttft for r in recent if r.label == label and r.ttft is not None]
+            by_label[label] = {
+                **aggregate.as_dict(),
+                "latencyP50": _percentile(latencies, 0.5),
+                "latencyP95": _percentile(latencies, 0.95),
+                "ttftP50": _percentile(ttfts, 0.5),
+                "ttftP95": _percentile(ttfts, 0.95),
+            }
+        return {
+            "calls": sum(a.calls for a in cls._by_label.values()),
+            "byPrompt": by_label,
+            "recent": [r.as_dict() for r in recent[-20:]],
+        }
+
+    @classmethod
+    async def report(cls, assign_id: Optional[str] = None) -> dict:
+        """
+        stats 之外加上按作业与按课程的汇总；属于多个课程的作业计入每个课程
+
+        byAssignment 只列出 token 用量最多的 TOP 个作业，给定 assign_id 时只列出该作业；
+        byCourse 由仍保留汇总的作业合并得到
+        """
+        from app.models.assignment import Assignment
+
+        by_course: dict[str, _Aggregate] = {}
+        if cls._by_assignment:
+            rows = await Assignment.filter(id__in=list(cls._by_assignment)).values("id", "courses__id")
+            for row in rows:
+                if row["courses__id"] is not None:
+                    by_course.setdefault(row["courses__id"], _Aggregate()).merge(cls._by_assignment[row["id"]])
+
+        if assign_id is not None:
+            listed = [(assign_id, cls._by_assignment[assign_id])] if assign_id in cls._by_assignment else []
+        else:
+            listed = sorted(
+                cls._by_assignment.items(), key=lambda item: item[1].tokens_in + item[1].tokens_out, reverse=True
+            )[:cls.TOP]
+        return {
+            **cls.stats(),
+            "assignments": len(cls._by_assignment),
+            "byAssignment": {k: a.as_dict() for k, a in listed},
+            "byCourse": {k: a.as_dict() for k, a in by_course.items()},
+        }
+
+    @classmethod
+    def reset(cls) -> None:
+        cls._recent.clear()
+        cls._by_label.clear()
+        cls._by_assignment.clear()
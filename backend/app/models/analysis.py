@@ -1,3 +1,5 @@
+from enum import Enum
+
 from tortoise import fields
 from tortoise.models import Model
 
@@ -17,3 +19,34 @@ class Analysis(Model):
 
     def __str__(self):
         return f"Analysis for {self.assignment.id}"
+
+
+class AIJobStatus(str, Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+
+class AIJob(Model):
+    """AI 生成任务记录，服务重启后未完成的任务会重新入队"""
+    id = fields.CharField(max_length=50, pk=True, description="任务 ID")
+    key = fields.CharField(max_length=200, description="去重键，同一键同时只有一个未完成的任务")
+    kind = fields.CharField(max_length=50, description="任务类型")
+    assignment_id = fields.CharField(max_length=50, description="所属作业 ID")
+    status = fields.CharEnumField(AIJobStatus, max_length=20, default=AIJobStatus.QUEUED, description="任务状态")
+    attempts = fields.IntField(default=0, description="已执行次数")
+    error = fields.TextField(null=True, description="最近一次失败原因")
+    created_at = fields.DatetimeField(auto_now_add=True, description="创建时间")
+    updated_at = fields.DatetimeField(auto_now=True, description="更新时间")
+    finished_at = fields.DatetimeField(null=True, description="完成时间")
+
+    class Meta:
+        table = "ai_jobs"
+        table_description = "AI 生成任务表"
+        indexes = [
+            ("key", "status"),
+        ]
+
+    def __str__(self):
+        return f"AIJob {self.kind} for {self.assignment_id} ({self.status})"
@@ -36,6 +36,7 @@ class Assignment(Model):
     end_date = fields.DatetimeField(null=True, description="截止时间")
 
     codes: ReverseRelation["AssignmentCode"]
+    generators: ReverseRelation["AssignmentTestGenerator"]
     submissions: ReverseRelation["AssignmentSubmission"]
     analysis: ReverseRelation["Analysis"]
     agent_conversations: ReverseRelation["AIAgentConservation"]
@@ -73,6 +74,24 @@ class AssignmentCode(Model):
         return f"AssignmentCode(id={self.id}, assignment={self.assignment.id})"
 
 
+class AssignmentTestGenerator(Model):
+    """作业测试输入生成器模型，大规模测试点由生成器按种子现场生成而不入库"""
+
+    id = fields.CharField(max_length=50, pk=True, description="生成器 ID")
+    assignment = fields.ForeignKeyField("models.Assignment", related_name="generators", description="所属作业")
+    generator_code = fields.TextField(description="输入生成器代码")
+    reference_code = fields.TextField(description="参考解代码")
+    seeds = fields.JSONField(description="随机种子列表")
+    cache_expected = fields.BooleanField(default=True, description="是否缓存期望输出")
+
+    class Meta:
+        table = "assignment_test_generators"
+        table_description = "作业测试生成器表"
+
+    def __str__(self):
+        return f"AssignmentTestGenerator(id={self.id}, assignment={self.assignment.id})"
+
+
 class AssignmentSubmission(Model):
     """作业提交模型"""
 
@@ -0,0 +1,241 @@
+import os
+import time
+import asyncio
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from enum import Enum
+from typing import Any, Awaitable, Callable, Optional
+
+from app.models.playground import JudgeCorePool
+
+
+class JudgeClass(str, Enum):
+    """评测任务类别，按优先级从高到低排列"""
+    GRADED_URGENT = "graded_urgent"  # 临近截止时间的正式提交
+    GRADED = "graded"                # 正式提交
+    PLAYGROUND = "playground"        # 自测运行
+
+
+@dataclass
+class _JudgeJob:
+    user_id: str
+    job_class: JudgeClass
+    factory: Callable[[], Awaitable[Any]]
+    cost: int
+    future: asyncio.Future
+    width: int = 1
+    enqueued_at: float = field(default_factory=time.monotonic)
+    task: Optional[asyncio.Task] = None
+
+
+class _FairQueue:
+    """单个类别内按用户做亏空轮询（Deficit Round Robin），一个用户刷提交不会挤占其他用户"""
+
+    def __init__(self) -> None:
+        self.queues: dict[str, deque[_JudgeJob]] = {}
+        self.ring: deque[str] = deque()
+        self.deficit: dict[str, int] = {}
+        # 本轮是否已经给队首用户发放过额度
+        self.credited: dict[str, bool] = {}
+
+    def __len__(self) -> int:
+        return sum(len(q) for q in self.queues.values())
+
+    def push(self, job: _JudgeJob) -> None:
+        if job.user_id not in self.queues:
+            self.queues[job.user_id] = deque()
+            self.ring.append(job.user_id)
+            self.deficit[job.user_id] = 0
+            self.credited[job.user_id] = False
+        self.queues[job.user_id].append(job)
+
+    def remove(self, job: _JudgeJob) -> bool:
+        queue = self.queues.get(job.user_id)
+        if not queue or job not in queue:
+            return False
+        queue.remove(job)
+        if not queue:
+            self._drop_user(job.user_id)
+        return True
+
+    def _drop_user(self, user_id: str) -> None:
+        del self.queues[user_id]
+        self.ring.remove(user_id)
+        del self.deficit[user_id]
+        del self.credited[user_id]
+
+    def pop(self, quantum: int) -> Optional[_JudgeJob]:
+        while self.ring:
+            user_id = self.ring[0]
+            queue = self.queues[user_id]
+            if not self.credited[user_id]:
+                self.deficit[user_id] += quantum
+                self.credited[user_id] = True
+            if self.deficit[user_id] < queue[0].cost:
+                # 额度不足，轮到下一个用户，下次回到队首时再发放额度
+                self.credited[user_id] = False
+                self.ring.rotate(-1)
+                continue
+
+            job = queue.popleft()
+            self.deficit[user_id] -= job.cost
+            if not queue:
+                self._drop_user(user_id)
+            return job
+        return None
+
+    def unpop(self, job: _JudgeJob) -> None:
+        """撤销 pop：任务放回该用户队首，额度退回，下次 pop 仍先取到它"""
+        if job.user_id not in self.queues:
+            self.queues[job.user_id] = deque()
+            self.ring.appendleft(job.user_id)
+            self.deficit[job.user_id] = 0
+        elif self.ring[0] != job.user_id:
+            self.ring.remove(job.user_id)
+            self.ring.appendleft(job.user_id)
+        self.queues[job.user_id].appendleft(job)
+        self.deficit[job.user_id] += job.cost
+        self.credited[job.user_id] = True
+
+    def oldest_wait(self, now: float) -> float:
+        heads = [q[0].enqueued_at for q in self.queues.values() if q]
+        return now - min(heads) if heads else 0.0
+
+
+class JudgeScheduler:
+    """
+    评测调度器，位于 Playground 之前
+
+    - 并发槽位数与评测核数一致，超出的任务排队；会并发运行的任务（自测批量运行）按并发宽度占用多个槽位，
+      调度器是评测并发的唯一限制，任务拿到槽位后不会再在核池上排队
+    - 类别之间严格按优先级：临近截止的正式提交 > 正式提交 > 自测运行
+    - 同一类别内按用户公平轮询，任务开销按测试点数计
+    """
+
+    # 每个用户每轮获得的额度（测试点数）
+    QUANTUM = int(os.getenv("JUDGE_QUANTUM", "4"))
+    # 距截止时间小于该值的正式提交视为紧急
+    URGENT_WINDOW = timedelta(minutes=int(os.getenv("JUDGE_URGENT_MINUTES", "30")))
+
+    _queues: dict[JudgeClass, _FairQueue] = {c: _FairQueue() for c in JudgeClass}
+    _running: dict[JudgeClass, int] = {c: 0 for c in JudgeClass}
+    # 运行中任务占用的槽位总数
+    _busy: int = 0
+    _dispatched: dict[JudgeClass, int] = {c: 0 for c in JudgeClass}
+
+    @classmethod
+    def slots(cls) -> int:
+        return max(1, len(JudgeCorePool.cores))
+
+    @classmethod
+    def width(cls, runs: int) -> int:
+        """并发运行 runs 次的任务应占用的槽位数"""
+        return min(max(1, runs), cls.slots())
+
+    @classmethod
+    def classify(cls, graded: bool, deadline: Optional[datetime] = None) -> JudgeClass:
+        """根据是否正式提交与截止时间确定任务类别"""
+        if not graded:
+            return JudgeClass.PLAYGROUND
+        if deadline is not None:
+            if deadline.tzinfo is None:
+                deadline = deadline.replace(tzinfo=timezone.utc)
+            if deadline - datetime.now(timezone.utc) <= cls.URGENT_WINDOW:
+                return JudgeClass.GRADED_URGENT
+        return JudgeClass.GRADED
+
+    @classmethod
+    async def submit(
+        cls,
+        user_id: str,
+        job_class: JudgeClass,
+        factory: Callable[[], Awaitable[Any]],
+        cost: int = 1,
+        width: int = 1,
+    ) -> Any:
+        """
+        提交评测任务并等待结果
+
+        Args:
+            user_id: 提交者，用于公平轮询
+            job_class: 任务类别
+            factory: 实际执行评测的协程工厂，轮到时才会调用
+            cost: 任务开销，通常为测试点数
+            width: 任务同时占用的槽位数，任务内的并发运行数不得超过它（见 width()）
+        """
+        job = _JudgeJob(
+            user_id=user_id,
+            job_class=job_class,
+            factory=factory,
+            cost=max(1, cost),
+            width=cls.width(width),
+            future=asyncio.get_running_loop().create_future(),
+        )
+        cls._queues[job_class].push(job)
+        cls._dispatch()
+        try:
+            return await asyncio.shield(job.future)
+        except asyncio.CancelledError:
+            # 请求方已断开：排队中的任务直接出队，运行中的任务取消
+            if not cls._queues[job_class].remove(job) and job.task is not None:
+                job.task.cancel()
+            raise
+
+    @classmethod
+    def _dispatch(cls) -> None:
+        while cls._busy < cls.slots():
+            job = None
+            for job_class in JudgeClass:
+                job = cls._queues[job_class].pop(cls.QUANTUM)
+                if job:
+                    break
+            if job is None:
+                return
+            if cls._busy + job.width > cls.slots():
+                # 空闲槽位不够：放回队首等待，不让更窄或优先级更低的任务插队把它饿死；
+                # 下次调度重新按优先级挑选，之后到达的高优先级任务仍然先运行
+                cls._queues[job.job_class].unpop(job)
+                return
+            cls._busy += job.width
+            cls._running[job.job_class] += 1
+            cls._dispatched[job.job_class] += 1
+            job.task = asyncio.get_running_loop().create_task(cls._run(job))
+
+    @classmethod
+    async def _run(cls, job: _JudgeJob) -> None:
+        try:
+            result = await job.factory()
+            if not job.future.done():
+                job.future.set_result(result)
+        except BaseException as e:
+            if not job.future.done():
+                if isinstance(e, asyncio.CancelledError):
+                    job.future.cancel()
+                else:
+                    job.future.set_exception(e)
+            if not isinstance(e, Exception):
+                raise
+        finally:
+            cls._busy -= job.width
+            cls._running[job.job_class] -= 1
+            cls._dispatch()
+
+    @classmethod
+    def stats(cls) -> dict:
+        """各类别排队深度、运行数与队首等待时间，用于观察饥饿"""
+        now = time.monotonic()
+        return {
+            "slots": cls.slots(),
+            "busySlots": cls._busy,
+            "classes": {
+                job_class.value: {
+                    "queued": len(cls._queues[job_class]),
+                    "queuedUsers": len(cls._queues[job_class].queues),
+                    "running": cls._running[job_class],
+                    "dispatched": cls._dispatched[job_class],
+                    "oldestWaitSeconds": round(cls._queues[job_class].oldest_wait(now), 3),
+                }
+                for job_class in JudgeClass
+            },
+        }
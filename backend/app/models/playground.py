@@ -1,11 +1,211 @@
 import os
+import time
+import logging
+import signal
+import shutil
+import hashlib
 import asyncio
 import tempfile
+import threading
+import subprocess
 from pathlib import Path
-from typing import Optional
+from typing import AsyncIterator, Optional
+from contextlib import asynccontextmanager
 
 # from app.schemas.general import
-from app.schemas.assignment import CodeContent, CodeLanguage, JudgeResult, TestSampleCreate, MdCodeContent
+from app.schemas.assignment import CodeContent, CodeLanguage, JudgeResult, TestSampleCreate, MdCodeContent, RunResult, RunStatus, TestGenerator
+
+# 生成器的正常退出码：被测程序提前退出时生成器会因 SIGPIPE 结束（经 firejail 转发时为 128 + 信号值）
+_SIGPIPE = getattr(signal, "SIGPIPE", 13)
+_SIGKILL = getattr(signal, "SIGKILL", 9)
+_BENIGN_FEEDER_EXIT = (0, -_SIGPIPE, 128 + _SIGPIPE, -_SIGKILL)
+
+# 运行器：从自身（很小的进程）fork 出被测程序并用 wait4 回收，把子进程的峰值内存与用户态/内核态 CPU 时间写到指定 fd。
+# 直接由 Web 进程启动时，子进程的 ru_maxrss 会包含 exec 前从 Web 进程继承的 RSS（数百 MB），程序自身的内存被完全掩盖。
+# 给定 CPU 时运行器在 fork 前绑核，被测程序及沙箱内的子进程都继承该绑定，Web 进程无需在 fork 与 exec 之间执行任何代码。
+# 被测程序在独立的进程组中运行，运行器作为收养者（subreaper）回收其全部子孙进程：firejail 是 set-uid 程序，
+# exec 时会清除 PR_SET_PDEATHSIG，仅杀死运行器会留下仍在运行的沙箱。超时时向运行器发送 SIGTERM，
+# 运行器杀死整个进程组并回收完所有子孙进程后才退出。
+# 退出码与被测程序一致，被信号终止时以同一信号退出。
+_RUNNER_SOURCE = r"""
+#include <cerrno>
+#include <csignal>
+#include <cstdio>
+#include <cstdlib>
+#include <fcntl.h>
+#include <sched.h>
+#include <sys/prctl.h>
+#include <sys/resource.h>
+#include <sys/wait.h>
+#include <unistd.h>
+
+static volatile sig_atomic_t child = 0;
+
+// 超时：杀死被测程序所在的整个进程组，随后照常回收
+static void on_term(int) {
+    if (child > 0) kill(-child, SIGKILL);
+}
+
+// 用法：runner <报告 fd> <CPU 编号，-1 表示不绑核> <命令> [参数...]
+int main(int argc, char **argv) {
+    if (argc < 4) return 127;
+    int report = atoi(argv[1]);
+    fcntl(report, F_SETFD, FD_CLOEXEC);
+    int cpu = atoi(argv[2]);
+    if (cpu >= 0) {
+        cpu_set_t set;
+        CPU_ZERO(&set);
+        CPU_SET(cpu, &set);
+        sched_setaffinity(0, sizeof(set), &set);
+    }
+    // 脱离父进程的子孙进程（包括沙箱内的）都会被过继给运行器
+    prctl(PR_SET_CHILD_SUBREAPER, 1);
+    // 记下子进程 pid 之前屏蔽 SIGTERM，避免超时信号落在 fork 前后的空窗里
+    sigset_t term, old;
+    sigemptyset(&term);
+    sigaddset(&term, SIGTERM);
+    sigprocmask(SIG_BLOCK, &term, &old);
+    struct sigaction action = {};
+    action.sa_handler = on_term;
+    sigaction(SIGTERM, &action, nullptr);
+    pid_t parent = getpid();
+    pid_t pid = fork();
+    if (pid < 0) return 127;
+    if (pid == 0) {
+        setpgid(0, 0);
+        signal(SIGTERM, SIG_DFL);
+        sigprocmask(SIG_SETMASK, &old, nullptr);
+        prctl(PR_SET_PDEATHSIG, SIGKILL);
+        if (getppid() != parent) _exit(127);
+        execvp(argv[3], argv + 3);
+        _exit(127);
+    }
+    setpgid(pid, pid);
+    child = pid;
+    sigprocmask(SIG_SETMASK, &old, nullptr);
+    int status = 0;
+    struct rusage usage;
+    while (wait4(pid, &status, 0, &usage) < 0) {
+        if (errno != EINTR) return 127;
+    }
+    // 清理进程组中残留的子进程，并回收所有过继来的子孙进程
+    kill(-pid, SIGKILL);
+    while (waitpid(-1, nullptr, 0) > 0 || errno == EINTR) {
+    }
+    dprintf(report, "%ld %ld %ld\n", usage.ru_maxrss,
+            (long)(usage.ru_utime.tv_sec * 1000000L + usage.ru_utime.tv_usec),
+            (long)(usage.ru_stime.tv_sec * 1000000L + usage.ru_stime.tv_usec));
+    close(report);
+    if (WIFSIGNALED(status)) {
+        struct rlimit no_core = {0, 0};
+        setrlimit(RLIMIT_CORE, &no_core);
+        signal(WTERMSIG(status), SIG_DFL);
+        raise(WTERMSIG(status));
+    }
+    return WIFEXITED(status) ? WEXITSTATUS(status) : 127;
+}
+"""
+
+
+def _parse_cpu_list(spec: str) -> set[int]:
+    """解析 CPU 列表，例如 "0,2-4" -> {0, 2, 3, 4}"""
+    cpus: set[int] = set()
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "-" in part:
+            lo, hi = part.split("-", 1)
+            cpus.update(range(int(lo), int(hi) + 1))
+        else:
+            cpus.add(int(part))
+    return cpus
+
+
+class JudgeCorePool:
+    """
+    评测 CPU 核池
+
+    每次沙箱运行独占池中的一个核（sched_setaffinity），避免与 Web 进程、AI 流式输出以及其它评测
+    抢占同一个核导致计时抖动。池的大小同时也是评测运行的并发上限。
+
+    环境变量：
+        JUDGE_RESERVED_CPUS: 留给 Web 进程的核（默认 "0"），评测永远不会使用
+        JUDGE_CPUS: 评测可用的核（默认为本进程可用的全部核去掉保留核）
+    """
+
+    reserved: set[int] = set()
+    cores: list[int] = []
+    # 不支持 sched_setaffinity 的平台（Windows/macOS）只限制并发，不绑核
+    pinning: bool = hasattr(os, "sched_setaffinity")
+
+    _free: Optional[asyncio.Queue] = None
+    _loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @classmethod
+    def configure(cls, cores: Optional[set[int]] = None, reserved: Optional[set[int]] = None) -> None:
+        """按环境变量（或显式参数）确定保留核与评测核"""
+        if hasattr(os, "sched_getaffinity"):
+            available = set(os.sched_getaffinity(0))
+        else:
+            available = set(range(os.cpu_count() or 1))
+
+        if reserved is None:
+            reserved = _parse_cpu_list(os.getenv("JUDGE_RESERVED_CPUS") or "0")
+        if cores is None:
+            cores = _parse_cpu_list(os.getenv("JUDGE_CPUS", "")) or available
+        judge_cores = (cores & available) - reserved
+        if not judge_cores:
+            # 单核机器无法保留核，只能与 Web 进程共用
+            logging.warning(f"No CPU left for judging after reserving {sorted(reserved)}, sharing all cores")
+            judge_cores = available
+            reserved = set()
+
+        cls.reserved = reserved & available
+        cls.cores = sorted(judge_cores)
+        cls._free = None
+        cls._loop = None
+
+    @classmethod
+    def pin_web_process(cls) -> None:
+        """将当前（Web）进程限制在保留核上，仅在显式配置了 JUDGE_RESERVED_CPUS 时调用"""
+        if cls.pinning and cls.reserved:
+            os.sched_setaffinity(0, cls.reserved)
+            logging.info(f"Web process pinned to CPUs {sorted(cls.reserved)}, judge CPUs {cls.cores}")
+
+    @classmethod
+    def _queue(cls) -> asyncio.Queue:
+        # asyncio.Queue 绑定事件循环，循环变化（如测试中）时重建
+        loop = asyncio.get_running_loop()
+        if cls._free is None or cls._loop is not loop:
+            cls._free = asyncio.Queue()
+            for core in cls.cores:
+                cls._free.put_nowait(core)
+            cls._loop = loop
+        return cls._free
+
+    @classmethod
+    @asynccontextmanager
+    async def acquire(cls) -> AsyncIterator[Optional[int]]:
+        """独占一个评测核，返回核编号；平台不支持绑核时返回 None"""
+        queue = cls._queue()
+        core = await queue.get()
+        try:
+            yield core if cls.pinning else None
+        finally:
+            queue.put_nowait(core)
+
+    @classmethod
+    def stats(cls) -> dict:
+        return {
+            "cores": cls.cores,
+            "reserved": sorted(cls.reserved),
+            "pinning": cls.pinning,
+            "idle": cls._free.qsize() if cls._free is not None else len(cls.cores),
+        }
+
+
+JudgeCorePool.configure()
 
 
 class Playground:
@@ -13,6 +213,16 @@ class Playground:
     # def __init__(self):
     #     sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
 
+    # 运行超时（秒）
+    RUN_TIMEOUT = 5
+    # 编译超时（秒）
+    COMPILE_TIMEOUT = 15
+    # 超时后等待运行器清理进程组的宽限时间（秒），仍未退出则强制结束
+    KILL_GRACE = 1
+
+    # 探测到的编译器命令，进程内只探测一次
+    _compiler_cmd: Optional[list[str]] = None
+
     @staticmethod
     def _get_firejail_args(tmpdir: str) -> list[str]:
         """生成安全的 firejail 参数配置"""
@@ -44,151 +254,577 @@ class Playground:
         ]
 
     @staticmethod
-    async def run_code(code: CodeContent, input: str, language: CodeLanguage) -> str:
-        if language != CodeLanguage.C_CPP:
-            return "Unsupported language: only c_cpp is available for now."
+    async def _check_sandbox() -> tuple[bool, Optional[str]]:
+        """
+        检查沙箱可用性
+
+        Returns:
+            (firejail 是否可用, 错误信息)，非 Windows 系统上 firejail 不可用时返回错误信息
+        """
+        if os.name == "nt":
+            # Windows系统，使用现有逻辑（无沙箱）
+            return False, None
 
         # 检查 firejail 是否可用（非Windows系统强制要求）
-        firejail_available = False
-        if os.name != "nt":  # 非Windows系统
+        try:
+            proc = await asyncio.create_subprocess_exec(
+                "firejail", "--version",
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+            )
+            await asyncio.wait_for(proc.communicate(), timeout=5)
+            if proc.returncode == 0:
+                return True, None
+            return False, "Security Error: firejail is required for safe code execution on this system, but firejail command failed. Please ensure firejail is properly installed and configured."
+        except FileNotFoundError:
+            return False, "Security Error: firejail is required for safe code execution on this system, but firejail is not installed. Please install firejail using your system package manager (e.g., 'sudo dnf install firejail')."
+        except asyncio.TimeoutError:
+            return False, "Security Error: firejail version check timed out. Please check your firejail installation."
+        except Exception as e:
+            return False, f"Security Error: failed to check firejail availability: {e}. Please ensure firejail is properly installed."
+
+    @classmethod
+    async def _find_compiler(cls) -> Optional[list[str]]:
+        """选择编译器：优先 g++，其次 gcc（加 -x c++）"""
+        if cls._compiler_cmd is not None:
+            return cls._compiler_cmd
+
+        candidate_cmds = [
+            ["g++"],
+            ["gcc", "-x", "c++"],
+        ]
+        for base in candidate_cmds:
             try:
+                # 简单探测：尝试运行 <cmd> --version
                 proc = await asyncio.create_subprocess_exec(
-                    "firejail", "--version",
+                    *base, "--version",
                     stdout=asyncio.subprocess.PIPE,
                     stderr=asyncio.subprocess.PIPE,
                 )
                 await asyncio.wait_for(proc.communicate(), timeout=5)
                 if proc.returncode == 0:
-                    firejail_available = True
-                else:
-                    return "Security Error: firejail is required for safe code execution on this system, but firejail command failed. Please ensure firejail is properly installed and configured."
-            except FileNotFoundError:
-                return "Security Error: firejail is required for safe code execution on this system, but firejail is not installed. Please install firejail using your system package manager (e.g., 'sudo dnf install firejail')."
-            except asyncio.TimeoutError:
-                return "Security Error: firejail version check timed out. Please check your firejail installation."
-            except Exception as e:
-                return f"Security Error: failed to check firejail availability: {e}. Please ensure firejail is properly installed."
-        else:
-            # Windows系统，使用现有逻辑（无沙箱）
-            firejail_available = False
+                    cls._compiler_cmd = base
+                    return base
+            except Exception:
+                continue
+        return None
 
-        # 选择编译器：优先 g++，其次 gcc（加 -x c++）
-        compiler_cmd = None
-        candidate_cmds = [
-            ["g++"],
-            ["gcc", "-x", "c++"],
-        ]
+    @staticmethod
+    async def compile_code(code: CodeContent, workdir: Path, name: str = "main") -> tuple[Optional[Path], Optional[str]]:
+        """
+        在工作目录中编译单文件 C/C++ 代码
 
+        Returns:
+            (可执行文件路径, 错误信息)，二者有且仅有一个不为空
+        """
         # Windows 下可执行文件后缀
         exe_suffix = ".exe" if os.name == "nt" else ""
+        src_path = workdir / f"{name}.cpp"
+        exe_path = workdir / f"{name}{exe_suffix}"
+
+        # 写入源代码
+        src_path.write_text(code, encoding="utf-8")
+
+        compiler_cmd = await Playground._find_compiler()
+        if compiler_cmd is None:
+            return None, "Compiler not found: please install g++/gcc and ensure it's in PATH."
+
+        compile_cmd = compiler_cmd + [
+            str(src_path),
+            "-O2",
+            "-std=c++17",
+            "-o",
+            str(exe_path),
+        ]
+
+        compile_proc = await asyncio.create_subprocess_exec(
+            *compile_cmd,
+            cwd=str(workdir),
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        try:
+            c_stdout, c_stderr = await asyncio.wait_for(compile_proc.communicate(), timeout=Playground.COMPILE_TIMEOUT)
+        except asyncio.TimeoutError:
+            try:
+                compile_proc.kill()
+            except Exception:
+                pass
+            return None, "Compile Timeout"
+
+        if compile_proc.returncode != 0:
+            compile_error = c_stderr.decode("utf-8", errors="replace") or c_stdout.decode("utf-8", errors="replace")
+            return None, f"Compile Error:\n{compile_error}"
+
+        return exe_path, None
+
+    @staticmethod
+    def _build_run_cmd(workdir: Path, exe_path: Path, firejail_available: bool, args: Optional[list[str]] = None) -> list[str]:
+        """构造运行命令"""
+        if firejail_available:
+            # 使用 firejail 进行安全执行
+            return Playground._get_firejail_args(str(workdir)) + [f"./{exe_path.name}"] + (args or [])
+        # Windows系统：直接执行（无沙箱）
+        return [str(exe_path)] + (args or [])
+
+    @staticmethod
+    def _execute_sync(
+        cmd: list[str],
+        cwd: str,
+        stdin_data: Optional[bytes],
+        timeout: float,
+        input_cmd: Optional[list[str]] = None,
+        cpu: Optional[int] = None,
+        runner: Optional[Path] = None,
+    ) -> RunResult:
+        """
+        同步执行进程并采集资源占用
+
+        使用 os.wait4 回收子进程以拿到其 rusage（CPU 时间与峰值内存），
+        asyncio 的子进程回收会丢掉这部分信息，因此这里放在线程中执行。
+        给定 runner 时经由运行器启动，CPU 时间与峰值内存取运行器报告的程序自身数据；
+        否则峰值内存包含从本进程继承的 RSS，无法使用，不予报告。
+        给定 input_cmd 时，其标准输出通过管道直接接到被测程序的标准输入，输入不经过本进程。
+        给定 cpu 时被测程序（及沙箱内的子进程）绑定到该核：经由运行器时在程序启动前绑定，
+        否则在启动后立即绑定。生成器不绑核，避免与被测程序争抢同一个核、抬高计时。
+
+        被测程序与生成器都在新会话中启动，超时时按进程组结束，不会留下仍在运行的沙箱或子进程。
+
+        本函数在线程池中执行，不能使用 preexec_fn（存在其它线程时可能导致子进程死锁）。
+        """
+        report_r: Optional[int] = None
+        report_w: Optional[int] = None
+        if runner is not None:
+            report_r, report_w = os.pipe()
+            cmd = [str(runner), str(report_w), str(cpu if cpu is not None else -1)] + cmd
+        start = time.perf_counter()
+        feeder: Optional[subprocess.Popen] = None
+        if input_cmd:
+            feeder = subprocess.Popen(
+                input_cmd,
+                cwd=cwd,
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+                start_new_session=True,
+            )
+        try:
+            proc = subprocess.Popen(
+                cmd,
+                cwd=cwd,
+                stdin=feeder.stdout if feeder else subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                pass_fds=(report_w,) if report_w is not None else (),
+                start_new_session=True,
+            )
+        finally:
+            if report_w is not None:
+                # 写端只留给运行器，运行器退出后读端即可读到 EOF
+                os.close(report_w)
+        if cpu is not None and runner is None:
+            try:
+                os.sched_setaffinity(proc.pid, {cpu})
+            except OSError:
+                # 进程已经退出
+                pass
+        if feeder:
+            # 管道读端已交给被测程序，本进程关闭自己的副本，生成器才能在对端退出时收到 SIGPIPE
+            feeder.stdout.close()
+
+        stdout_chunks: list[bytes] = []
+        stderr_chunks: list[bytes] = []
+
+        def _feed():
+            try:
+                if stdin_data:
+                    proc.stdin.write(stdin_data)
+            except (BrokenPipeError, OSError):
+                # 进程未读完输入就退出属于正常情况
+                pass
+            finally:
+                try:
+                    proc.stdin.close()
+                except OSError:
+                    pass
+
+        pumps = [
+            threading.Thread(target=lambda: stdout_chunks.append(proc.stdout.read()), daemon=True),
+            threading.Thread(target=lambda: stderr_chunks.append(proc.stderr.read()), daemon=True),
+        ]
+        if not feeder:
+            pumps.append(threading.Thread(target=_feed, daemon=True))
+        for t in pumps:
+            t.start()
+
+        timed_out = threading.Event()
+
+        def _kill():
+            timed_out.set()
+            # 经由运行器时由运行器杀死被测程序的进程组并回收，否则直接杀死整个进程组
+            Playground._kill_group(proc, signal.SIGTERM if runner is not None else _SIGKILL)
+            if feeder:
+                Playground._kill_group(feeder, _SIGKILL)
+
+        def _force_kill():
+            # 运行器未能在宽限时间内退出（例如仍有子孙进程未结束）
+            Playground._kill_group(proc, _SIGKILL)
+
+        timers = [threading.Timer(timeout, _kill), threading.Timer(timeout + Playground.KILL_GRACE, _force_kill)]
+        for timer in timers:
+            timer.start()
+        cpu_time_ms: Optional[float] = None
+        user_time_ms: Optional[float] = None
+        memory_kb: Optional[int] = None
+        try:
+            if hasattr(os, "wait4"):
+                _, status, usage = os.wait4(proc.pid, 0)
+                proc.returncode = os.waitstatus_to_exitcode(status)
+                cpu_time_ms = (usage.ru_utime + usage.ru_stime) * 1000
+                user_time_ms = usage.ru_utime * 1000
+            else:
+                proc.wait()
+            if runner is None:
+                # 运行器会自行清理并回收被测程序的进程组，没有运行器时由本进程清理残留的子进程
+                Playground._kill_group(proc, _SIGKILL)
+                Playground._wait_group_gone(proc.pid)
+            if report_r is not None:
+                report = Playground._read_report(report_r)
+                if report is not None:
+                    # Linux 下 ru_maxrss 单位为 KB
+                    memory_kb, user_us, system_us = report
+                    user_time_ms = user_us / 1000
+                    cpu_time_ms = (user_us + system_us) / 1000
+            if feeder:
+                try:
+                    feeder.wait(timeout=1)
+                except subprocess.TimeoutExpired:
+                    Playground._kill_group(feeder, _SIGKILL)
+                    feeder.wait()
+        finally:
+            for timer in timers:
+                timer.cancel()
+            if report_r is not None:
+                os.close(report_r)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+
+        for t in pumps:
+            # 超时被杀时沙箱内残留的子进程可能仍持有管道，不无限等待
+            t.join(timeout=1 if timed_out.is_set() else None)
+        for stream in (proc.stdout, proc.stderr):
+            try:
+                stream.close()
+            except OSError:
+                pass
+
+        # 被测程序提前退出时生成器会因 SIGPIPE 结束，不算生成器出错
+        feeder_failed = feeder is not None and feeder.returncode not in _BENIGN_FEEDER_EXIT
+        if timed_out.is_set():
+            status_ = RunStatus.TIMEOUT
+        elif feeder_failed:
+            status_ = RunStatus.GENERATOR_ERROR
+        elif proc.returncode != 0:
+            status_ = RunStatus.RUNTIME_ERROR
+        else:
+            status_ = RunStatus.OK
+
+        return RunResult(
+            status=status_,
+            exitCode=proc.returncode,
+            stdout=b"".join(stdout_chunks).decode("utf-8", errors="replace"),
+            stderr=(
+                f"Input generator exited with code {feeder.returncode}"
+                if feeder_failed
+                else b"".join(stderr_chunks).decode("utf-8", errors="replace")
+            ),
+            timeMs=elapsed_ms,
+            cpuTimeMs=cpu_time_ms,
+            userTimeMs=user_time_ms,
+            memoryKb=memory_kb,
+            cpu=cpu,
+        )
+
+    @staticmethod
+    def _kill_group(proc: subprocess.Popen, sig: int) -> None:
+        """向以新会话启动的进程所在的进程组发送信号；不支持进程组的平台直接结束该进程"""
+        try:
+            if hasattr(os, "killpg"):
+                os.killpg(proc.pid, sig)
+            else:
+                proc.kill()
+        except OSError:
+            # 进程组已经不存在
+            pass
+
+    @staticmethod
+    def _wait_group_gone(pgid: int) -> None:
+        """等待进程组中的进程全部结束，最多等待 KILL_GRACE 秒"""
+        if not hasattr(os, "killpg"):
+            return
+        deadline = time.monotonic() + Playground.KILL_GRACE
+        while time.monotonic() < deadline:
+            try:
+                os.killpg(pgid, 0)
+            except OSError:
+                return
+            time.sleep(0.01)
+        logging.warning(f"Process group {pgid} still alive {Playground.KILL_GRACE}s after being killed")
+
+    @staticmethod
+    def _read_report(fd: int) -> Optional[tuple[int, int, int]]:
+        """读取运行器的报告（峰值内存 KB、用户态与内核态 CPU 微秒）；运行器被杀死时没有报告"""
+        os.set_blocking(fd, False)
+        try:
+            fields = os.read(fd, 256).split()
+            return int(fields[0]), int(fields[1]), int(fields[2])
+        except (BlockingIOError, IndexError, ValueError):
+            return None
+
+    @staticmethod
+    async def execute(
+        cmd: list[str],
+        cwd: Path,
+        input: Optional[str] = None,
+        timeout: Optional[float] = None,
+        input_cmd: Optional[list[str]] = None,
+    ) -> RunResult:
+        """
+        执行已编译的程序，返回包含耗时与内存的运行结果
+
+        input_cmd 的输出会流式作为程序输入；每次运行独占评测核池中的一个核，池满时排队等待。
+        核在被测程序的整个进程组结束并回收后才归还，调用方被取消时也是如此。
+        """
+        runner = await JudgeCache.runner()
+        async with JudgeCorePool.acquire() as cpu:
+            run = asyncio.ensure_future(asyncio.to_thread(
+                Playground._execute_sync,
+                cmd,
+                str(cwd),
+                input.encode("utf-8") if input else None,
+                timeout if timeout is not None else Playground.RUN_TIMEOUT,
+                input_cmd,
+                cpu,
+                runner,
+            ))
+            try:
+                return await asyncio.shield(run)
+            except asyncio.CancelledError:
+                # 线程中的运行不会随取消停止，等它结束（最迟到超时）后再归还核
+                await asyncio.gather(run, return_exceptions=True)
+                raise
+
+    @staticmethod
+    def format_output(result: RunResult) -> str:
+        """将运行结果转换为返回给前端的输出文本"""
+        if result.status == RunStatus.TIMEOUT:
+            return "Runtime Timeout"
+        if result.status == RunStatus.RUNTIME_ERROR:
+            # 返回运行时错误输出
+            return (result.stderr or result.stdout) or f"Process exited with code {result.exitCode}"
+        return result.stdout
+
+    @staticmethod
+    async def run_code(code: CodeContent, input: str, language: CodeLanguage) -> str:
+        outputs = await Playground.run_code_batch(code, [input], language)
+        return outputs[0]
+
+    @staticmethod
+    async def run_code_batch(
+        code: CodeContent, inputs: list[str], language: CodeLanguage, concurrency: Optional[int] = None
+    ) -> list[str]:
+        """
+        编译一次，并发运行多组输入，按输入顺序返回每组的输出
+
+        同时运行的组数不超过 concurrency（经调度器时为其分得的槽位数），未给定时仅受 JudgeCorePool 限制；
+        编译错误等公共错误会作为每组输入的输出返回
+        """
+        if language != CodeLanguage.C_CPP:
+            return ["Unsupported language: only c_cpp is available for now."] * len(inputs)
+
+        firejail_available, sandbox_error = await Playground._check_sandbox()
+        if sandbox_error:
+            return [sandbox_error] * len(inputs)
 
         # 创建临时目录与源文件
         try:
             with tempfile.TemporaryDirectory(prefix="playground_") as tmpdir:
                 tmp = Path(tmpdir)
-                src_path = tmp / "main.cpp"
-                exe_path = tmp / f"main{exe_suffix}"
-
-                # 写入源代码
-                src_path.write_text(code, encoding="utf-8")
-
-                # 选择可用编译器
-                for base in candidate_cmds:
-                    try:
-                        # 简单探测：尝试运行 <cmd> --version
-                        proc = await asyncio.create_subprocess_exec(
-                            *base, "--version",
-                            stdout=asyncio.subprocess.PIPE,
-                            stderr=asyncio.subprocess.PIPE,
-                        )
-                        await asyncio.wait_for(proc.communicate(), timeout=5)
-                        if proc.returncode == 0:
-                            compiler_cmd = base
-                            break
-                    except Exception:
-                        continue
-
-                if compiler_cmd is None:
-                    return "Compiler not found: please install g++/gcc and ensure it's in PATH."
-
-                compile_cmd = compiler_cmd + [
-                    str(src_path),
-                    "-O2",
-                    "-std=c++17",
-                    "-o",
-                    str(exe_path),
-                ]
-
-                compile_proc = await asyncio.create_subprocess_exec(
-                    *compile_cmd,
-                    cwd=str(tmp),
-                    stdout=asyncio.subprocess.PIPE,
-                    stderr=asyncio.subprocess.PIPE,
-                )
-                try:
-                    c_stdout, c_stderr = await asyncio.wait_for(compile_proc.communicate(), timeout=15)
-                except asyncio.TimeoutError:
-                    try:
-                        compile_proc.kill()
-                    except Exception:
-                        pass
-                    return "Compile Timeout"
-
-                if compile_proc.returncode != 0:
-                    compile_error = c_stderr.decode("utf-8", errors="replace") or c_stdout.decode("utf-8", errors="replace")
-                    return f"Compile Error:\n{compile_error}"
+                exe_path, compile_error = await Playground.compile_code(code, tmp)
+                if compile_error:
+                    return [compile_error] * len(inputs)
 
                 # 运行
-                if firejail_available:
-                    # 使用 firejail 进行安全执行
-                    firejail_args = Playground._get_firejail_args(str(tmp))
-                    run_cmd = firejail_args + [f"./main{exe_suffix}"]
-                else:
-                    # Windows系统：直接执行（无沙箱）
-                    run_cmd = [str(exe_path)]
-
-                run_proc = await asyncio.create_subprocess_exec(
-                    *run_cmd,
-                    cwd=str(tmp),
-                    stdin=asyncio.subprocess.PIPE,
-                    stdout=asyncio.subprocess.PIPE,
-                    stderr=asyncio.subprocess.PIPE,
-                )
-                try:
-                    r_stdout, r_stderr = await asyncio.wait_for(
-                        run_proc.communicate(input.encode("utf-8") if input else None),
-                        timeout=5,
-                    )
-                except asyncio.TimeoutError:
-                    try:
-                        run_proc.kill()
-                    except Exception:
-                        pass
-                    return "Runtime Timeout"
-
-                if run_proc.returncode != 0:
-                    # 返回运行时错误输出
-                    err = r_stderr.decode("utf-8", errors="replace")
-                    out = r_stdout.decode("utf-8", errors="replace")
-                    return (err or out) or f"Process exited with code {run_proc.returncode}"
-
-                return r_stdout.decode("utf-8", errors="replace")
+                run_cmd = Playground._build_run_cmd(tmp, exe_path, firejail_available)
+                limit = asyncio.Semaphore(max(1, concurrency or len(inputs)))
+
+                async def _run(input: str) -> RunResult:
+                    async with limit:
+                        return await Playground.execute(run_cmd, cwd=tmp, input=input)
+
+                results = await asyncio.gather(*[_run(input) for input in inputs], return_exceptions=True)
+                return [
+                    f"Runner Error: {result}" if isinstance(result, Exception) else Playground.format_output(result)
+                    for result in results
+                ]
         except Exception as e:
-            return f"Runner Error: {e}"
-    async def judge_code(code:CodeContent, testSample: TestSampleCreate)-> JudgeResult:
+            return [f"Runner Error: {e}"] * len(inputs)
+
+    @staticmethod
+    async def _prepare_generator(generator: TestGenerator, workdir: Path, firejail_available: bool) -> tuple[Path, Path]:
+        """将生成器与参考解的缓存可执行文件放入工作目录（firejail 只能访问工作目录）"""
+        gen_path = await JudgeCache.compiled(generator.generatorCode)
+        ref_path = await JudgeCache.compiled(generator.referenceCode)
+        gen_local = workdir / f"gen{gen_path.suffix}"
+        ref_local = workdir / f"ref{ref_path.suffix}"
+        shutil.copy2(gen_path, gen_local)
+        shutil.copy2(ref_path, ref_local)
+        return gen_local, ref_local
+
+    @staticmethod
+    async def _expected_output(
+        generator: TestGenerator, seed: int, workdir: Path, gen_local: Path, ref_local: Path, firejail_available: bool
+    ) -> str:
+        """用参考解跑出某个种子的期望输出，按需读写缓存"""
+        cache_key = JudgeCache.expected_key(generator, seed)
+        if generator.cacheExpected:
+            cached = JudgeCache.load_expected(cache_key)
+            if cached is not None:
+                return cached
+
+        result = await Playground.execute(
+            Playground._build_run_cmd(workdir, ref_local, firejail_available),
+            cwd=workdir,
+            input_cmd=Playground._build_run_cmd(workdir, gen_local, firejail_available, [str(seed)]),
+        )
+        if result.status != RunStatus.OK:
+            raise RuntimeError(f"Reference solution failed on seed {seed}: {Playground.format_output(result)}")
+
+        if generator.cacheExpected:
+            JudgeCache.store_expected(cache_key, result.stdout)
+        return result.stdout
+
+    @staticmethod
+    async def judge_code(code: CodeContent, testSample: TestSampleCreate, generators: Optional[list[TestGenerator]] = None) -> JudgeResult:
+        generators = generators or []
+        generated_total = sum(len(g.seeds) for g in generators)
+        total = len(testSample.input) + generated_total
         try:
+            firejail_available, sandbox_error = await Playground._check_sandbox()
+            if sandbox_error:
+                return JudgeResult(score=0, testRealOutput=[sandbox_error for _ in testSample.input], generatedTotal=generated_total)
+
             score = 0
-            testRealOutput:list[MdCodeContent] = []
-            for i in range(len(testSample.input)):
-                output = await Playground.run_code(
-                    code=code,
-                    input=testSample.input[i],
-                    language=CodeLanguage.C_CPP,
-                )
-                testRealOutput.append(output)
-                if output.strip() == testSample.expectOutput[i].strip():
-                    score += 1
+            testRealOutput: list[MdCodeContent] = []
+            generated_passed = 0
+            with tempfile.TemporaryDirectory(prefix="judge_") as tmpdir:
+                tmp = Path(tmpdir)
+                # 所有测试点共用一次编译
+                exe_path, compile_error = await Playground.compile_code(code, tmp)
+                if compile_error:
+                    return JudgeResult(score=0, testRealOutput=[compile_error for _ in testSample.input], generatedTotal=generated_total)
+                run_cmd = Playground._build_run_cmd(tmp, exe_path, firejail_available)
+
+                for i in range(len(testSample.input)):
+                    result = await Playground.execute(run_cmd, cwd=tmp, input=testSample.input[i])
+                    output = Playground.format_output(result)
+                    testRealOutput.append(output)
+                    if output.strip() == testSample.expectOutput[i].strip():
+                        score += 1
 
-            return JudgeResult(score=int(score / len(testSample.input) * 100), testRealOutput=testRealOutput)
+                # 生成器测试点：输入由生成器流式写入，输出体积可能很大，不回传给前端
+                for generator in generators:
+                    gen_local, ref_local = await Playground._prepare_generator(generator, tmp, firejail_available)
+                    for seed in generator.seeds:
+                        expected = await Playground._expected_output(generator, seed, tmp, gen_local, ref_local, firejail_available)
+                        result = await Playground.execute(
+                            run_cmd,
+                            cwd=tmp,
+                            input_cmd=Playground._build_run_cmd(tmp, gen_local, firejail_available, [str(seed)]),
+                        )
+                        if result.status == RunStatus.OK and result.stdout.strip() == expected.strip():
+                            generated_passed += 1
+
+            return JudgeResult(
+                score=int((score + generated_passed) / total * 100),
+                testRealOutput=testRealOutput,
+                generatedTotal=generated_total,
+                generatedPassed=generated_passed,
+            )
+        except Exception as e:
+            logging.error(f"Judge error: {e}")
+            return JudgeResult(score=0, testRealOutput=['' for i in range(len(testSample.input))], generatedTotal=generated_total)
+
+
+class JudgeCache:
+    """评测缓存：按源码哈希缓存编译产物，按种子缓存参考解的期望输出"""
+
+    CACHE_DIR = Path(os.getenv("JUDGE_CACHE_DIR", os.path.join(tempfile.gettempdir(), "matrix-ai-judge")))
+
+    # 同一份源码并发编译时只编译一次
+    _compile_locks: dict[str, asyncio.Lock] = {}
+    # 运行器编译失败后不再重试
+    _runner_failed: bool = False
+
+    @staticmethod
+    def _hash(*parts: str) -> str:
+        digest = hashlib.sha256()
+        for part in parts:
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    @classmethod
+    async def compiled(cls, code: CodeContent) -> Path:
+        """返回源码对应的可执行文件，首次调用时编译并缓存"""
+        key = cls._hash(code)
+        exe_suffix = ".exe" if os.name == "nt" else ""
+        exe_path = cls.CACHE_DIR / "bin" / f"{key}{exe_suffix}"
+        if exe_path.exists():
+            return exe_path
+
+        lock = cls._compile_locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            if exe_path.exists():
+                return exe_path
+            exe_path.parent.mkdir(parents=True, exist_ok=True)
+            with tempfile.TemporaryDirectory(prefix="judge_build_") as tmpdir:
+                built, compile_error = await Playground.compile_code(code, Path(tmpdir))
+                if compile_error:
+                    raise RuntimeError(compile_error)
+                # 先拷到同目录再原子替换，避免其它进程读到写了一半的文件
+                staging = exe_path.with_name(f"{exe_path.name}.{os.getpid()}.tmp")
+                shutil.copy2(built, staging)
+                os.replace(staging, exe_path)
+        return exe_path
+
+    @classmethod
+    async def runner(cls) -> Optional[Path]:
+        """返回编译好的运行器；平台不支持 wait4（如 Windows）或编译失败时返回 None"""
+        if os.name == "nt" or not hasattr(os, "wait4") or cls._runner_failed:
+            return None
+        try:
+            return await cls.compiled(_RUNNER_SOURCE)
         except Exception as e:
-            return JudgeResult(score=0, testRealOutput=['' for i in range(len(testSample.input))])
+            logging.warning(f"Run wrapper unavailable, memory usage will not be reported: {e}")
+            cls._runner_failed = True
+            return None
+
+    @classmethod
+    def expected_key(cls, generator: TestGenerator, seed: int) -> str:
+        return cls._hash(generator.generatorCode, generator.referenceCode, str(seed))
+
+    @classmethod
+    def load_expected(cls, key: str) -> Optional[str]:
+        path = cls.CACHE_DIR / "expected" / f"{key}.out"
+        try:
+            return path.read_text(encoding="utf-8")
+        except FileNotFoundError:
+            return None
+
+    @classmethod
+    def store_expected(cls, key: str, output: str) -> None:
+        path = cls.CACHE_DIR / "expected" / f"{key}.out"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        staging = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        staging.write_text(output, encoding="utf-8")
+        os.replace(staging, path)
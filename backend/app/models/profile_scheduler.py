@@ -0,0 +1,98 @@
+import os
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Optional
+
+
+@dataclass
+class _ProfileState:
+    runner: Callable[[], Awaitable[None]]
+    # 尚未处理的请求中最早与最晚的到达时间（事件循环时间）
+    first: Optional[float] = None
+    last: Optional[float] = None
+    timer: Optional[asyncio.TimerHandle] = None
+    task: Optional[asyncio.Task] = None
+
+
+class ProfileScheduler:
+    """
+    用户画像更新的按用户防抖调度
+
+    - 连续提交只在安静 QUIET_SECONDS 秒后更新一次
+    - 持续有提交时，距最早未处理的请求最多 MAX_DELAY_SECONDS 秒也会更新一次
+    - 同一用户同时最多只有一次更新在进行，期间到达的请求合并到下一次
+    """
+
+    QUIET_SECONDS = float(os.getenv("AI_PROFILE_DEBOUNCE_SECONDS", "30"))
+    MAX_DELAY_SECONDS = float(os.getenv("AI_PROFILE_MAX_DELAY_SECONDS", "300"))
+
+    _states: dict[str, _ProfileState] = {}
+    _requests = 0
+    _runs = 0
+
+    @classmethod
+    def request(cls, user_id: str, runner: Callable[[], Awaitable[None]]) -> None:
+        """登记一次更新请求，runner 为实际执行更新的协程函数"""
+        now = asyncio.get_running_loop().time()
+        state = cls._states.get(user_id)
+        if state is None:
+            state = cls._states[user_id] = _ProfileState(runner)
+        state.runner = runner
+        if state.first is None:
+            state.first = now
+        state.last = now
+        cls._requests += 1
+        # 更新进行中时不重新计时，结束后再为期间的请求安排下一次
+        if state.task is None:
+            cls._arm(user_id, state)
+
+    @classmethod
+    def _arm(cls, user_id: str, state: _ProfileState) -> None:
+        if state.timer is not None:
+            state.timer.cancel()
+        due = min(state.last + cls.QUIET_SECONDS, state.first + cls.MAX_DELAY_SECONDS)
+        state.timer = asyncio.get_running_loop().call_at(due, cls._fire, user_id, state)
+
+    @classmethod
+    def _fire(cls, user_id: str, state: _ProfileState) -> None:
+        state.timer = None
+        state.first = state.last = None
+        cls._runs += 1
+        state.task = asyncio.ensure_future(cls._run(user_id, state))
+
+    @classmethod
+    async def _run(cls, user_id: str, state: _ProfileState) -> None:
+        try:
+            await state.runner()
+        except Exception as e:
+            logging.error(f"Profile update for {user_id} failed: {e}")
+        finally:
+            state.task = None
+            if state.first is not None:
+                cls._arm(user_id, state)
+            elif cls._states.get(user_id) is state:
+                del cls._states[user_id]
+
+    @classmethod
+    async def stop(cls) -> None:
+        """取消尚未开始的更新并等待进行中的更新结束"""
+        tasks = []
+        for state in cls._states.values():
+            if state.timer is not None:
+                state.timer.cancel()
+                state.timer = None
+            state.first = state.last = None
+            if state.task is not None:
+                tasks.append(state.task)
+        await asyncio.gather(*tasks, return_exceptions=True)
+        cls._states.clear()
+
+    @classmethod
+    def stats(cls) -> dict:
+        return {
+            "pendingUsers": sum(1 for s in cls._states.values() if s.timer is not None),
+            "running": sum(1 for s in cls._states.values() if s.task is not None),
+            "requests": cls._requests,
+            "runs": cls._runs,
+        }
@@ -0,0 +1,125 @@
+import shutil
+import logging
+import statistics
+import tempfile
+from pathlib import Path
+from typing import Callable, Optional, Union
+
+from app.models.playground import JudgeCache, Playground
+from app.schemas.assignment import CodeContent, Complexity, RunStatus, TestGenerator
+from app.utils.complexity import fit_growth
+
+# 输入生成器：给定规模 n 返回一份输入文本的函数，或以 `./gen <seed> <n>` 调用的生成器程序
+InputGenerator = Union[Callable[[int], str], TestGenerator]
+
+
+class ComplexityProfiler:
+    """实测复杂度分析：编译解法，在规模递增的输入上运行并拟合时间与内存的增长阶"""
+
+    # 默认输入规模，按 4 倍递增
+    SIZES = [1_000, 4_000, 16_000, 64_000, 256_000, 1_024_000]
+    # 每个规模重复运行次数，取用户态 CPU 时间的中位数以压低调度噪声
+    REPEAT = 5
+    # 单次运行 CPU 时间超过该值（毫秒）后不再继续增大规模
+    TIME_BUDGET_MS = 1500
+    # 时间/内存的测量噪声下限
+    TIME_NOISE_MS = 5.0
+    MEMORY_NOISE_KB = 256
+
+    @classmethod
+    async def profile(
+        cls,
+        code: CodeContent,
+        input_generator: InputGenerator,
+        sizes: Optional[list[int]] = None,
+    ) -> Optional[Complexity]:
+        """
+        实测代码的时间与空间复杂度
+
+        Args:
+            code: 待分析的 C/C++ 源码（不含 Markdown 标记）
+            input_generator: 输入生成器
+            sizes: 输入规模列表，默认使用 SIZES
+
+        Returns:
+            Complexity: 拟合得到的复杂度；编译失败、运行出错或有效数据点不足时返回 None
+        """
+        sizes = sorted(sizes or cls.SIZES)
+
+        firejail_available, sandbox_error = await Playground._check_sandbox()
+        if sandbox_error:
+            logging.warning(f"Complexity profiling skipped: {sandbox_error}")
+            return None
+
+        try:
+            with tempfile.TemporaryDirectory(prefix="profiler_") as tmpdir:
+                tmp = Path(tmpdir)
+                exe_path, compile_error = await Playground.compile_code(code, tmp)
+                if compile_error:
+                    logging.warning(f"Complexity profiling skipped: {compile_error}")
+                    return None
+                run_cmd = Playground._build_run_cmd(tmp, exe_path, firejail_available)
+
+                gen_local: Optional[Path] = None
+                if isinstance(input_generator, TestGenerator):
+                    gen_path = await JudgeCache.compiled(input_generator.generatorCode)
+                    gen_local = tmp / f"gen{gen_path.suffix}"
+                    shutil.copy2(gen_path, gen_local)
+
+                inputs: list[tuple[Optional[str], Optional[list[str]]]] = []
+                costs: list[list[float]] = []
+                memories: list[Optional[int]] = []
+
+                async def _measure(index: int) -> bool:
+                    """在第 index 个规模上运行一次并记录，运行失败时返回 False"""
+                    input_text, input_cmd = inputs[index]
+                    result = await Playground.execute(run_cmd, cwd=tmp, input=input_text, input_cmd=input_cmd)
+                    if result.status != RunStatus.OK:
+                        return False
+                    # 用户态时间不含缺页与读写输入的内核开销，随规模变化最稳定
+                    if result.userTimeMs is not None:
+                        costs[index].append(result.userTimeMs)
+                    else:
+                        costs[index].append(result.cpuTimeMs if result.cpuTimeMs is not None else result.timeMs)
+                    if result.memoryKb is not None:
+                        memories[index] = max(memories[index] or 0, result.memoryKb)
+                    return True
+
+                # 第一轮按规模递增，超时、出错或超出时间预算后不再增大规模
+                for n in sizes:
+                    if gen_local is not None:
+                        # 生成器程序的输出直接流入被测程序，不在内存中展开
+                        seed = str(input_generator.seeds[0])
+                        inputs.append((None, Playground._build_run_cmd(tmp, gen_local, firejail_available, [seed, str(n)])))
+                    else:
+                        inputs.append((input_generator(n), None))
+                    costs.append([])
+                    memories.append(None)
+                    if not await _measure(len(inputs) - 1):
+                        del inputs[-1], costs[-1], memories[-1]
+                        break
+                    if costs[-1][0] > cls.TIME_BUDGET_MS:
+                        break
+
+                # 其余各轮在规模之间交替运行，CPU 频率变化等持续一段时间的干扰会分摊到各个规模上
+                for _ in range(cls.REPEAT - 1):
+                    for index in range(len(inputs)):
+                        if not await _measure(index):
+                            # 接近超时的规模偶尔失败，舍弃它及更大的规模
+                            del inputs[index:], costs[index:], memories[index:]
+                            break
+
+                measured_sizes = sizes[:len(costs)]
+                times = [statistics.median(c) for c in costs]
+        except Exception as e:
+            logging.error(f"Complexity profiling failed: {e}")
+            return None
+
+        time_class = fit_growth(measured_sizes, times, noise_floor=cls.TIME_NOISE_MS)
+        if time_class is None:
+            return None
+        space_class = "O(1)"
+        if all(m is not None for m in memories):
+            space_class = fit_growth(measured_sizes, memories, noise_floor=cls.MEMORY_NOISE_KB) or "O(1)"
+
+        return Complexity(time=time_class, space=space_class)
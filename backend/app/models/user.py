@@ -6,4 +6,5 @@ class User(Model):
   username = fields.CharField(max_length=50)
   code_style = fields.TextField(null=True, description="代码风格 AI 总结")
   knowledge_status = fields.TextField(null=True, description="知识掌握情况 AI 总结")
+  profile_watermark = fields.DatetimeField(null=True, description="已计入 AI 总结的最后一次提交时间")
 
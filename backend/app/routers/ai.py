@@ -1,5 +1,16 @@
-from fastapi import APIRouter, Query
+from typing import Optional
+from fastapi import APIRouter, Header, Query, Path
 from app.controller.ai import AIController
+from app.models.ai_cache import AICache
+from app.models.ai_flight import AISingleFlight
+from app.models.ai import AIAnalysisGenerator, AIQueue
+from app.models.ai_budget import AIBudget
+from app.models.ai_governor import AIGovernor
+from app.models.ai_hedge import AIHedge
+from app.models.ai_telemetry import AITelemetry
+from app.models.ai_provider import AIProviderPool
+from app.models.profile_scheduler import ProfileScheduler
+from app.schemas.ai import AIJobInfo
 from fastapi.responses import StreamingResponse
 
 
@@ -25,11 +36,12 @@ async def generate_analysis(
 async def basic_analysis_stream(
     course_id: str,
     assign_id: str,
-    analysisType: str = Query("resolution", description="分析类型: resolution 或 knowledge")
+    analysisType: str = Query("resolution", description="分析类型: resolution 或 knowledge"),
+    last_event_id: Optional[str] = Header(None, alias="Last-Event-ID", description="断线重连时浏览器自动带上的最后一条事件 ID"),
 ):
     """流式生成基础分析（解题分析或知识点分析）"""
     return StreamingResponse(
-        AIController.getBasicStream(course_id, assign_id, analysisType),
+        AIController.getBasicStream(course_id, assign_id, analysisType, last_event_id),
         media_type="text/event-stream",
         headers={
             "Cache-Control": "no-cache",
@@ -42,11 +54,12 @@ async def basic_analysis_stream(
 async def generate_analysis_stream(
     course_id: str,
     assign_id: str,
-    analysisType: str = Query("code", description="分析类型: code 或 learning")
+    analysisType: str = Query("code", description="分析类型: code 或 learning"),
+    last_event_id: Optional[str] = Header(None, alias="Last-Event-ID", description="断线重连时浏览器自动带上的最后一条事件 ID"),
 ):
     """流式生成AI分析（代码分析或学习建议）"""
     return StreamingResponse(
-        AIController.getAiGenStream(course_id, assign_id, analysisType),
+        AIController.getAiGenStream(course_id, assign_id, analysisType, last_event_id),
         media_type="text/event-stream",
         headers={
             "Cache-Control": "no-cache",
@@ -56,3 +69,35 @@ async def generate_analysis_stream(
     )
 
 
+@ai_route.post("/courses/{course_id}/assignments/{assign_id}/analysis/{kind}/jobs", response_model=AIJobInfo, status_code=202)
+async def create_analysis_job(
+    course_id: str,
+    assign_id: str,
+    kind: str = Path(..., description="任务类型: basic 或 aiGen"),
+):
+    """提交后台生成任务，立即返回任务句柄，完成后通过原接口读取结果"""
+    return await AIController.createJob(course_id, assign_id, kind)
+
+@ai_route.get("/ai/jobs/{job_id}", response_model=AIJobInfo)
+async def get_analysis_job(job_id: str):
+    """查询后台生成任务状态"""
+    return await AIController.getJob(job_id)
+
+
+@ai_route.get("/ai/metrics")
+async def ai_metrics(
+    assignId: Optional[str] = Query(None, description="只列出该作业的模型调用汇总，默认列出 token 用量最多的若干作业"),
+):
+    """AI 调用调度、缓存、合并与流式输出的运行指标，以及按提示词、作业与课程汇总的模型调用记录"""
+    return {
+        "governor": AIGovernor.stats(),
+        "providers": AIProviderPool.stats(),
+        "prompts": AIBudget.stats(),
+        "deadlines": AIHedge.stats(),
+        "cache": AICache.stats(),
+        "singleFlight": AISingleFlight.stats(),
+        "queue": AIQueue.stats(),
+        "streamFrames": AIAnalysisGenerator.frameStats(),
+        "profile": ProfileScheduler.stats(),
+        "calls": await AITelemetry.report(assignId),
+    }
@@ -1,7 +1,9 @@
 import json
-from fastapi import APIRouter, Path, Form, Body
-from app.schemas.assignment import AssignData, AssignCreateRequest, Submit, SubmitRequest, TestSubmitRequest, TestSampleCreate
+from fastapi import APIRouter, Path, Form, Body, Header
+from app.schemas.assignment import AssignData, AssignCreateRequest, Submit, SubmitRequest, TestSubmitRequest, TestBatchSubmitRequest, TestSampleCreate
 from app.controller.assignment import AssignmentController
+from app.constants.user import UserMatrixAI
+from app.models.judge_scheduler import JudgeScheduler
 
 
 assign_router = APIRouter(tags=["assignment"])
@@ -38,6 +40,7 @@ async def set_assignment(
         assignOriginalCode=assign.assignOriginalCode,
         testSample=_testSampleJSON,
         ddl=assign.ddl,
+        testGenerators=assign.testGenerators,
     )
 
 @assign_router.delete("/courses/{course_id}/assignments/{assign_id}", response_model=bool)
@@ -48,14 +51,30 @@ async def delete_assignment(
     return await AssignmentController.delete_assignment(course_id=course_id, assign_id=assign_id)
 
 @assign_router.post("/playground/submission", response_model=str)
-async def test_submit(submitRequest: TestSubmitRequest = Body(...)):
-    return await AssignmentController.test_submit(submitRequest=submitRequest)
+async def test_submit(
+    submitRequest: TestSubmitRequest = Body(...),
+    user_id: str = Header("", alias="user_id"),
+):
+    return await AssignmentController.test_submit(submitRequest=submitRequest, user_id=user_id or UserMatrixAI.username)
+
+@assign_router.post("/playground/submission/batch", response_model=list[str])
+async def test_submit_batch(
+    submitRequest: TestBatchSubmitRequest = Body(...),
+    user_id: str = Header("", alias="user_id"),
+):
+    return await AssignmentController.test_submit_batch(submitRequest=submitRequest, user_id=user_id or UserMatrixAI.username)
+
+@assign_router.get("/playground/queue")
+async def judge_queue_stats():
+    """评测调度器各类别的排队情况"""
+    return JudgeScheduler.stats()
 
 @assign_router.post("/courses/{course_id}/assignments/{assign_id}/submission", response_model=Submit)
 async def submit_code(
     course_id: str = Path(..., description="课程ID"),
     assign_id: str = Path(..., description="作业ID"),
-    submitRequest: SubmitRequest = Body(...)
+    submitRequest: SubmitRequest = Body(...),
+    user_id: str = Header("", alias="user_id"),
  ):
-    return await AssignmentController.submit_code(course_id, assign_id, submitRequest=submitRequest)
+    return await AssignmentController.submit_code(course_id, assign_id, submitRequest=submitRequest, user_id=user_id or UserMatrixAI.username)
 
@@ -1,6 +1,7 @@
 from pydantic import BaseModel, Field
 from enum import Enum
 from typing import Optional, Annotated, List
+from datetime import datetime
 
 from  app.schemas.general import AssignId
 
@@ -14,3 +15,13 @@ class AiResponse(BaseModel):
     content: List[AiContent] = Field(..., description="详细分析内容")
     learning_suggestion: List[AiContent] = Field(..., description="学习建议")
 
+
+class AIJobInfo(BaseModel):
+    jobId: str = Field(..., description="任务 ID")
+    kind: str = Field(..., description="任务类型")
+    assignId: AssignId = Field(..., description="作业 ID")
+    status: str = Field(..., description="任务状态: queued, running, done, failed")
+    attempts: int = Field(0, description="已执行次数")
+    error: Optional[str] = Field(None, description="失败原因")
+    createdAt: datetime = Field(..., description="创建时间")
+    finishedAt: Optional[datetime] = Field(None, description="完成时间")
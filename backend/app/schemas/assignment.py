@@ -57,12 +57,41 @@ class TestSubmitRequest(BaseModel):
     codeFile: CodeFileInfo = Field(..., description="提交的代码文件")
     input:str = Field(..., description="用户输入")
     language: CodeLanguage = Field(..., description="代码语言，目前仅含 c_cpp")
+class TestBatchSubmitRequest(BaseModel):
+    codeFile: CodeFileInfo = Field(..., description="提交的代码文件")
+    inputs: list[str] = Field(..., min_length=1, max_length=20, description="多组用户输入，按顺序返回对应输出")
+    language: CodeLanguage = Field(..., description="代码语言，目前仅含 c_cpp")
 class SubmitRequest(BaseModel):
     codeFile: CodeFileInfo = Field(..., description="提交的代码文件")
 
+class RunStatus(str, Enum):
+    OK = "ok"
+    RUNTIME_ERROR = "runtime_error"
+    TIMEOUT = "timeout"
+    GENERATOR_ERROR = "generator_error"
+
+class RunResult(BaseModel):
+    status: RunStatus = Field(..., description="运行状态")
+    exitCode: int | None = Field(None, description="进程退出码")
+    stdout: str = Field("", description="标准输出")
+    stderr: str = Field("", description="标准错误输出")
+    timeMs: float = Field(..., description="墙钟耗时（毫秒）")
+    cpuTimeMs: float | None = Field(None, description="CPU 耗时（毫秒），平台不支持时为空")
+    userTimeMs: float | None = Field(None, description="用户态 CPU 耗时（毫秒），平台不支持时为空")
+    memoryKb: int | None = Field(None, description="程序自身的峰值内存（KB），平台不支持时为空")
+    cpu: int | None = Field(None, description="运行时绑定的 CPU 核，未绑核时为空")
+
+class TestGenerator(BaseModel):
+    generatorCode: CodeContent = Field(..., description="输入生成器代码，以 `./gen <seed> [n]` 方式调用，向标准输出写出一份输入；n 为可选的输入规模，用于实测复杂度")
+    referenceCode: CodeContent = Field(..., description="参考解代码，用于生成期望输出")
+    seeds: list[int] = Field(..., min_length=1, description="随机种子列表，每个种子对应一个测试点")
+    cacheExpected: bool = Field(True, description="是否按种子缓存参考解的期望输出")
+
 class JudgeResult(BaseModel):
     score: float = Field(..., description="得分")
     testRealOutput: list[MdCodeContent] = Field(..., description="真实输出（列表）")
+    generatedTotal: int = Field(0, description="生成器测试点总数")
+    generatedPassed: int = Field(0, description="生成器测试点通过数")
 
 class Submit(BaseModel):
     score: float = Field(..., description="提交分数")
@@ -83,6 +112,7 @@ class AssignCreateRequest(BaseModel):
     ddl: datetime | str | None = Field(None, description="作业截止时间")
     assignId: AssignId | None = Field(None, description="作业ID，若为空则创建新作业")
     courseId: CourseId | None = Field(None, description="课程ID，前端多传")
+    testGenerators: list[TestGenerator] | None = Field(None, description="测试输入生成器，为空时不修改已有生成器")
 
 class AssignData(BaseModel):
     assignId: AssignId = Field(..., description="作业ID")
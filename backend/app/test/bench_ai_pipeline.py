@@ -0,0 +1,293 @@
+"""
+AI 流水线基准：用离线替身服务代替真实模型，按给定并发驱动解法生成、SSE 分析接口与智能体流式接口，
+输出各场景的延迟分位数与事件循环延迟，以及各提示词的模型调用统计
+
+用法：python app/test/bench_ai_pipeline.py [--requests N] [--concurrency C] [--ttft 秒] [--tps 每秒 token 数]
+      [--error-rate 比例] [--scenarios resolutions,sse,agent]
+
+替身服务（app/test/openai_standin.py）在子进程中运行，其自身负载不计入被测事件循环；
+被测的 FastAPI 路由使用内存 SQLite，在本进程内由 uvicorn 提供服务。每个请求使用不同的作业，
+不会命中单飞合并与已保存的分析；AI 响应缓存关闭，默认不限制每分钟请求数与 token 数。
+"""
+import asyncio, sys, os
+import argparse
+import math
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Optional
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+import httpx
+import uvicorn
+from fastapi import FastAPI
+from tortoise import Tortoise
+
+from app.models.ai import AI, AIAnalysisGenerator
+from app.models.ai_cache import AICache
+from app.models.ai_governor import AIGovernor
+from app.models.ai_provider import AIProvider, AIProviderPool
+from app.models.ai_telemetry import AITelemetry
+from app.models.assignment import Assignment, AssignmentCode
+from app.models.course import Course
+from app.routers.agent import agent_route
+from app.routers.ai import ai_route
+
+STANDIN = os.path.join(os.path.dirname(os.path.abspath(__file__)), "openai_standin.py")
+COURSE_ID = "bench-course"
+# 事件循环延迟的采样间隔（秒）
+LAG_INTERVAL = 0.01
+
+
+def percentile(values: list[float], p: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(p * len(ordered)) - 1)]
+
+
+class LoopLagMonitor:
+    """定时休眠并记录实际唤醒比预期晚了多久，反映事件循环被阻塞的程度"""
+
+    def __init__(self) -> None:
+        self.samples: list[float] = []
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + LAG_INTERVAL
+            await asyncio.sleep(LAG_INTERVAL)
+            self.samples.append(max(0.0, loop.time() - expected))
+
+    def start(self) -> None:
+        self.samples = []
+        self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self) -> list[float]:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        return self.samples
+
+
+@dataclass
+class ScenarioResult:
+    name: str
+    elapsed: float = 0.0
+    latencies: list[float] = field(default_factory=list)
+    first_bytes: list[float] = field(default_factory=list)
+    errors: list[str] = field(default_factory=list)
+    lags: list[float] = field(default_factory=list)
+
+
+# 一次操作返回首字节耗时（非流式操作为 None），出错时抛出异常
+Operation = Callable[[int], Awaitable[Optional[float]]]
+
+
+async def run_scenario(name: str, operation: Operation, requests: int, concurrency: int, monitor: LoopLagMonitor) -> ScenarioResult:
+    result = ScenarioResult(name)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def _one(i: int) -> None:
+        async with semaphore:
+            started = time.monotonic()
+            try:
+                first_byte = await operation(i)
+            except Exception as e:
+                result.errors.append(f"{type(e).__name__}: {e}")
+                return
+            result.latencies.append(time.monotonic() - started)
+            if first_byte is not None:
+                result.first_bytes.append(first_byte)
+
+    monitor.start()
+    started = time.monotonic()
+    await asyncio.gather(*[_one(i) for i in range(requests)])
+    result.elapsed = time.monotonic() - started
+    result.lags = await monitor.stop()
+    return result
+
+
+def report(results: list[ScenarioResult]) -> None:
+    def ms(values: list[float], p: float) -> str:
+        return f"{percentile(values, p) * 1000:8.1f}" if values else f"{'-':>8}"
+
+    print(f"{'scenario':<12} {'ok':>4} {'err':>4} {'req/s':>7} "
+          f"{'p50':>8} {'p90':>8} {'p99':>8} {'max':>8} {'ttfb50':>8} {'ttfb99':>8} "
+          f"{'lag50':>8} {'lag99':>8} {'lagmax':>8}  (ms)")
+    for r in results:
+        rate = len(r.latencies) / r.elapsed if r.elapsed else 0.0
+        print(f"{r.name:<12} {len(r.latencies):>4} {len(r.errors):>4} {rate:7.2f} "
+              f"{ms(r.latencies, 0.5)} {ms(r.latencies, 0.9)} {ms(r.latencies, 0.99)} {ms(r.latencies, 1.0)} "
+              f"{ms(r.first_bytes, 0.5)} {ms(r.first_bytes, 0.99)} "
+              f"{ms(r.lags, 0.5)} {ms(r.lags, 0.99)} {ms(r.lags, 1.0)}")
+        for error in sorted(set(r.errors))[:3]:
+            print(f"    {r.name} error: {error}")
+
+
+def report_prompts() -> None:
+    """各提示词标签的模型调用统计（不含排队）"""
+    def sec(value) -> str:
+        return f"{value * 1000:8.1f}" if value is not None else f"{'-':>8}"
+
+    print(f"{'prompt':<22} {'calls':>5} {'lat50':>8} {'lat95':>8} {'ttft50':>8} {'ttft95':>8} {'wait':>8} {'tok/s':>7}  (ms)")
+    for label, s in sorted(AITelemetry.stats()["byPrompt"].items()):
+        speed = f"{s['tokensPerSecond']:7.1f}" if s["tokensPerSecond"] else f"{'-':>7}"
+        print(f"{label:<22} {s['calls']:>5} {sec(s['latencyP50'])} {sec(s['latencyP95'])} "
+              f"{sec(s['ttftP50'])} {sec(s['ttftP95'])} {sec(s['queueWaitAvg'])} {speed}")
+
+
+async def start_standin(args: argparse.Namespace) -> tuple[asyncio.subprocess.Process, str]:
+    proc = await asyncio.create_subprocess_exec(
+        sys.executable, STANDIN, "--ttft", str(args.ttft), "--ttft-jitter", str(args.ttft_jitter),
+        "--slow-rate", str(args.slow_rate), "--slow-ttft", str(args.slow_ttft), "--tps", str(args.tps),
+        "--error-rate", str(args.error_rate),
+        stdout=asyncio.subprocess.PIPE,
+    )
+    line = (await proc.stdout.readline()).decode().strip()
+    if not line.startswith("listening "):
+        proc.kill()
+        raise RuntimeError(f"stand-in server failed to start: {line!r}")
+    return proc, line.split(" ", 1)[1]
+
+
+async def create_assignments(count: int) -> list[str]:
+    """创建互不相同的作业，避免请求之间命中单飞合并或已保存的分析；直接写表，不触发预生成"""
+    course = await Course.create(id=COURSE_ID, course_name="bench")
+    assign_ids = []
+    for i in range(count):
+        assignment = await Assignment.create(
+            id=uuid.uuid4().hex, title=f"两数之和 {i}", description="读入两个整数，输出它们的和", type="program",
+        )
+        await AssignmentCode.create(
+            id=uuid.uuid4().hex, assignment=assignment,
+            original_code='[{"fileName": "main.cpp", "content": "#include <cstdio>\\nint main() {}"}]',
+            sample_input='["1 2"]', sample_expect_output='["3"]',
+        )
+        await course.assignments.add(assignment)
+        assign_ids.append(assignment.id)
+    return assign_ids
+
+
+async def read_sse(client: httpx.AsyncClient, url: str) -> float:
+    """读完一个 SSE 流，返回收到第一个事件的耗时；出现 error 事件或没有 complete 事件时抛出异常"""
+    started = time.monotonic()
+    first_event: Optional[float] = None
+    completed = False
+    async with client.stream("GET", url) as response:
+        response.raise_for_status()
+        async for line in response.aiter_lines():
+            if line.startswith("event:"):
+                if first_event is None:
+                    first_event = time.monotonic() - started
+                event = line.split(":", 1)[1].strip()
+                if event == "error":
+                    raise RuntimeError(f"error event from {url}")
+                completed = completed or event == "complete"
+    if not completed:
+        raise RuntimeError(f"stream ended without a complete event: {url}")
+    return first_event
+
+
+async def read_agent(client: httpx.AsyncClient, assign_id: str) -> float:
+    started = time.monotonic()
+    first_chunk: Optional[float] = None
+    async with client.stream(
+        "POST", f"/courses/{COURSE_ID}/assignments/{assign_id}/agent/stream",
+        json={"messages": [{"role": "user", "content": "我的代码为什么超时了？"}]},
+        headers={"user_id": "bench"},
+    ) as response:
+        response.raise_for_status()
+        async for chunk in response.aiter_text():
+            if chunk and first_chunk is None:
+                first_chunk = time.monotonic() - started
+    if first_chunk is None:
+        raise RuntimeError("agent stream returned no content")
+    return first_chunk
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="AI 流水线基准")
+    parser.add_argument("--requests", type=int, default=40, help="每个场景的请求数")
+    parser.add_argument("--concurrency", type=int, default=8, help="每个场景同时进行的请求数")
+    parser.add_argument("--scenarios", default="resolutions,sse,agent", help="逗号分隔：resolutions, sse, agent")
+    parser.add_argument("--ttft", type=float, default=0.3, help="替身服务的首 token 延迟（秒）")
+    parser.add_argument("--ttft-jitter", type=float, default=0.1)
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="长尾请求的比例")
+    parser.add_argument("--slow-ttft", type=float, default=5.0)
+    parser.add_argument("--tps", type=float, default=100.0, help="替身服务每秒生成的 token 数")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rpm", type=int, default=0, help="调度器每分钟请求数，0 不限")
+    parser.add_argument("--tpm", type=int, default=0, help="调度器每分钟 token 数，0 不限")
+    return parser.parse_args()
+
+
+async def main():
+    args = parse_args()
+    scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+
+    standin, base_url = await start_standin(args)
+    AIProviderPool.configure([AIProvider(name="standin", base_url=base_url, model="standin", api_key="bench")])
+    AICache.ENABLED = False
+    AIGovernor.configure(rpm=args.rpm, tpm=args.tpm)
+
+    await Tortoise.init(
+        db_url="sqlite://:memory:",
+        modules={"models": ["app.models.course", "app.models.assignment", "app.models.analysis", "app.models.user", "app.models.agent"]},
+    )
+    await Tortoise.generate_schemas()
+
+    app = FastAPI()
+    app.include_router(ai_route)
+    app.include_router(agent_route)
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=0, log_level="warning", lifespan="off"))
+    serving = asyncio.ensure_future(server.serve())
+    monitor = LoopLagMonitor()
+    try:
+        while not server.started:
+            await asyncio.sleep(0.01)
+        port = server.servers[0].sockets[0].getsockname()[1]
+        assign_ids = await create_assignments(args.requests)
+        print(f"stand-in={base_url} ttft={args.ttft}s+{args.ttft_jitter}s tps={args.tps} error-rate={args.error_rate} "
+              f"requests={args.requests} concurrency={args.concurrency} governor-concurrency={AIGovernor.MAX_CONCURRENCY}")
+
+        limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=None, limits=limits) as client:
+            async def resolutions(i: int) -> None:
+                await AIAnalysisGenerator.genResolutions(assign_ids[i])
+
+            async def sse(i: int) -> float:
+                # 交替请求解法与知识点分析
+                analysis_type = "resolution" if i % 2 == 0 else "knowledge"
+                return await read_sse(
+                    client, f"/courses/{COURSE_ID}/assignments/{assign_ids[i]}/analysis/basic/stream?analysisType={analysis_type}"
+                )
+
+            async def agent(i: int) -> float:
+                return await read_agent(client, assign_ids[i])
+
+            operations = {"resolutions": resolutions, "sse": sse, "agent": agent}
+            results = []
+            for name in scenarios:
+                if name not in operations:
+                    print(f"unknown scenario: {name}")
+                    continue
+                results.append(await run_scenario(name, operations[name], args.requests, args.concurrency, monitor))
+            report(results)
+            report_prompts()
+
+            stats = (await client.get(base_url.rsplit("/v1", 1)[0] + "/stats")).json()
+            print(f"stand-in: {stats}")
+    finally:
+        server.should_exit = True
+        await serving
+        await Tortoise.close_connections()
+        await AI.close()
+        standin.terminate()
+        await standin.wait()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
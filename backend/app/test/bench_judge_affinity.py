@@ -0,0 +1,91 @@
+"""
+评测绑核基准：对比绑核与不绑核时同一程序运行耗时的波动
+
+用法：python app/test/bench_judge_affinity.py [轮数] [并发数]
+
+基准在保留核上启动忙循环进程模拟 Web 进程与 AI 流式输出的负载，然后分别在
+不绑核（进程可被调度到任意核）与绑核（每次运行独占一个评测核）两种模式下并发运行同一个
+CPU 密集程序，输出墙钟耗时的均值、标准差与变异系数。
+"""
+import asyncio, sys, os
+import statistics
+import subprocess
+import tempfile
+from pathlib import Path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+from app.models.playground import JudgeCorePool, Playground
+
+WORKLOAD = """
+#include <cstdio>
+int main() {
+    unsigned long long x = 88172645463325252ULL, s = 0;
+    for (int i = 0; i < 150000000; i++) {
+        x ^= x << 13; x ^= x >> 7; x ^= x << 17;
+        s += x & 1023;
+    }
+    printf("%llu\\n", s);
+}
+"""
+
+NOISE = "while True: pass"
+
+
+def start_noise(cores: set[int]) -> list[subprocess.Popen]:
+    """在给定核上各启动一个忙循环进程"""
+    procs = []
+    for core in sorted(cores):
+        proc = subprocess.Popen([sys.executable, "-c", NOISE])
+        if JudgeCorePool.pinning:
+            os.sched_setaffinity(proc.pid, {core})
+        procs.append(proc)
+    return procs
+
+
+async def measure(run_cmd: list[str], cwd: Path, rounds: int, concurrency: int) -> list[float]:
+    times: list[float] = []
+    for _ in range(rounds):
+        results = await asyncio.gather(*[Playground.execute(run_cmd, cwd=cwd, timeout=60) for _ in range(concurrency)])
+        times.extend(r.timeMs for r in results)
+    return times
+
+
+def report(name: str, times: list[float]) -> None:
+    mean = statistics.mean(times)
+    stdev = statistics.stdev(times) if len(times) > 1 else 0.0
+    print(f"{name:<10} runs={len(times):<4} mean={mean:8.1f}ms stdev={stdev:7.1f}ms cv={stdev / mean:6.2%}")
+
+
+async def main():
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else max(1, len(JudgeCorePool.cores))
+
+    with tempfile.TemporaryDirectory(prefix="bench_affinity_") as tmpdir:
+        tmp = Path(tmpdir)
+        exe_path, compile_error = await Playground.compile_code(WORKLOAD, tmp)
+        if compile_error:
+            print(compile_error)
+            return
+        # 只比较调度的影响，不经过 firejail
+        run_cmd = Playground._build_run_cmd(tmp, exe_path, False)
+
+        judge_cores = set(JudgeCorePool.cores)
+        reserved = set(JudgeCorePool.reserved)
+        print(f"judge cores={sorted(judge_cores)} reserved={sorted(reserved)} concurrency={concurrency}")
+        noise = start_noise(reserved)
+        try:
+            # 不绑核：运行可以落到任意核上，包括被占满的保留核
+            JudgeCorePool.configure(cores=judge_cores | reserved, reserved=set())
+            JudgeCorePool.pinning = False
+            report("unpinned", await measure(run_cmd, tmp, rounds, concurrency))
+
+            JudgeCorePool.configure(cores=judge_cores, reserved=reserved)
+            JudgeCorePool.pinning = hasattr(os, "sched_setaffinity")
+            report("pinned", await measure(run_cmd, tmp, rounds, concurrency))
+        finally:
+            for proc in noise:
+                proc.kill()
+                proc.wait()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
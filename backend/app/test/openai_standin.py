@@ -0,0 +1,245 @@
+"""
+离线的 OpenAI 兼容替身服务：实现 chat completions 接口（含流式），按配置模拟首 token 延迟、生成速度、错误率与固定回复
+
+用法：python app/test/openai_standin.py [--port 端口] [--ttft 秒] [--tps 每秒 token 数] [--error-rate 比例] [--canned 回复.json]
+
+启动后第一行输出 "listening <base_url>"，将 OPENAI_BASE_URL 指向该地址即可在没有真实模型服务的情况下运行后端。
+--canned 指定的 JSON 对象以正则表达式为键、回复为值，优先于内置回复匹配最后一条消息。
+GET /stats 返回请求数、错误数与最大并发等统计。
+"""
+import asyncio
+import argparse
+import json
+import random
+import re
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Optional, Union
+
+from aiohttp import web
+
+# 回复可以是固定文本，也可以由匹配结果生成
+Reply = Union[str, Callable[["re.Match[str]"], str]]
+
+_CJK = "\u3000-\u303f\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uff00-\uffef"
+# 近似的分词：中日韩文字 1 字 1 token，其余约 4 个字符 1 token
+_TOKEN = re.compile(rf"[{_CJK}]|[^{_CJK}]{{1,4}}")
+
+RESOLUTIONS = "\n---\n".join(
+    f"```cpp\n#include <cstdio>\n\nint main() {{\n    // 解法 {i}\n    int a, b;\n    scanf(\"%d %d\", &a, &b);\n    printf(\"%d\\n\", a + b);\n    return 0;\n}}\n```"
+    for i in range(1, 4)
+)
+KNOWLEDGE = "\n---\n".join(
+    f"知识点 {i}：本题需要掌握标准输入输出与整数运算，注意数据范围可能超出 int，必要时使用 long long。"
+    for i in range(1, 4)
+)
+DEFAULT_REPLY = (
+    "这段代码整体思路清晰，读入数据后直接计算并输出结果。\n\n"
+    "可以改进的地方：变量命名可以更有意义，边界情况（如空输入、溢出）需要额外处理。\n\n"
+    "建议先写出暴力解法验证正确性，再逐步优化时间复杂度。"
+)
+
+
+def _titles(match: "re.Match[str]") -> str:
+    return json.dumps([f"标题{i + 1}" for i in range(int(match.group(1)))], ensure_ascii=False)
+
+
+# 按提示词的特征选择回复，与 app/constants/prompt.py 中的提示词对应
+BUILTIN_REPLIES: list[tuple[str, Reply]] = [
+    (r"恰好 (\d+) 个标题", _titles),
+    (r"给出其时间复杂度和空间复杂度", "O(n)\nO(1)"),
+    (r"可能解法代码", RESOLUTIONS),
+    (r"可能涉及的知识点", KNOWLEDGE),
+    (r"使用 2~6 个字概括", "模拟求和"),
+]
+
+
+def split_tokens(text: str) -> list[str]:
+    return _TOKEN.findall(text)
+
+
+@dataclass
+class StandInConfig:
+    # 首 token 延迟（秒），在 [ttft, ttft + ttft_jitter] 内均匀分布
+    ttft: float = 0.3
+    ttft_jitter: float = 0.0
+    # 以 slow_rate 的概率首 token 延迟变为 slow_ttft，模拟长尾
+    slow_rate: float = 0.0
+    slow_ttft: float = 5.0
+    # 每秒生成的 token 数，0 表示不限速
+    tokens_per_second: float = 50.0
+    # 流式输出每块包含的 token 数
+    chunk_tokens: int = 1
+    error_rate: float = 0.0
+    error_status: int = 500
+    canned: list[tuple[str, Reply]] = field(default_factory=list)
+    default_reply: str = DEFAULT_REPLY
+    seed: Optional[int] = None
+
+
+class OpenAIStandIn:
+    """替身服务本体，可在测试与基准中直接启动：async with OpenAIStandIn(config) as standin: ..."""
+
+    def __init__(self, config: Optional[StandInConfig] = None, host: str = "127.0.0.1", port: int = 0) -> None:
+        self.config = config or StandInConfig()
+        self.host = host
+        self.port = port
+        self.random = random.Random(self.config.seed)
+        self.stats = {"requests": 0, "streams": 0, "errors": 0, "inFlight": 0, "maxInFlight": 0, "completionTokens": 0}
+        self.app = web.Application()
+        self.app.router.add_post("/v1/chat/completions", self.chat)
+        self.app.router.add_get("/v1/models", self.models)
+        self.app.router.add_get("/stats", self.get_stats)
+        self._runner: Optional[web.AppRunner] = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}/v1"
+
+    async def start(self) -> str:
+        self._runner = web.AppRunner(self.app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        # 端口为 0 时由系统分配
+        self.port = self._runner.addresses[0][1]
+        return self.base_url
+
+    async def close(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def __aenter__(self) -> "OpenAIStandIn":
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.close()
+
+    def reply(self, messages: list[dict]) -> str:
+        """按最后一条消息匹配回复：先匹配 canned，再匹配内置回复"""
+        prompt = str(messages[-1].get("content") or "") if messages else ""
+        for pattern, reply in [*self.config.canned, *BUILTIN_REPLIES]:
+            match = re.search(pattern, prompt)
+            if match:
+                return reply(match) if callable(reply) else reply
+        return self.config.default_reply
+
+    def _ttft(self) -> float:
+        config = self.config
+        if config.slow_rate and self.random.random() < config.slow_rate:
+            return config.slow_ttft
+        return config.ttft + self.random.uniform(0, config.ttft_jitter)
+
+    async def chat(self, request: web.Request) -> web.StreamResponse:
+        body = await request.json()
+        self.stats["requests"] += 1
+        self.stats["inFlight"] += 1
+        self.stats["maxInFlight"] = max(self.stats["maxInFlight"], self.stats["inFlight"])
+        try:
+            if self.config.error_rate and self.random.random() < self.config.error_rate:
+                self.stats["errors"] += 1
+                return web.json_response(
+                    {"error": {"message": "stand-in injected error", "type": "server_error"}},
+                    status=self.config.error_status,
+                )
+
+            tokens = split_tokens(self.reply(body.get("messages") or []))
+            max_tokens = body.get("max_tokens")
+            if max_tokens:
+                tokens = tokens[:max_tokens]
+            self.stats["completionTokens"] += len(tokens)
+            if body.get("stream"):
+                self.stats["streams"] += 1
+                return await self._stream(request, body, tokens)
+
+            tps = self.config.tokens_per_second
+            await asyncio.sleep(self._ttft() + (len(tokens) / tps if tps > 0 else 0))
+            prompt_tokens = sum(len(split_tokens(str(m.get("content") or ""))) for m in body.get("messages") or [])
+            return web.json_response({
+                "id": "chatcmpl-standin", "object": "chat.completion", "created": int(time.time()), "model": body.get("model"),
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": "".join(tokens)}, "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": len(tokens), "total_tokens": prompt_tokens + len(tokens)},
+            })
+        finally:
+            self.stats["inFlight"] -= 1
+
+    async def _stream(self, request: web.Request, body: dict, tokens: list[str]) -> web.StreamResponse:
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream", "Cache-Control": "no-cache"})
+        await response.prepare(request)
+
+        def chunk(delta: dict, finish_reason: Optional[str] = None) -> bytes:
+            data = {
+                "id": "chatcmpl-standin", "object": "chat.completion.chunk", "created": int(time.time()), "model": body.get("model"),
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            }
+            return f"data: {json.dumps(data, ensure_ascii=False)}\n\n".encode()
+
+        await asyncio.sleep(self._ttft())
+        # 按目标时刻发送而不是每块固定休眠，避免休眠误差累积
+        started = time.monotonic()
+        tps = self.config.tokens_per_second
+        step = max(1, self.config.chunk_tokens)
+        for i in range(0, len(tokens), step):
+            if tps > 0:
+                delay = started + i / tps - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            await response.write(chunk({"content": "".join(tokens[i:i + step])}))
+        await response.write(chunk({}, "stop"))
+        await response.write(b"data: [DONE]\n\n")
+        return response
+
+    async def models(self, request: web.Request) -> web.Response:
+        return web.json_response({"object": "list", "data": [{"id": "standin", "object": "model", "owned_by": "standin"}]})
+
+    async def get_stats(self, request: web.Request) -> web.Response:
+        return web.json_response(self.stats)
+
+
+def parse_args(argv: Optional[list[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="OpenAI 兼容的离线替身服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=0, help="0 表示由系统分配")
+    parser.add_argument("--ttft", type=float, default=0.3, help="首 token 延迟（秒）")
+    parser.add_argument("--ttft-jitter", type=float, default=0.0, help="首 token 延迟的随机增量上限（秒）")
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="长尾请求的比例")
+    parser.add_argument("--slow-ttft", type=float, default=5.0, help="长尾请求的首 token 延迟（秒）")
+    parser.add_argument("--tps", type=float, default=50.0, help="每秒生成的 token 数，0 表示不限速")
+    parser.add_argument("--chunk-tokens", type=int, default=1, help="流式输出每块的 token 数")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="返回错误的请求比例")
+    parser.add_argument("--error-status", type=int, default=500)
+    parser.add_argument("--canned", help="JSON 文件：{正则表达式: 回复}")
+    parser.add_argument("--seed", type=int)
+    return parser.parse_args(argv)
+
+
+def config_from_args(args: argparse.Namespace) -> StandInConfig:
+    canned: list[tuple[str, Reply]] = []
+    if args.canned:
+        with open(args.canned, encoding="utf-8") as f:
+            canned = list(json.load(f).items())
+    return StandInConfig(
+        ttft=args.ttft, ttft_jitter=args.ttft_jitter, slow_rate=args.slow_rate, slow_ttft=args.slow_ttft,
+        tokens_per_second=args.tps, chunk_tokens=args.chunk_tokens,
+        error_rate=args.error_rate, error_status=args.error_status, canned=canned, seed=args.seed,
+    )
+
+
+async def main():
+    args = parse_args()
+    standin = OpenAIStandIn(config_from_args(args), args.host, args.port)
+    await standin.start()
+    print(f"listening {standin.base_url}", flush=True)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await standin.close()
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
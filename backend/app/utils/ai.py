@@ -1,10 +1,281 @@
-def code_md_wrapper(code: str) -> str:
-    """将代码块格式化为带有语言标记的Markdown格式"""
-    import re
+import re
+import json
+import asyncio
+from typing import Any, AsyncIterable, AsyncIterator, Awaitable, Callable, Generic, Iterable, Optional, TypeVar
 
-    # 移除原有的代码块标记
+from app.schemas.assignment import Complexity
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+def code_md_strip(code: str) -> str:
+    """移除代码外层的 Markdown 代码块标记，得到可直接编译的源码"""
     # 匹配 ```语言 开始和 ``` 结束的代码块
     cleaned_code = re.sub(r'^```[\w]*\n?', '', code.strip())
     cleaned_code = re.sub(r'\n?```$', '', cleaned_code)
+    return cleaned_code
+
+
+def code_md_wrapper(code: str) -> str:
+    """将代码块格式化为带有语言标记的Markdown格式"""
+    # 移除原有的代码块标记
+    cleaned_code = code_md_strip(code)
 
     return f"```cpp\n{cleaned_code}\n```"
+
+
+def parse_complexity(complexity_text: str) -> Complexity:
+    """解析 AI 按两行给出的时间/空间复杂度，缺失时使用默认值"""
+    lines = [line for line in complexity_text.strip().split("\n") if line.strip()]
+    time_complexity = lines[0].split(":")[-1].strip() if lines else "O(n)"
+    space_complexity = lines[1].split(":")[-1].strip() if len(lines) > 1 else "O(1)"
+    return Complexity(time=time_complexity, space=space_complexity)
+
+
+
+def parse_titles(titles_text: str, expected: int) -> Optional[list[str]]:
+    """解析 AI 以 JSON 数组给出的批量标题，数量不符或格式不合法时返回 None"""
+    text = code_md_strip(titles_text)
+    start, end = text.find("["), text.rfind("]")
+    if start == -1 or end < start:
+        return None
+    try:
+        titles = json.loads(text[start:end + 1])
+    except json.JSONDecodeError:
+        return None
+    if not isinstance(titles, list) or len(titles) != expected:
+        return None
+    if not all(isinstance(t, str) and t.strip() for t in titles):
+        return None
+    return [t.strip() for t in titles]
+
+async def as_completed_bounded(aws: Iterable[Awaitable[T]], limit: int) -> AsyncIterator[tuple[int, T]]:
+    """
+    并发执行一组可等待对象，同一时刻最多 limit 个在执行，按完成先后产出 (下标, 结果)
+
+    任一项出错时取消其余未完成的项并抛出该异常；提前停止迭代时同样会取消剩余项
+    """
+    semaphore = asyncio.Semaphore(max(1, limit))
+
+    async def _bounded(index: int, aw: Awaitable[T]) -> tuple[int, T]:
+        async with semaphore:
+            return index, await aw
+
+    aws = list(aws)
+    tasks = [asyncio.ensure_future(_bounded(i, aw)) for i, aw in enumerate(aws)]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        for task in tasks:
+            task.cancel()
+        # 等待被取消的任务真正结束，避免遗留未取回的异常
+        await asyncio.gather(*tasks, return_exceptions=True)
+        # 取消时尚未开始执行的协程需要显式关闭
+        for aw in aws:
+            if asyncio.iscoroutine(aw):
+                aw.close()
+
+
+async def gather_bounded(aws: Iterable[Awaitable[T]], limit: int) -> list[T]:
+    """并发执行一组可等待对象，同一时刻最多 limit 个在执行，结果按传入顺序返回"""
+    aws = list(aws)
+    results: list = [None] * len(aws)
+    async for index, result in as_completed_bounded(aws, limit):
+        results[index] = result
+    return results
+
+
+async def coalesce_chunks(
+    chunks: AsyncIterable[str], interval: float, max_bytes: int, stats: Optional[dict] = None
+) -> AsyncIterator[str]:
+    """
+    合并流式输出的小块：缓冲区满 max_bytes 字节或距缓冲的第一块超过 interval 秒时产出一次
+
+    上游停顿时也会按时产出已缓冲的内容，延迟不超过 interval；interval 不大于 0 时逐块产出。
+    传入 stats 时累计 chunks（输入块数）、frames（产出次数）与 bytes（字节数）
+    """
+    if stats is None:
+        stats = {}
+    for field in ("chunks", "frames", "bytes"):
+        stats.setdefault(field, 0)
+
+    loop = asyncio.get_running_loop()
+    iterator = chunks.__aiter__()
+    buffer: list[str] = []
+    size = 0
+    deadline: Optional[float] = None
+    # 读取下一块的任务跨越多次等待，超时只推送缓冲区而不取消读取
+    pending: Optional[asyncio.Future] = None
+
+    def flush() -> str:
+        nonlocal size, deadline
+        text = "".join(buffer)
+        buffer.clear()
+        size, deadline = 0, None
+        stats["frames"] += 1
+        return text
+
+    try:
+        while True:
+            if pending is None:
+                pending = asyncio.ensure_future(iterator.__anext__())
+            timeout = None if deadline is None else max(0.0, deadline - loop.time())
+            done, _ = await asyncio.wait({pending}, timeout=timeout)
+            if not done:
+                yield flush()
+                continue
+
+            task, pending = pending, None
+            try:
+                chunk = task.result()
+            except StopAsyncIteration:
+                break
+            if not chunk:
+                continue
+
+            encoded = len(chunk.encode("utf-8"))
+            stats["chunks"] += 1
+            stats["bytes"] += encoded
+            buffer.append(chunk)
+            size += encoded
+            if interval <= 0 or size >= max_bytes:
+                yield flush()
+            elif deadline is None:
+                deadline = loop.time() + interval
+
+        if buffer:
+            yield flush()
+    finally:
+        if pending is not None:
+            pending.cancel()
+            await asyncio.gather(pending, return_exceptions=True)
+        aclose = getattr(iterator, "aclose", None)
+        if aclose is not None:
+            await aclose()
+
+
+class SectionSplitter:
+    """增量切分流式输出：每收到一段文本返回其中已完整的小节，结果与整体 split(separator) 后去掉空白段一致"""
+
+    def __init__(self, separator: str = "---") -> None:
+        self.separator = separator
+        self._buffer = ""
+
+    def feed(self, text: str) -> list[str]:
+        # 分隔符可能跨两次输入，只需从上次缓冲的末尾往前 len(separator) - 1 个字符开始查找
+        start = max(0, len(self._buffer) - len(self.separator) + 1)
+        self._buffer += text
+        sections = []
+        while (index := self._buffer.find(self.separator, start)) != -1:
+            section = self._buffer[:index].strip()
+            if section:
+                sections.append(section)
+            self._buffer = self._buffer[index + len(self.separator):]
+            start = 0
+        return sections
+
+    def flush(self) -> list[str]:
+        """输出结束，返回最后一个小节（若非空）"""
+        section, self._buffer = self._buffer.strip(), ""
+        return [section] if section else []
+
+
+class MicroBatcher(Generic[T, R]):
+    """
+    合并陆续到达的同类请求：没有批次在处理时立即处理，处理期间到达的请求排队，上一批结束后合并成一批
+
+    process 接收一批输入，按顺序返回等长的结果列表；出错时该批的每个请求都抛出该异常
+    """
+
+    def __init__(self, process: Callable[[list[T]], Awaitable[list[R]]]) -> None:
+        self._process = process
+        self._pending: list[tuple[T, asyncio.Future]] = []
+        self._lock = asyncio.Lock()
+
+    async def submit(self, item: T) -> R:
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((item, future))
+        try:
+            async with self._lock:
+                if not future.done():
+                    # 让同一轮事件循环中一起到达的请求也进入本批
+                    await asyncio.sleep(0)
+                    batch, self._pending = self._pending, []
+                    await self._run(batch, future)
+        except asyncio.CancelledError:
+            self._pending = [(i, f) for i, f in self._pending if f is not future]
+            raise
+        return future.result()
+
+    async def _run(self, batch: list[tuple[T, asyncio.Future]], own: asyncio.Future) -> None:
+        try:
+            results = await self._process([item for item, _ in batch])
+        except asyncio.CancelledError:
+            # 由被取消的请求代为处理的其它请求放回队首，由下一个拿到锁的请求重新处理
+            self._pending[:0] = [(item, f) for item, f in batch if f is not own and not f.done()]
+            raise
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+
+async def pipeline_sections(
+    chunks: AsyncIterable[str], process: Callable[[int, str], Awaitable[T]], separator: str = "---"
+) -> AsyncIterator[tuple[str, Any]]:
+    """
+    边接收流式输出边切分小节，每个小节完整后立即开始 process(下标, 小节)，与后续输出并行
+
+    按发生先后产出 ("chunk", 文本)、("total", 小节总数) 与 ("section", (下标, 结果))，"total" 在输出结束时产出一次；
+    process 需自行限制并发。任一小节处理出错时取消其余处理并抛出该异常，提前停止迭代时同样取消
+    """
+    splitter = SectionSplitter(separator)
+    iterator = chunks.__aiter__()
+    pending: Optional[asyncio.Future] = asyncio.ensure_future(iterator.__anext__())
+    tasks: dict[asyncio.Future, int] = {}
+    count = 0
+
+    def start_sections(sections: list[str]) -> None:
+        nonlocal count
+        for section in sections:
+            tasks[asyncio.ensure_future(process(count, section))] = count
+            count += 1
+
+    try:
+        while pending is not None or tasks:
+            waiting = set(tasks)
+            if pending is not None:
+                waiting.add(pending)
+            done, _ = await asyncio.wait(waiting, return_when=asyncio.FIRST_COMPLETED)
+
+            if pending in done:
+                task, pending = pending, None
+                try:
+                    chunk = task.result()
+                except StopAsyncIteration:
+                    start_sections(splitter.flush())
+                    yield "total", count
+                else:
+                    # 先启动新完成小节的处理，再推送文本
+                    start_sections(splitter.feed(chunk))
+                    pending = asyncio.ensure_future(iterator.__anext__())
+                    yield "chunk", chunk
+
+            for task in done:
+                index = tasks.pop(task, None)
+                if index is not None:
+                    yield "section", (index, task.result())
+    finally:
+        leftovers = [*tasks] + ([pending] if pending is not None else [])
+        for task in leftovers:
+            task.cancel()
+        await asyncio.gather(*leftovers, return_exceptions=True)
+        aclose = getattr(iterator, "aclose", None)
+        if aclose is not None:
+            await aclose()
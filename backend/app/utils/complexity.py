@@ -0,0 +1,74 @@
+import math
+from typing import Callable, Optional
+
+# 候选增长阶，按从简单到复杂排列，拟合结果相近时优先取更简单的
+GROWTH_CLASSES: list[tuple[str, Callable[[float], float]]] = [
+    ("O(1)", lambda n: 1.0),
+    ("O(log n)", lambda n: math.log2(n)),
+    ("O(n)", lambda n: n),
+    ("O(n log n)", lambda n: n * math.log2(n)),
+    ("O(n^2)", lambda n: n ** 2),
+    ("O(n^3)", lambda n: n ** 3),
+    ("O(2^n)", lambda n: 2.0 ** n),
+]
+
+# 残差在最优值该倍数以内时视为同样合适，取更简单的增长阶
+TIE_TOLERANCE = 1.1
+
+
+def _linear_fit_rss(xs: list[float], ys: list[float]) -> float:
+    """对 y = a + b·x（b >= 0）做最小二乘拟合，返回残差平方和"""
+    n = len(xs)
+    mean_x = sum(xs) / n
+    mean_y = sum(ys) / n
+    var_x = sum((x - mean_x) ** 2 for x in xs)
+    if var_x == 0:
+        return sum((y - mean_y) ** 2 for y in ys)
+    b = sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys)) / var_x
+    # 资源占用不会随规模增大而减少，负斜率退化为常数拟合
+    b = max(b, 0.0)
+    a = mean_y - b * mean_x
+    return sum((y - (a + b * x)) ** 2 for x, y in zip(xs, ys))
+
+
+def fit_growth(sizes: list[int], values: list[float], noise_floor: float = 0.0) -> Optional[str]:
+    """
+    将实测数据拟合到标准增长阶
+
+    Args:
+        sizes: 输入规模
+        values: 对应规模下的实测值（耗时或内存）
+        noise_floor: 测量噪声下限，实测值整体波动小于该值时直接视为常数阶
+
+    Returns:
+        增长阶字符串，例如 "O(n log n)"；数据点不足时返回 None
+    """
+    points = [(n, v) for n, v in zip(sizes, values) if n > 1 and v is not None]
+    if len(points) < 3:
+        return None
+    ns = [float(n) for n, _ in points]
+    vs = [float(v) for _, v in points]
+
+    if max(vs) - min(vs) <= noise_floor:
+        return "O(1)"
+
+    # 统一缩放到 [0, 1]，避免 n^3、2^n 等数值过大影响精度
+    scale = max(vs) or 1.0
+    vs = [v / scale for v in vs]
+
+    fits: list[tuple[str, float]] = []
+    for name, f in GROWTH_CLASSES:
+        try:
+            xs = [f(n) for n in ns]
+        except OverflowError:
+            continue
+        if any(math.isinf(x) for x in xs):
+            continue
+        top = max(xs) or 1.0
+        fits.append((name, _linear_fit_rss([x / top for x in xs], vs)))
+
+    best_rss = min(rss for _, rss in fits)
+    for name, rss in fits:
+        if rss <= best_rss * TIE_TOLERANCE + 1e-12:
+            return name
+    return None
@@ -0,0 +1,54 @@
+import os
+import asyncio
+import weakref
+
+import httpx
+
+
+def pool_limits(prefix: str, max_connections: int = 20, max_keepalive: int = 10, keepalive_expiry: float = 30.0) -> httpx.Limits:
+    """按环境变量 `<prefix>_MAX_CONNECTIONS` 等构建连接池大小"""
+    return httpx.Limits(
+        max_connections=int(os.getenv(f"{prefix}_MAX_CONNECTIONS", str(max_connections))),
+        max_keepalive_connections=int(os.getenv(f"{prefix}_MAX_KEEPALIVE", str(max_keepalive))),
+        keepalive_expiry=float(os.getenv(f"{prefix}_KEEPALIVE_EXPIRY", str(keepalive_expiry))),
+    )
+
+
+def timeouts(prefix: str, connect: float = 5.0, read: float = 60.0, write: float = 10.0, pool: float = 10.0) -> httpx.Timeout:
+    """按环境变量 `<prefix>_CONNECT_TIMEOUT` 等构建超时配置，read 为两次收到数据之间的最长间隔"""
+    return httpx.Timeout(
+        connect=float(os.getenv(f"{prefix}_CONNECT_TIMEOUT", str(connect))),
+        read=float(os.getenv(f"{prefix}_READ_TIMEOUT", str(read))),
+        write=float(os.getenv(f"{prefix}_WRITE_TIMEOUT", str(write))),
+        pool=float(os.getenv(f"{prefix}_POOL_TIMEOUT", str(pool))),
+    )
+
+
+class LoopLocalTransport(httpx.AsyncBaseTransport):
+    """
+    每个事件循环各持有一个连接池的传输层
+
+    连接池中的连接绑定在创建它的事件循环上；主循环共享同一个池，
+    个别在线程里用 asyncio.run 启动的任务则拿到自己的池，循环结束后随之回收
+    """
+
+    def __init__(self, limits: httpx.Limits) -> None:
+        self.limits = limits
+        self._transports: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncHTTPTransport]" = weakref.WeakKeyDictionary()
+
+    def _current(self) -> httpx.AsyncHTTPTransport:
+        loop = asyncio.get_running_loop()
+        transport = self._transports.get(loop)
+        if transport is None:
+            transport = httpx.AsyncHTTPTransport(limits=self.limits)
+            self._transports[loop] = transport
+        return transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        return await self._current().handle_async_request(request)
+
+    async def aclose(self) -> None:
+        loop = asyncio.get_running_loop()
+        transport = self._transports.pop(loop, None)
+        if transport is not None:
+            await transport.aclose()
@@ -0,0 +1,103 @@
+import os
+import re
+import asyncio
+import hashlib
+import logging
+from typing import Iterable
+
+try:
+    import tiktoken
+except ImportError:
+    # 可选依赖（见 requirements.txt），未安装时使用启发式估算
+    tiktoken = None
+
+
+# 中日韩文字与全角符号，大多数分词器中约 1 字 1 token
+_CJK = re.compile(r"[\u3000-\u303f\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uff00-\uffef]")
+# 每条消息的角色与分隔符开销
+MESSAGE_OVERHEAD = 4
+# 回复起始标记的开销
+REPLY_OVERHEAD = 2
+# tiktoken 编码表的下载地址，本地缓存文件名为其 sha1
+_TIKTOKEN_BLOB = "https://openaipublic.blob.core.windows.net/encodings/{}.tiktoken"
+
+# 已加载的编码表（None 表示不可用）。只在 load_encoding 中于线程里加载，事件循环上从不读取或下载编码表
+_encodings: dict[str, object] = {}
+
+
+def _encoding(model: str):
+    """取已加载的编码表；未加载或不可用时返回 None，按启发式估算"""
+    return _encodings.get(model)
+
+
+def _cached_table(name: str) -> bool:
+    """编码表是否已缓存在 TIKTOKEN_CACHE_DIR 中；未缓存时 tiktoken 会同步联网下载，离线环境会卡住"""
+    cache_dir = os.getenv("TIKTOKEN_CACHE_DIR")
+    if not cache_dir:
+        return False
+    key = hashlib.sha1(_TIKTOKEN_BLOB.format(name).encode()).hexdigest()
+    return os.path.isfile(os.path.join(cache_dir, key))
+
+
+def _load(model: str):
+    """加载模型对应的编码表，非 OpenAI 模型按 cl100k_base 近似；不可用时返回 None"""
+    if tiktoken is None:
+        return None
+    try:
+        try:
+            name = tiktoken.encoding_name_for_model(model)
+        except KeyError:
+            name = "cl100k_base"
+        if not _cached_table(name):
+            logging.warning(f"Tokenizer table {name} not cached in TIKTOKEN_CACHE_DIR, using heuristic estimate")
+            return None
+        return tiktoken.get_encoding(name)
+    except Exception as e:
+        logging.warning(f"Tokenizer for {model} unavailable, using heuristic estimate: {e}")
+        return None
+
+
+async def load_encoding(model: str) -> bool:
+    """在线程中加载模型的编码表（启动时调用），之后 count_tokens 才按分词器计数；返回是否可用"""
+    if model not in _encodings:
+        _encodings[model] = await asyncio.to_thread(_load, model)
+    return _encodings[model] is not None
+
+
+def count_tokens(text: str, model: str) -> int:
+    """估算文本的 token 数"""
+    if not text:
+        return 0
+    encoding = _encoding(model)
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    cjk = len(_CJK.findall(text))
+    # 其余字符（英文、代码、空白）约 4 个字符 1 个 token
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def count_message_tokens(messages: Iterable[dict], model: str) -> int:
+    """估算一组对话消息作为输入时的 token 数"""
+    return sum(
+        count_tokens(str(m.get("content") or ""), model) + MESSAGE_OVERHEAD
+        for m in messages
+    ) + REPLY_OVERHEAD
+
+
+def truncate_tokens(text: str, max_tokens: int, model: str, keep_tail: bool = False) -> str:
+    """截断文本使其不超过 max_tokens，默认保留开头，keep_tail 时保留结尾"""
+    if count_tokens(text, model) <= max_tokens:
+        return text
+    if max_tokens <= 0:
+        return ""
+    # 按字符数二分，找到不超出预算的最长前缀/后缀
+    low, high = 0, len(text)
+    while low < high:
+        mid = (low + high + 1) // 2
+        part = text[-mid:] if keep_tail else text[:mid]
+        if count_tokens(part, model) <= max_tokens:
+            low = mid
+        else:
+            high = mid - 1
+    return text[-low:] if keep_tail and low else text[:low]
+
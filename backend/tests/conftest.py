@@ -0,0 +1,52 @@
+import sys
+from pathlib import Path
+
+import pytest
+import pytest_asyncio
+from tortoise import Tortoise
+
+
+BACKEND_ROOT = Path(__file__).resolve().parents[1]
+if str(BACKEND_ROOT) not in sys.path:
+    sys.path.insert(0, str(BACKEND_ROOT))
+
+
+from app.models.ai_cache import AICache  # noqa: E402
+
+
+def pytest_addoption(parser):
+    parser.addoption("--runslow", action="store_true", default=False, help="运行依赖计时的慢测试")
+
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "slow: 依赖计时、在共享 CPU 上可能不稳定的慢测试，需加 --runslow 运行")
+
+
+def pytest_collection_modifyitems(config, items):
+    if config.getoption("--runslow"):
+        return
+    skip_slow = pytest.mark.skip(reason="需加 --runslow 运行")
+    for item in items:
+        if "slow" in item.keywords:
+            item.add_marker(skip_slow)
+
+
+@pytest.fixture(autouse=True)
+def isolated_ai_cache(monkeypatch, tmp_path):
+    # 每个测试使用独立的 AI 响应缓存，避免跨测试/跨运行命中
+    monkeypatch.setattr(AICache, "CACHE_DIR", tmp_path / "ai-cache")
+    AICache.clear()
+    yield
+    AICache.clear()
+
+
+@pytest_asyncio.fixture
+async def db():
+    # 内存 SQLite，测试结束后丢弃
+    await Tortoise.init(
+        db_url="sqlite://:memory:",
+        modules={"models": ["app.models.course", "app.models.assignment", "app.models.analysis", "app.models.user", "app.models.agent"]},
+    )
+    await Tortoise.generate_schemas()
+    yield
+    await Tortoise.close_connections()
@@ -101,7 +101,7 @@ async def test_get_conversation_filters_by_assignment_id(monkeypatch):
 async def test_request_ai_from_event_stream_supports_persisted_dict_events(monkeypatch):
     captured: dict[str, object] = {}
 
-    async def fake_stream(messages):
+    async def fake_stream(messages, **kwargs):
         captured["messages"] = messages
         yield "ok"
 
@@ -354,6 +354,23 @@ def test_agent_router_supports_get_checkpoint(monkeypatch):
     )
 
 
+class FakeStream:
+    """模拟 AsyncOpenAI 返回的流式响应"""
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def __aiter__(self):
+        for chunk in self.chunks:
+            yield chunk
+
+
 @pytest.mark.asyncio
 async def test_ai_get_response_stream_accepts_message_list(monkeypatch):
     captured: dict[str, object] = {}
@@ -367,9 +384,9 @@ async def test_ai_get_response_stream_accepts_message_list(monkeypatch):
     class FakeChunk:
         choices = [FakeChoice()]
 
-    def fake_create(**kwargs):
+    async def fake_create(**kwargs):
         captured["messages"] = kwargs["messages"]
-        return [FakeChunk()]
+        return FakeStream([FakeChunk()])
 
     monkeypatch.setattr(AI.client.chat.completions, "create", fake_create)
 
@@ -400,8 +417,8 @@ async def test_ai_get_response_stream_skips_chunks_without_choices(monkeypatch):
     class ValidChunk:
         choices = [FakeChoice()]
 
-    def fake_create(**kwargs):
-        return [EmptyChunk(), ValidChunk()]
+    async def fake_create(**kwargs):
+        return FakeStream([EmptyChunk(), ValidChunk()])
 
     monkeypatch.setattr(AI.client.chat.completions, "create", fake_create)
 
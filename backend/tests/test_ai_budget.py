@@ -0,0 +1,170 @@
+import hashlib
+import json
+import sys
+import threading
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+import httpx
+import pytest
+from openai import AsyncOpenAI
+
+
+BACKEND_ROOT = Path(__file__).resolve().parents[1]
+if str(BACKEND_ROOT) not in sys.path:
+    sys.path.insert(0, str(BACKEND_ROOT))
+
+
+from app.models.ai import AI  # noqa: E402
+from app.models.ai_provider import AIProviderPool  # noqa: E402
+from app.models.ai_budget import AIBudget, AIPromptType, PromptBudget  # noqa: E402
+from app.utils import tokens  # noqa: E402
+from app.utils.tokens import count_tokens, load_encoding, truncate_tokens  # noqa: E402
+
+
+LOADED_ENCODING = tokens._encoding
+
+
+@pytest.fixture(autouse=True)
+def heuristic_tokens(monkeypatch):
+    # 固定使用启发式估算，结果不依赖是否安装了 tiktoken
+    monkeypatch.setattr(tokens, "_encoding", lambda model: None)
+
+
+@pytest.fixture
+def captured(monkeypatch):
+    requests: list[dict] = []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        body = json.loads(request.content)
+        requests.append(body)
+        return httpx.Response(200, json={
+            "id": "chatcmpl-test",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": "test",
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": "ok"}, "finish_reason": "stop"}],
+        })
+
+    client = AsyncOpenAI(api_key="test", base_url="http://llm.test/v1", http_client=httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+    monkeypatch.setattr(AIProviderPool.primary(), "client", client)
+    return requests
+
+
+def test_heuristic_counts_cjk_per_character():
+    assert count_tokens("动态规划", "m") == 4
+    assert count_tokens("abcdefgh", "m") == 2
+    assert truncate_tokens("一二三四五六", 3, "m") == "一二三"
+    assert truncate_tokens("一二三四五六", 3, "m", keep_tail=True) == "四五六"
+
+
+def test_fit_sections_drops_oldest_first(monkeypatch):
+    monkeypatch.setitem(AIBudget.BUDGETS, AIPromptType.PROFILE, PromptBudget(25, 100))
+    sections = ["最早的提交一二三四五六七八\n", "较早的提交一二三四五六七八\n", "最新的提交一二三四五六七八\n"]
+
+    text, dropped = AIBudget.fit_sections(AIPromptType.PROFILE, lambda s: f"提示：{s}", sections, "m")
+
+    assert dropped == 2
+    assert text == sections[-1]
+
+
+def test_fit_sections_truncates_single_oversized_section(monkeypatch):
+    monkeypatch.setitem(AIBudget.BUDGETS, AIPromptType.PROFILE, PromptBudget(30, 100))
+
+    text, dropped = AIBudget.fit_sections(AIPromptType.PROFILE, lambda s: f"提示：{s}", ["代码" * 100], "m")
+
+    assert dropped == 0
+    assert text.startswith("代码代码")
+    assert count_tokens(f"提示：{text}", "m") <= 30
+
+
+def test_fit_messages_keeps_system_and_latest_turns(monkeypatch):
+    monkeypatch.setitem(AIBudget.BUDGETS, AIPromptType.AGENT, PromptBudget(40, 100))
+    messages = [
+        {"role": "system", "content": "你是助教"},
+        {"role": "user", "content": "很早的问题" * 4},
+        {"role": "tool", "content": "工具结果" * 4, "tool_call_id": "c1"},
+        {"role": "assistant", "content": "回答"},
+        {"role": "user", "content": "最新的问题"},
+    ]
+
+    fitted = AIBudget.fit_messages(AIPromptType.AGENT, messages, "m")
+
+    assert fitted[0]["role"] == "system"
+    assert fitted[-1]["content"] == "最新的问题"
+    assert all(m["role"] != "tool" for m in fitted)
+
+
+@pytest.mark.asyncio
+async def test_response_uses_per_type_output_budget(captured):
+    before = AIBudget.stats()["short"]["calls"]
+
+    await AI.get_response("为这段代码起一个标题", use_cache=False, prompt_type=AIPromptType.SHORT)
+
+    assert captured[-1]["max_tokens"] == AIBudget.output_tokens(AIPromptType.SHORT)
+    stats = AIBudget.stats()["short"]
+    assert stats["calls"] == before + 1
+    assert stats["maxPromptTokens"] > 0
+
+
+@pytest.mark.asyncio
+async def test_agent_stream_drops_oldest_turns(captured, monkeypatch):
+    monkeypatch.setitem(AIBudget.BUDGETS, AIPromptType.AGENT, PromptBudget(30, 100))
+    messages = [
+        {"role": "user", "content": "第一轮很长的问题" * 5},
+        {"role": "assistant", "content": "第一轮回答"},
+        {"role": "user", "content": "最新的问题"},
+    ]
+
+    # 这里只关心发出的请求
+    async for _ in AI.get_response_stream(messages, use_cache=False, prompt_type=AIPromptType.AGENT):
+        pass
+
+    sent = captured[-1]
+    assert sent["max_tokens"] == 100
+    assert [m["content"] for m in sent["messages"]] == ["第一轮回答", "最新的问题"]
+
+
+@pytest.fixture
+def fake_tiktoken(monkeypatch):
+    """不联网的 tiktoken 替身，记录加载编码表时所在的线程"""
+    loads = []
+
+    def encoding_name_for_model(model):
+        raise KeyError(model)
+
+    def get_encoding(name):
+        loads.append((name, threading.current_thread()))
+        return SimpleNamespace(encode=lambda text, disallowed_special=(): list(text))
+
+    monkeypatch.setattr(tokens, "tiktoken", SimpleNamespace(encoding_name_for_model=encoding_name_for_model, get_encoding=get_encoding))
+    monkeypatch.setattr(tokens, "_encodings", {})
+    monkeypatch.setattr(tokens, "_encoding", LOADED_ENCODING)
+    return loads
+
+
+@pytest.mark.asyncio
+async def test_tokenizer_is_never_downloaded(fake_tiktoken, monkeypatch, tmp_path):
+    monkeypatch.setenv("TIKTOKEN_CACHE_DIR", str(tmp_path))
+
+    assert await load_encoding("m") is False
+
+    # 编码表未缓存时不调用 tiktoken（它会同步下载），按启发式估算
+    assert fake_tiktoken == []
+    assert count_tokens("abcdefgh", "m") == 2
+
+
+@pytest.mark.asyncio
+async def test_cached_tokenizer_is_loaded_off_the_event_loop(fake_tiktoken, monkeypatch, tmp_path):
+    monkeypatch.setenv("TIKTOKEN_CACHE_DIR", str(tmp_path))
+    blob = "https://openaipublic.blob.core.windows.net/encodings/cl100k_base.tiktoken"
+    (tmp_path / hashlib.sha1(blob.encode()).hexdigest()).write_text("")
+
+    assert count_tokens("abcdefgh", "m") == 2
+    assert await load_encoding("m") is True
+
+    [(name, thread)] = fake_tiktoken
+    assert name == "cl100k_base"
+    assert thread is not threading.main_thread()
+    assert count_tokens("abcdefgh", "m") == 8
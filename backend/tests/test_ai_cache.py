@@ -0,0 +1,143 @@
+import os
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+
+BACKEND_ROOT = Path(__file__).resolve().parents[1]
+if str(BACKEND_ROOT) not in sys.path:
+    sys.path.insert(0, str(BACKEND_ROOT))
+
+
+from app.models.ai import AI  # noqa: E402
+from app.models.ai_cache import AICache  # noqa: E402
+
+
+class FakeMessage:
+    def __init__(self, content):
+        self.content = content
+
+
+class FakeChoice:
+    def __init__(self, content):
+        self.message = FakeMessage(content)
+        self.delta = FakeMessage(content)
+
+
+class FakeChunk:
+    def __init__(self, content):
+        self.choices = [FakeChoice(content)]
+
+
+class FakeStream:
+    def __init__(self, pieces):
+        self.pieces = pieces
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def __aiter__(self):
+        for piece in self.pieces:
+            yield FakeChunk(piece)
+
+
+@pytest.fixture
+def fake_llm(monkeypatch):
+    calls = []
+
+    async def fake_create(**kwargs):
+        calls.append(kwargs)
+        if kwargs.get("stream"):
+            return FakeStream(["你", "好"])
+        return type("Response", (), {"choices": [FakeChoice("回答")]})()
+
+    monkeypatch.setattr(AI.client.chat.completions, "create", fake_create)
+    return calls
+
+
+def test_key_ignores_surrounding_whitespace_but_not_params():
+    messages = [{"role": "system", "content": "题目"}]
+    padded = [{"role": "system", "content": "  题目\n"}]
+
+    assert AICache.key("m", messages, 0.7, 1000) == AICache.key("m", padded, 0.7, 1000)
+    assert AICache.key("m", messages, 0.7, 1000) != AICache.key("m", messages, 0.2, 1000)
+    assert AICache.key("m", messages, 0.7, 1000) != AICache.key("other", messages, 0.7, 1000)
+
+
+@pytest.mark.asyncio
+async def test_get_response_served_from_cache(fake_llm):
+    first = await AI.get_response("提示词")
+    second = await AI.get_response("提示词")
+
+    assert first == second == "回答"
+    assert len(fake_llm) == 1
+
+
+@pytest.mark.asyncio
+async def test_get_response_can_opt_out(fake_llm):
+    await AI.get_response("提示词")
+    await AI.get_response("提示词", use_cache=False)
+
+    assert len(fake_llm) == 2
+
+
+@pytest.mark.asyncio
+async def test_disk_tier_survives_memory_clear(fake_llm):
+    await AI.get_response("提示词")
+    AICache.clear()
+
+    assert await AI.get_response("提示词") == "回答"
+    assert len(fake_llm) == 1
+    assert AICache.stats()["diskHits"] == 1
+
+
+@pytest.mark.asyncio
+async def test_stream_replays_cached_response(fake_llm):
+    first = [chunk async for chunk in AI.get_response_stream("提示词")]
+    replayed = [chunk async for chunk in AI.get_response_stream("提示词")]
+
+    assert first == ["你", "好"]
+    assert "".join(replayed) == "你好"
+    assert len(fake_llm) == 1
+
+
+@pytest.mark.asyncio
+async def test_interrupted_stream_is_not_cached(fake_llm):
+    async for _ in AI.get_response_stream("提示词"):
+        break
+    [chunk async for chunk in AI.get_response_stream("提示词")]
+
+    assert len(fake_llm) == 2
+
+
+@pytest.mark.asyncio
+async def test_expired_entries_are_ignored(monkeypatch):
+    key = AICache.key("m", [{"role": "system", "content": "x"}], 0.7, 1000)
+    await AICache.set(key, "旧结果")
+    monkeypatch.setattr(AICache, "TTL_SECONDS", 0)
+    time.sleep(0.01)
+
+    assert await AICache.get(key) is None
+    assert not AICache._path(key).exists()
+
+
+@pytest.mark.asyncio
+async def test_memory_and_disk_are_bounded(monkeypatch):
+    monkeypatch.setattr(AICache, "MEMORY_ENTRIES", 2)
+    monkeypatch.setattr(AICache, "DISK_MAX_BYTES", 300)
+    keys = [AICache.key("m", [{"role": "system", "content": str(i)}], 0.7, 1000) for i in range(5)]
+    now = time.time()
+    for i, key in enumerate(keys):
+        await AICache.set(key, "x" * 100)
+        # 磁盘淘汰按写入时间排序
+        os.utime(AICache._path(key), (now - 10 + i, now - 10 + i))
+    AICache._evict_disk()
+
+    assert AICache.stats()["memoryEntries"] == 2
+    assert not AICache._path(keys[0]).exists()
+    assert AICache._path(keys[-1]).exists()
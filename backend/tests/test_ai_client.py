@@ -0,0 +1,96 @@
+import asyncio
+import json
+import sys
+import time
+from pathlib import Path
+
+import httpx
+import pytest
+from openai import AsyncOpenAI
+
+
+BACKEND_ROOT = Path(__file__).resolve().parents[1]
+if str(BACKEND_ROOT) not in sys.path:
+    sys.path.insert(0, str(BACKEND_ROOT))
+
+
+from app.models.ai import AI  # noqa: E402
+from app.models.ai_provider import AIProviderPool  # noqa: E402
+from app.utils.http import LoopLocalTransport  # noqa: E402
+
+
+LLM_DELAY = 0.5
+
+
+def completion_body(content: str) -> dict:
+    return {
+        "id": "chatcmpl-test",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": "test",
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+    }
+
+
+async def slow_llm(request: httpx.Request) -> httpx.Response:
+    # 模拟一次耗时较长的模型调用
+    await asyncio.sleep(LLM_DELAY)
+    return httpx.Response(200, json=completion_body(json.loads(request.content)["messages"][0]["content"]))
+
+
+@pytest.fixture
+def slow_client(monkeypatch):
+    client = AsyncOpenAI(
+        api_key="test",
+        base_url="http://llm.test/v1",
+        http_client=httpx.AsyncClient(transport=httpx.MockTransport(slow_llm)),
+    )
+    monkeypatch.setattr(AIProviderPool.primary(), "client", client)
+    return client
+
+
+@pytest.mark.asyncio
+async def test_event_loop_keeps_running_during_llm_call(slow_client):
+    ticks = 0
+
+    async def ticker():
+        nonlocal ticks
+        while True:
+            await asyncio.sleep(0.01)
+            ticks += 1
+
+    ticking = asyncio.create_task(ticker())
+    try:
+        answer = await AI.get_response("你好")
+    finally:
+        ticking.cancel()
+
+    assert answer == "你好"
+    # 同步客户端会让 ticker 在整个调用期间停摆
+    assert ticks >= 10
+
+
+@pytest.mark.asyncio
+async def test_concurrent_llm_calls_overlap(slow_client):
+    start = time.monotonic()
+
+    answers = await asyncio.gather(*[AI.get_response(f"q{i}") for i in range(5)])
+
+    assert answers == [f"q{i}" for i in range(5)]
+    assert time.monotonic() - start < LLM_DELAY * 3
+
+
+def test_loop_local_transport_uses_one_pool_per_loop():
+    transport = LoopLocalTransport(httpx.Limits(max_connections=4))
+
+    async def current():
+        return transport._current()
+
+    async def same_loop_twice():
+        return await current(), await current()
+
+    first, second = asyncio.run(same_loop_twice())
+    other = asyncio.run(current())
+
+    assert first is second
+    assert other is not first
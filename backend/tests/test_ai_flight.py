@@ -0,0 +1,253 @@
+import asyncio
+import sys
+from pathlib import Path
+
+import pytest
+
+
+BACKEND_ROOT = Path(__file__).resolve().parents[1]
+if str(BACKEND_ROOT) not in sys.path:
+    sys.path.insert(0, str(BACKEND_ROOT))
+
+
+from app.models.ai_flight import AISingleFlight, content_version  # noqa: E402
+
+
+@pytest.mark.asyncio
+async def test_concurrent_calls_share_one_generation():
+    calls = 0
+
+    async def generate():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return "analysis"
+
+    results = await asyncio.gather(*[AISingleFlight.do(("a1", "basic", "v1"), generate) for _ in range(10)])
+
+    assert results == ["analysis"] * 10
+    assert calls == 1
+    assert AISingleFlight.stats()["inFlightCalls"] == 0
+
+
+@pytest.mark.asyncio
+async def test_different_versions_are_not_merged():
+    calls = 0
+
+    async def generate():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return calls
+
+    await asyncio.gather(
+        AISingleFlight.do(("a1", "basic", content_version("old")), generate),
+        AISingleFlight.do(("a1", "basic", content_version("new")), generate),
+    )
+
+    assert calls == 2
+
+
+@pytest.mark.asyncio
+async def test_generation_survives_initiator_disconnect():
+    started = asyncio.Event()
+
+    async def generate():
+        started.set()
+        await asyncio.sleep(0.05)
+        return "done"
+
+    first = asyncio.create_task(AISingleFlight.do(("a2", "aiGen", "v"), generate))
+    await started.wait()
+    second = asyncio.create_task(AISingleFlight.do(("a2", "aiGen", "v"), generate))
+    await asyncio.sleep(0)
+    first.cancel()
+
+    assert await second == "done"
+
+
+@pytest.mark.asyncio
+async def test_late_stream_subscriber_replays_from_start():
+    calls = 0
+    release = asyncio.Event()
+
+    async def generate():
+        nonlocal calls
+        calls += 1
+        yield "event-1"
+        await release.wait()
+        yield "event-2"
+
+    async def collect():
+        return await _collect(AISingleFlight.stream(("a3", "resolution", "v"), generate))
+
+    early = asyncio.create_task(collect())
+    await asyncio.sleep(0.01)
+    late = asyncio.create_task(collect())
+    await asyncio.sleep(0.01)
+    release.set()
+
+    assert await early == ["event-1", "event-2"]
+    assert await late == ["event-1", "event-2"]
+    assert calls == 1
+
+
+@pytest.mark.asyncio
+async def test_stream_failure_is_reported_to_subscribers():
+    async def generate():
+        yield "event-1"
+        raise RuntimeError("boom")
+
+    events = await _collect(AISingleFlight.stream(("a4", "knowledge", "v"), generate))
+
+    assert events[0] == "event-1"
+    assert events[-1].startswith("event: error")
+
+
+@pytest.mark.asyncio
+async def test_stream_cancelled_when_last_subscriber_leaves(monkeypatch):
+    cancelled = asyncio.Event()
+
+    async def generate():
+        try:
+            yield "event-1"
+            await asyncio.sleep(10)
+            yield "event-2"
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    monkeypatch.setattr(AISingleFlight, "RESUME_GRACE", 0)
+    key = ("a5", "resolution", "v")
+    stream = AISingleFlight.stream(key, generate)
+    assert _body(await stream.__anext__()) == "event-1"
+    await stream.aclose()
+
+    await asyncio.wait_for(cancelled.wait(), 1)
+    assert key not in AISingleFlight._streams
+
+
+@pytest.mark.asyncio
+async def test_persisted_stream_survives_all_subscribers_leaving():
+    finished = asyncio.Event()
+
+    async def generate():
+        yield "event-1"
+        await asyncio.sleep(0.02)
+        yield "event-2"
+        finished.set()
+
+    stream = AISingleFlight.stream(("a6", "resolution", "v"), generate, persist=True)
+    assert _body(await stream.__anext__()) == "event-1"
+    await stream.aclose()
+
+    await asyncio.wait_for(finished.wait(), 1)
+
+
+@pytest.mark.asyncio
+async def test_late_subscriber_replays_bounded_buffer(monkeypatch):
+    monkeypatch.setattr(AISingleFlight, "REPLAY_EVENTS", 2)
+    release = asyncio.Event()
+
+    async def generate():
+        for i in range(4):
+            yield f"event-{i}"
+        await release.wait()
+        yield "event-4"
+
+    key = ("a7", "resolution", "v")
+    early = asyncio.create_task(_collect(AISingleFlight.stream(key, generate)))
+    await asyncio.sleep(0.01)
+    late = asyncio.create_task(_collect(AISingleFlight.stream(key, generate)))
+    await asyncio.sleep(0.01)
+    release.set()
+
+    # 已丢弃的事件无法回放，后加入的订阅者从仍保留的最早事件开始
+    assert await late == ["event-2", "event-3", "event-4"]
+    assert (await early)[-1] == "event-4"
+
+
+@pytest.mark.asyncio
+async def test_events_carry_monotonic_ids():
+    async def generate():
+        for i in range(3):
+            yield f"event-{i}"
+
+    events = [event async for event in AISingleFlight.stream(("a8", "resolution", "v"), generate)]
+
+    ids = [AISingleFlight.parse_event_id(e.split("\n", 1)[0][len("id: "):]) for e in events]
+    assert len({gen for gen, _ in ids}) == 1
+    assert [seq for _, seq in ids] == [0, 1, 2]
+
+
+@pytest.mark.asyncio
+async def test_reconnect_resumes_after_last_event_id():
+    calls = 0
+
+    async def generate():
+        nonlocal calls
+        calls += 1
+        for i in range(4):
+            yield f"event-{i}"
+
+    key = ("a9", "resolution", "v")
+    first = [event async for event in AISingleFlight.stream(key, generate)]
+    last_id = first[1].split("\n", 1)[0][len("id: "):]
+
+    assert AISingleFlight.resumable(key, last_id)
+    resumed = await _collect(AISingleFlight.stream(key, generate, last_event_id=last_id))
+
+    assert resumed == ["event-2", "event-3"]
+    assert calls == 1
+    # 其它作业不能续接这次生成
+    assert not AISingleFlight.resumable(("other", "resolution", "v"), last_id)
+
+
+@pytest.mark.asyncio
+async def test_evicted_last_event_id_is_not_resumed(monkeypatch):
+    monkeypatch.setattr(AISingleFlight, "REPLAY_EVENTS", 2)
+    calls = 0
+
+    async def generate():
+        nonlocal calls
+        calls += 1
+        for i in range(5):
+            yield f"event-{i}"
+
+    key = ("a11", "resolution", "v")
+    first = [event async for event in AISingleFlight.stream(key, generate)]
+    gen, _ = AISingleFlight.parse_event_id(first[-1].split("\n", 1)[0][len("id: "):])
+    # 缓冲区只剩 event-3、event-4，event-1 之后的 event-2 已被丢弃
+    evicted, kept = f"{gen}:1", f"{gen}:2"
+
+    assert not AISingleFlight.resumable(key, evicted)
+    assert AISingleFlight.resumable(key, kept)
+    events = [event async for event in AISingleFlight.stream(key, generate, last_event_id=evicted)]
+
+    # 不从缓冲区中间续接，而是重新发起一次生成
+    assert calls == 2
+    assert AISingleFlight.parse_event_id(events[-1].split("\n", 1)[0][len("id: "):])[0] != gen
+
+
+@pytest.mark.asyncio
+async def test_unknown_last_event_id_starts_new_generation():
+    calls = 0
+
+    async def generate():
+        nonlocal calls
+        calls += 1
+        yield "event-0"
+
+    events = await _collect(AISingleFlight.stream(("a10", "resolution", "v"), generate, last_event_id="gone:3"))
+
+    assert events == ["event-0"]
+    assert calls == 1
+
+
+def _body(event):
+    """去掉事件的 id 行"""
+    return event.split("\n", 1)[1] if event.startswith("id: ") else event
+
+
+async def _collect(stream):
+    return [_body(event) async for event in stream]
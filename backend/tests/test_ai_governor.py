@@ -0,0 +1,94 @@
+import asyncio
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+
+
+BACKEND_ROOT = Path(__file__).resolve().parents[1]
+if str(BACKEND_ROOT) not in sys.path:
+    sys.path.insert(0, str(BACKEND_ROOT))
+
+
+from app.models.ai_governor import AIGovernor, AIGovernorTimeout, AIPriority  # noqa: E402
+
+
+@pytest.fixture
+def governor():
+    original = AIGovernor.MAX_CONCURRENCY
+    AIGovernor.configure(max_concurrency=1, rpm=0, tpm=0)
+    yield AIGovernor
+    AIGovernor.configure(max_concurrency=original, rpm=60, tpm=100000)
+
+
+@pytest.mark.asyncio
+async def test_interactive_jumps_ahead_of_background(governor):
+    order = []
+    gate = asyncio.Event()
+
+    async def call(name, priority):
+        async with governor.slot(priority):
+            order.append(name)
+            if name == "holder":
+                await gate.wait()
+
+    holder = asyncio.create_task(call("holder", AIPriority.ANALYSIS))
+    await asyncio.sleep(0.01)
+    background = asyncio.create_task(call("profile", AIPriority.BACKGROUND))
+    await asyncio.sleep(0.01)
+    interactive = asyncio.create_task(call("agent", AIPriority.INTERACTIVE))
+    await asyncio.sleep(0.01)
+
+    assert governor.stats()["priorities"]["background"]["queued"] == 1
+    gate.set()
+    await asyncio.gather(holder, background, interactive)
+
+    assert order == ["holder", "agent", "profile"]
+
+
+@pytest.mark.asyncio
+async def test_request_budget_queues_and_times_out(governor, monkeypatch):
+    governor.configure(max_concurrency=10, rpm=2)
+    monkeypatch.setitem(AIGovernor.QUEUE_TIMEOUT, AIPriority.BACKGROUND, 0.05)
+    before = governor.stats()["priorities"]["background"]["timeouts"]
+
+    async with governor.slot(AIPriority.ANALYSIS):
+        pass
+    async with governor.slot(AIPriority.ANALYSIS):
+        pass
+    with pytest.raises(AIGovernorTimeout):
+        async with governor.slot(AIPriority.BACKGROUND):
+            pass
+
+    stats = governor.stats()
+    assert stats["priorities"]["background"]["timeouts"] == before + 1
+    assert stats["running"] == 0
+
+
+@pytest.mark.asyncio
+async def test_unused_tokens_are_refunded(governor):
+    governor.configure(tpm=1000)
+
+    async with governor.slot(AIPriority.ANALYSIS, tokens=800) as lease:
+        lease.used_tokens = 100
+
+    assert governor.stats()["tpmAvailable"] >= 900
+
+
+@pytest.mark.asyncio
+async def test_waiter_on_another_thread_loop_is_woken(governor):
+    acquired = threading.Event()
+
+    async def background_profile():
+        async with governor.slot(AIPriority.BACKGROUND):
+            acquired.set()
+
+    async with governor.slot(AIPriority.ANALYSIS):
+        worker = threading.Thread(target=lambda: asyncio.run(background_profile()))
+        worker.start()
+        await asyncio.sleep(0.05)
+        assert not acquired.is_set()
+
+    await asyncio.to_thread(worker.join, 2)
+    assert acquired.is_set()
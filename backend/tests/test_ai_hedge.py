@@ -0,0 +1,167 @@
+import asyncio
+import sys
+from collections import deque
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+
+BACKEND_ROOT = Path(__file__).resolve().parents[1]
+if str(BACKEND_ROOT) not in sys.path:
+    sys.path.insert(0, str(BACKEND_ROOT))
+
+
+from app.models.ai import AI, AIAnalysisGenerator  # noqa: E402
+from app.models.ai_budget import AIPromptType  # noqa: E402
+from app.models.ai_governor import AIGovernor, AIPriority, _TokenBucket  # noqa: E402
+from app.models.ai_hedge import AIDeadlineExceeded, AIHedge  # noqa: E402
+from app.models.ai_telemetry import AITelemetry  # noqa: E402
+
+
+SHORT = AIPromptType.SHORT
+
+
+@pytest.fixture
+def hedge(monkeypatch):
+    monkeypatch.setattr(AIGovernor, "_rpm", _TokenBucket(0))
+    monkeypatch.setattr(AIGovernor, "_tpm", _TokenBucket(0))
+    monkeypatch.setattr(AIGovernor, "MAX_CONCURRENCY", 8)
+    monkeypatch.setattr(AIHedge, "MIN_DELAY", 0.0)
+    monkeypatch.setattr(AIHedge, "MIN_SAMPLES", 5)
+    monkeypatch.setattr(AIHedge, "_latencies", {t: deque(maxlen=AIHedge.WINDOW) for t in AIPromptType})
+    monkeypatch.setattr(AIHedge, "_stats", {
+        t: {"calls": 0, "deadlineExceeded": 0, "hedged": 0, "hedgeWins": 0, "hedgeSkipped": 0}
+        for t in AIPromptType
+    })
+    monkeypatch.setattr(AIHedge, "DEADLINES", {**AIHedge.DEADLINES, SHORT: 1.0})
+    # 近期短回答都在 0.05 秒内返回
+    AIHedge._latencies[SHORT].extend([0.02] * 19 + [0.05])
+    return AIHedge
+
+
+class Calls:
+    """依次返回给定延迟的请求，记录被取消的请求"""
+
+    def __init__(self, *delays: float):
+        self.delays = list(delays)
+        self.started = 0
+        self.cancelled = []
+
+    async def __call__(self) -> str:
+        index = self.started
+        self.started += 1
+        try:
+            await asyncio.sleep(self.delays[index])
+        except asyncio.CancelledError:
+            self.cancelled.append(index)
+            raise
+        return f"call-{index}"
+
+
+@pytest.mark.asyncio
+async def test_fast_call_is_not_hedged(hedge):
+    calls = Calls(0.01)
+    assert await hedge.run(SHORT, AIPriority.ANALYSIS, 100, calls) == "call-0"
+    assert calls.started == 1
+    assert hedge.stats()["short"]["hedged"] == 0
+
+
+@pytest.mark.asyncio
+async def test_slow_call_is_hedged_and_the_duplicate_wins(hedge):
+    calls = Calls(0.5, 0.01)
+    assert await hedge.run(SHORT, AIPriority.ANALYSIS, 100, calls) == "call-1"
+    assert calls.cancelled == [0]
+
+    stats = hedge.stats()["short"]
+    assert stats["hedged"] == 1
+    assert stats["hedgeWins"] == 1
+    assert stats["hedgeWinRate"] == 1.0
+    # 对冲请求的额度已经归还
+    assert AIGovernor._running == 0
+
+
+@pytest.mark.asyncio
+async def test_hedged_request_is_recorded_with_its_own_tokens(hedge, monkeypatch):
+    delays = [0.5, 0.01]
+
+    async def create(provider, messages, max_tokens):
+        await asyncio.sleep(delays.pop(0))
+        usage = SimpleNamespace(prompt_tokens=12, completion_tokens=3, total_tokens=15)
+        return provider.model, SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="ok"))], usage=usage)
+
+    monkeypatch.setattr(AI, "_create", create)
+    AITelemetry.reset()
+
+    assert await AI.get_response("hi", use_cache=False, prompt_type=SHORT, label="TITLE") == "ok"
+
+    by_prompt = AITelemetry.stats()["byPrompt"]
+    # 对冲请求先返回：它的用量记在 TITLE:hedge，被取消的首个请求只计输入
+    assert by_prompt["TITLE:hedge"]["outcomes"] == {"ok": 1}
+    assert (by_prompt["TITLE:hedge"]["tokensIn"], by_prompt["TITLE:hedge"]["tokensOut"]) == (12, 3)
+    assert by_prompt["TITLE"]["outcomes"] == {"ok": 1}
+    assert by_prompt["TITLE"]["tokensOut"] == 0
+    AITelemetry.reset()
+
+
+@pytest.mark.asyncio
+async def test_original_can_still_win_after_hedging(hedge):
+    calls = Calls(0.1, 0.5)
+    assert await hedge.run(SHORT, AIPriority.ANALYSIS, 100, calls) == "call-0"
+    assert calls.cancelled == [1]
+    stats = hedge.stats()["short"]
+    assert stats["hedged"] == 1
+    assert stats["hedgeWins"] == 0
+
+
+@pytest.mark.asyncio
+async def test_failed_duplicate_falls_back_to_the_original(hedge):
+    async def call():
+        call.started += 1
+        if call.started == 2:
+            raise RuntimeError("hedge failed")
+        await asyncio.sleep(0.1)
+        return "original"
+    call.started = 0
+
+    assert await hedge.run(SHORT, AIPriority.ANALYSIS, 100, call) == "original"
+
+
+@pytest.mark.asyncio
+async def test_no_hedge_without_governor_headroom(hedge, monkeypatch):
+    monkeypatch.setattr(AIGovernor, "MAX_CONCURRENCY", 1)
+    calls = Calls(0.1, 0.01)
+    async with AIGovernor.slot(AIPriority.ANALYSIS):
+        assert await hedge.run(SHORT, AIPriority.ANALYSIS, 100, calls) == "call-0"
+    assert calls.started == 1
+    assert hedge.stats()["short"]["hedgeSkipped"] == 1
+
+
+@pytest.mark.asyncio
+async def test_only_configured_types_are_hedged(hedge):
+    hedge._latencies[AIPromptType.ANALYSIS].extend([0.02] * 20)
+    calls = Calls(0.1, 0.01)
+    assert await hedge.run(AIPromptType.ANALYSIS, AIPriority.ANALYSIS, 100, calls) == "call-0"
+    assert calls.started == 1
+
+
+@pytest.mark.asyncio
+async def test_deadline_exceeded(hedge, monkeypatch):
+    monkeypatch.setattr(AIHedge, "DEADLINES", {**AIHedge.DEADLINES, SHORT: 0.1})
+    calls = Calls(1.0, 1.0)
+    with pytest.raises(AIDeadlineExceeded):
+        await hedge.run(SHORT, AIPriority.ANALYSIS, 100, calls)
+    assert sorted(calls.cancelled) == [0, 1]
+    assert hedge.stats()["short"]["deadlineExceeded"] == 1
+    assert AIGovernor._running == 0
+
+
+@pytest.mark.asyncio
+async def test_titles_fall_back_to_defaults_after_deadline(monkeypatch):
+    async def fake_get_response(prompt, **kwargs):
+        raise AIDeadlineExceeded("short AI call exceeded its 30s deadline")
+
+    monkeypatch.setattr(AI, "get_response", fake_get_response)
+    assert await AIAnalysisGenerator.genTitles(["a", "b"], code=True) == ["解法 1", "解法 2"]
+    complexity = await AIAnalysisGenerator.genComplexity("int main() {}")
+    assert (complexity.time, complexity.space) == ("O(n)", "O(1)")
@@ -0,0 +1,208 @@
+import asyncio
+import json
+import sys
+import time
+from pathlib import Path
+
+import openai
+import pytest
+import pytest_asyncio
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from openai import AsyncOpenAI
+
+
+BACKEND_ROOT = Path(__file__).resolve().parents[1]
+if str(BACKEND_ROOT) not in sys.path:
+    sys.path.insert(0, str(BACKEND_ROOT))
+
+
+from app.models.ai import AI  # noqa: E402
+from app.models.ai_governor import AIGovernor, _TokenBucket  # noqa: E402
+from app.models.ai_provider import AIProvider, AIProviderPool, AIProviderUnavailable  # noqa: E402
+
+
+class StandIn:
+    """最小的 OpenAI 兼容服务：按 mode 正常应答、返回错误或挂起"""
+
+    def __init__(self, name: str, delay: float = 0.0):
+        self.name = name
+        self.delay = delay
+        self.mode = "ok"
+        self.requests = 0
+        app = web.Application()
+        app.router.add_post("/v1/chat/completions", self.chat)
+        app.router.add_get("/v1/models", self.models)
+        self.server = TestServer(app)
+
+    async def chat(self, request: web.Request) -> web.StreamResponse:
+        self.requests += 1
+        body = await request.json()
+        if self.mode == "error":
+            return web.json_response({"error": {"message": "upstream down"}}, status=500)
+        if self.mode == "bad_request":
+            return web.json_response({"error": {"message": "bad prompt"}}, status=400)
+        if self.mode == "hang":
+            await asyncio.sleep(5)
+        await asyncio.sleep(self.delay)
+
+        if not body.get("stream"):
+            return web.json_response({
+                "id": "chatcmpl-standin", "object": "chat.completion", "created": int(time.time()), "model": body["model"],
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": self.name}, "finish_reason": "stop"}],
+            })
+
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        for piece in (self.name, "-done"):
+            chunk = {
+                "id": "chatcmpl-standin", "object": "chat.completion.chunk", "created": int(time.time()), "model": body["model"],
+                "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}],
+            }
+            await response.write(f"data: {json.dumps(chunk)}\n\n".encode())
+        await response.write(b"data: [DONE]\n\n")
+        return response
+
+    async def models(self, request: web.Request) -> web.Response:
+        if self.mode != "ok":
+            return web.json_response({"error": {"message": "down"}}, status=503)
+        return web.json_response({"object": "list", "data": []})
+
+    def provider(self, timeout: float = 2.0) -> AIProvider:
+        return AIProvider(
+            name=self.name,
+            base_url=str(self.server.make_url("/v1")),
+            model=f"{self.name}-model",
+            client=AsyncOpenAI(api_key="test", base_url=str(self.server.make_url("/v1")), timeout=timeout, max_retries=0),
+        )
+
+
+@pytest_asyncio.fixture
+async def stand_ins(monkeypatch):
+    # 测试里的调用不受每分钟额度限制
+    monkeypatch.setattr(AIGovernor, "_rpm", _TokenBucket(0))
+    monkeypatch.setattr(AIGovernor, "_tpm", _TokenBucket(0))
+    monkeypatch.setattr(AIProviderPool, "providers", list(AIProviderPool.providers))
+
+    servers = [StandIn("primary", delay=0.15), StandIn("backup", delay=0.01)]
+    for server in servers:
+        await server.server.start_server()
+    AIProviderPool.configure([server.provider(timeout=0.3) for server in servers])
+    yield servers
+    for server in servers:
+        await server.server.close()
+
+
+@pytest.mark.asyncio
+async def test_fails_over_on_server_error(stand_ins):
+    primary, backup = stand_ins
+    primary.mode = "error"
+    failovers = AIProviderPool.stats()["failovers"]
+
+    assert await AI.get_response("hi", use_cache=False) == "backup"
+    assert primary.requests == 1
+    assert AIProviderPool.stats()["failovers"] == failovers + 1
+
+
+@pytest.mark.asyncio
+async def test_fails_over_on_timeout(stand_ins):
+    primary, _ = stand_ins
+    primary.mode = "hang"
+
+    assert await AI.get_response("hi", use_cache=False) == "backup"
+
+
+@pytest.mark.asyncio
+async def test_stream_fails_over_before_first_chunk(stand_ins):
+    primary, _ = stand_ins
+    primary.mode = "error"
+
+    chunks = [c async for c in AI.get_response_stream("hi", use_cache=False)]
+
+    assert "".join(chunks) == "backup-done"
+
+
+@pytest.mark.asyncio
+async def test_routes_to_lower_latency_provider(stand_ins):
+    primary, backup = stand_ins
+
+    for _ in range(6):
+        await AI.get_response("hi", use_cache=False)
+
+    # 首次按配置顺序走主端点，测得延迟后转向更快的备用端点
+    assert primary.requests == 1
+    assert backup.requests == 5
+
+
+@pytest.mark.asyncio
+async def test_breaker_skips_failing_provider_until_probe_recovers(stand_ins, monkeypatch):
+    monkeypatch.setattr(AIProviderPool, "FAILURE_THRESHOLD", 2)
+    primary, backup = stand_ins
+    primary.mode = "error"
+
+    for _ in range(2):
+        await AI.get_response("hi", use_cache=False)
+    assert primary.requests == 2
+    assert AIProviderPool.stats()["providers"][0]["healthy"] is False
+
+    await AI.get_response("hi", use_cache=False)
+    assert primary.requests == 2
+
+    primary.mode = "ok"
+    await AIProviderPool.probe()
+    assert AIProviderPool.stats()["providers"][0]["healthy"] is True
+
+
+@pytest.mark.asyncio
+async def test_bad_request_is_not_retried_elsewhere(stand_ins):
+    primary, backup = stand_ins
+    primary.mode = "bad_request"
+
+    with pytest.raises(openai.BadRequestError):
+        await AI.get_response("hi", use_cache=False)
+    assert backup.requests == 0
+
+
+@pytest.mark.asyncio
+async def test_failover_answer_is_cached_under_the_backup_model(stand_ins):
+    primary, backup = stand_ins
+    primary.mode = "error"
+    assert await AI.get_response("cache me") == "backup"
+
+    # 只剩主端点时不返回备用模型缓存的回答
+    primary.mode = "ok"
+    AIProviderPool.configure([primary.provider()])
+    assert await AI.get_response("cache me") == "primary"
+    assert await AI.get_response("cache me") == "primary"
+    assert primary.requests == 2
+
+
+@pytest.mark.asyncio
+async def test_providers_in_cooldown_are_still_tried_last(stand_ins):
+    primary, backup = stand_ins
+    for provider in AIProviderPool.providers:
+        provider.down_until = time.monotonic() + 60
+    primary.mode = backup.mode = "error"
+
+    # 全部端点熔断且都失败时抛出端点的真实错误
+    with pytest.raises(openai.InternalServerError):
+        await AI.get_response("hi", use_cache=False)
+    with pytest.raises(openai.InternalServerError):
+        [c async for c in AI.get_response_stream("hi", use_cache=False)]
+    assert (primary.requests, backup.requests) == (2, 2)
+
+    backup.mode = "ok"
+    assert await AI.get_response("hi", use_cache=False) == "backup"
+
+
+@pytest.mark.asyncio
+async def test_no_provider_raises_unavailable(monkeypatch):
+    monkeypatch.setattr(AIProviderPool, "providers", [])
+
+    async def never(provider):
+        raise AssertionError("no provider to call")
+
+    with pytest.raises(AIProviderUnavailable):
+        await AIProviderPool.call(never)
+    with pytest.raises(AIProviderUnavailable):
+        [piece async for piece in AIProviderPool.stream(never)]
@@ -0,0 +1,116 @@
+import asyncio
+import sys
+from pathlib import Path
+
+import pytest
+import pytest_asyncio
+
+
+BACKEND_ROOT = Path(__file__).resolve().parents[1]
+if str(BACKEND_ROOT) not in sys.path:
+    sys.path.insert(0, str(BACKEND_ROOT))
+
+
+from app.models.ai import AIQueue  # noqa: E402
+from app.controller.ai import AIController  # noqa: E402
+from app.models.analysis import AIJob, AIJobStatus  # noqa: E402
+from app.models.assignment import Assignment  # noqa: E402
+
+
+@pytest_asyncio.fixture
+async def ai_queue_stopped():
+    yield
+    await AIQueue.stop()
+
+
+@pytest.fixture
+def handled(monkeypatch):
+    calls: list[str] = []
+    release = asyncio.Event()
+
+    async def handler(assign_id):
+        calls.append(assign_id)
+        await release.wait()
+
+    monkeypatch.setitem(AIQueue._handlers, "test", handler)
+    return calls, release
+
+
+async def wait_for_status(job_id, status):
+    for _ in range(100):
+        job = await AIJob.get(id=job_id)
+        if job.status == status:
+            return job
+        await asyncio.sleep(0.01)
+    raise AssertionError(f"job {job_id} did not reach {status}")
+
+
+@pytest.mark.asyncio
+async def test_enqueue_deduplicates_unfinished_jobs(db, ai_queue_stopped, handled):
+    calls, release = handled
+    await AIQueue.start(workers=1)
+
+    first = await AIQueue.enqueue("test", "a1", "test:a1:v1")
+    second = await AIQueue.enqueue("test", "a1", "test:a1:v1")
+    release.set()
+    job = await wait_for_status(first.id, AIJobStatus.DONE)
+
+    assert second.id == first.id
+    assert calls == ["a1"]
+    assert job.finished_at is not None
+
+
+@pytest.mark.asyncio
+async def test_failed_job_is_retried_then_marked_failed(db, ai_queue_stopped, monkeypatch):
+    attempts = []
+
+    async def failing(assign_id):
+        attempts.append(assign_id)
+        raise RuntimeError("model unavailable")
+
+    monkeypatch.setitem(AIQueue._handlers, "test", failing)
+    await AIQueue.start(workers=1)
+
+    job = await AIQueue.enqueue("test", "a2", "test:a2:v1")
+    job = await wait_for_status(job.id, AIJobStatus.FAILED)
+
+    assert len(attempts) == AIQueue.MAX_ATTEMPTS
+    assert job.error == "model unavailable"
+
+
+@pytest.mark.asyncio
+async def test_unfinished_jobs_are_recovered_on_start(db, ai_queue_stopped, handled):
+    calls, release = handled
+    release.set()
+    await AIJob.create(id="interrupted", key="test:a3:v1", kind="test", assignment_id="a3", status=AIJobStatus.RUNNING)
+
+    await AIQueue.start(workers=1)
+
+    await wait_for_status("interrupted", AIJobStatus.DONE)
+    assert calls == ["a3"]
+
+
+@pytest.mark.asyncio
+async def test_queued_job_and_request_share_one_generation(db, ai_queue_stopped, monkeypatch):
+    calls: list[str] = []
+    release = asyncio.Event()
+
+    async def generate(assign_id):
+        calls.append(assign_id)
+        await release.wait()
+        return "analysis"
+
+    monkeypatch.setattr(AIController, "generateBasic", generate)
+    assignment = await Assignment.create(id="a1", title="两数之和", description="求和", type="program")
+    await AIQueue.start(workers=1)
+
+    job = await AIQueue.enqueue("basic", "a1", "basic:a1:v1")
+    await asyncio.sleep(0.05)
+    # 预生成任务进行中时到达的请求（getBasic）加入同一次生成
+    request = asyncio.create_task(AIController._sharedBasic(assignment))
+    await asyncio.sleep(0.01)
+    release.set()
+
+    assert await request == "analysis"
+    await wait_for_status(job.id, AIJobStatus.DONE)
+    assert calls == ["a1"]
@@ -0,0 +1,246 @@
+import asyncio
+import json
+import sys
+import time
+from pathlib import Path
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+import pytest
+
+
+BACKEND_ROOT = Path(__file__).resolve().parents[1]
+if str(BACKEND_ROOT) not in sys.path:
+    sys.path.insert(0, str(BACKEND_ROOT))
+
+
+from app.models.ai import AI, AIAnalysisGenerator  # noqa: E402
+from app.schemas.assignment import Complexity, MatrixAnalysisProps  # noqa: E402
+from app.utils.ai import MicroBatcher, SectionSplitter, gather_bounded, parse_titles  # noqa: E402
+
+
+CALL_DELAY = 0.1
+
+
+@pytest.mark.asyncio
+async def test_gather_bounded_keeps_order_and_limit():
+    running = 0
+    peak = 0
+
+    async def work(i):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        # 越靠前的任务越晚完成
+        await asyncio.sleep(0.01 * (5 - i))
+        running -= 1
+        return i
+
+    results = await gather_bounded([work(i) for i in range(5)], limit=2)
+
+    assert results == [0, 1, 2, 3, 4]
+    assert peak == 2
+
+
+@pytest.mark.asyncio
+async def test_gather_bounded_cancels_remaining_on_error():
+    finished = []
+
+    async def ok(i):
+        await asyncio.sleep(0.05)
+        finished.append(i)
+
+    async def boom():
+        raise RuntimeError("boom")
+
+    with pytest.raises(RuntimeError):
+        await gather_bounded([boom(), ok(1), ok(2)], limit=3)
+    await asyncio.sleep(0.1)
+
+    assert finished == []
+
+
+@pytest.mark.asyncio
+async def test_micro_batcher_merges_requests_arriving_during_a_batch():
+    batches = []
+
+    async def process(items):
+        batches.append(items)
+        await asyncio.sleep(CALL_DELAY)
+        return [item * 10 for item in items]
+
+    batcher = MicroBatcher(process)
+    first = asyncio.create_task(batcher.submit(1))
+    await asyncio.sleep(CALL_DELAY / 2)
+    rest = [asyncio.create_task(batcher.submit(i)) for i in (2, 3, 4)]
+
+    assert await asyncio.gather(first, *rest) == [10, 20, 30, 40]
+    assert batches == [[1], [2, 3, 4]]
+
+
+@pytest.fixture
+def three_sections(monkeypatch):
+    assign = SimpleNamespace(title="t", description="d", assignOriginalCode=[SimpleNamespace(content="c")])
+    monkeypatch.setattr("app.models.ai.AssignmentController.get_assignment", AsyncMock(return_value=assign))
+    monkeypatch.setattr("app.models.ai.AssignmentController.get_test_generators", AsyncMock(return_value=[]))
+
+    async def fake_response(prompt, **kwargs):
+        await asyncio.sleep(CALL_DELAY)
+        if prompt == "main":
+            return "a\n---\nb\n---\nc"
+        if prompt.startswith("titles"):
+            return json.dumps([f"title:{c}" for c in prompt.split()[1:]])
+        return f"title:{prompt[-1]}"
+
+    async def fake_stream(messages, **kwargs):
+        yield "a\n---\nb\n---\nc"
+
+    async def fake_complexity(code, input_generator=None):
+        await asyncio.sleep(CALL_DELAY)
+        return Complexity(time="O(n)", space="O(1)")
+
+    monkeypatch.setattr("app.models.ai.AIPrompt.RESOLUTION", lambda *args: "main")
+    monkeypatch.setattr("app.models.ai.AIPrompt.KNOWLEDGEANALYSIS", lambda *args: "main")
+    monkeypatch.setattr("app.models.ai.AIPrompt.TITLES", lambda contents, code=False: "titles " + " ".join(contents))
+    monkeypatch.setattr("app.models.ai.AIPrompt.TITLE", lambda content: f"title {content}")
+    monkeypatch.setattr("app.models.ai.AIPrompt.TITLE_CODE", lambda code: f"title {code}")
+    monkeypatch.setattr(AI, "get_response", fake_response)
+    monkeypatch.setattr(AI, "get_response_stream", fake_stream)
+    monkeypatch.setattr(AIAnalysisGenerator, "genComplexity", fake_complexity)
+
+
+@pytest.mark.asyncio
+async def test_resolutions_generate_titles_and_complexity_concurrently(three_sections):
+    start = time.monotonic()
+
+    analysis = await AIAnalysisGenerator.genResolutions("1")
+
+    # 主请求 + 一轮并发的子请求（批量标题与各解法复杂度），串行时需要 7 轮
+    assert time.monotonic() - start < CALL_DELAY * 4
+    assert [c.title for c in analysis.content] == ["title:a", "title:b", "title:c"]
+
+
+@pytest.mark.asyncio
+async def test_resolution_stream_processes_sections_while_generating(three_sections, monkeypatch):
+    finished = asyncio.Event()
+
+    async def slow_stream(messages, **kwargs):
+        for piece in ["a\n--", "-\nb\n", "---\n", "c"]:
+            await asyncio.sleep(CALL_DELAY * 2)
+            yield piece
+        finished.set()
+
+    monkeypatch.setattr(AI, "get_response_stream", slow_stream)
+
+    items = []
+    events = []
+    async for event in AIAnalysisGenerator.genResolutionsStream("1"):
+        events.append(event)
+        if event.startswith("event: item"):
+            items.append((json.loads(event.split("data: ", 1)[1]), finished.is_set()))
+
+    # 前两个解法在输出结束前就已完成标题和复杂度
+    assert [(item["index"], done) for item, done in items] == [(0, False), (1, False), (2, True)]
+    assert items[0][0]["title"] == "title:a"
+    assert '"current": 3, "total": 3' in [e for e in events if e.startswith("event: progress")][-1]
+    complete = json.loads(events[-1].split("data: ", 1)[1])
+    assert [c["title"] for c in complete["content"]] == ["title:a", "title:b", "title:c"]
+
+
+@pytest.mark.asyncio
+async def test_resolution_stream_batches_titles_of_completed_sections(three_sections, monkeypatch):
+    prompts = []
+    original = AI.get_response
+
+    async def recording(prompt, **kwargs):
+        prompts.append(prompt)
+        return await original(prompt)
+
+    monkeypatch.setattr(AI, "get_response", recording)
+
+    events = [event async for event in AIAnalysisGenerator.genResolutionsStream("1")]
+
+    # 三个解法一起完成时合并成批量标题请求，而不是每个解法一次
+    title_requests = [p for p in prompts if p.startswith("title")]
+    assert len(title_requests) < 3
+    assert all(p.startswith("titles ") for p in title_requests)
+    complete = json.loads(events[-1].split("data: ", 1)[1])
+    assert [c["title"] for c in complete["content"]] == ["title:a", "title:b", "title:c"]
+
+
+@pytest.mark.asyncio
+async def test_replayed_resolution_emits_the_same_items(three_sections):
+    def items(events):
+        return [json.loads(e.split("data: ", 1)[1]) for e in events if e.startswith("event: item")]
+
+    live = [event async for event in AIAnalysisGenerator.genResolutionsStream("1")]
+    props = MatrixAnalysisProps.model_validate_json(live[-1].split("data: ", 1)[1])
+
+    replayed = [event async for event in AIAnalysisGenerator.replayStream("resolution", props)]
+
+    assert len(items(live)) == 3
+    assert items(replayed) == sorted(items(live), key=lambda item: item["index"])
+    assert replayed[-1] == live[-1]
+
+
+def test_section_splitter_matches_split():
+    text = "a\n---\n\n---\nb-\n--\n---c---"
+    for size in range(1, len(text) + 1):
+        splitter = SectionSplitter()
+        sections = []
+        for i in range(0, len(text), size):
+            sections += splitter.feed(text[i:i + size])
+        sections += splitter.flush()
+        assert sections == [c.strip() for c in text.split("---") if c.strip()]
+
+
+@pytest.mark.asyncio
+async def test_knowledge_stream_reports_progress_and_keeps_order(three_sections):
+    events = [event async for event in AIAnalysisGenerator.genKnowledgeAnalysisStream("1")]
+
+    progress = [e for e in events if e.startswith("event: progress")]
+    complete = json.loads(events[-1].split("data: ", 1)[1])
+
+    assert '"current": 3' in progress[-1]
+    assert [c["title"] for c in complete["content"]] == ["title:a", "title:b", "title:c"]
+
+
+@pytest.mark.asyncio
+async def test_titles_use_single_request(three_sections, monkeypatch):
+    prompts = []
+    original = AI.get_response
+
+    async def recording(prompt, **kwargs):
+        prompts.append(prompt)
+        return await original(prompt)
+
+    monkeypatch.setattr(AI, "get_response", recording)
+
+    titles = await AIAnalysisGenerator.genTitles(["a", "b", "c"])
+
+    assert titles == ["title:a", "title:b", "title:c"]
+    assert len(prompts) == 1
+
+
+@pytest.mark.asyncio
+async def test_titles_fall_back_to_per_section_on_bad_json(three_sections, monkeypatch):
+    original = AI.get_response
+
+    async def broken_batch(prompt, **kwargs):
+        if prompt.startswith("titles"):
+            return '["only one"]'
+        return await original(prompt)
+
+    monkeypatch.setattr(AI, "get_response", broken_batch)
+
+    titles = await AIAnalysisGenerator.genTitles(["a", "b"])
+
+    assert titles == ["title:a", "title:b"]
+
+
+def test_parse_titles_validates_shape():
+    assert parse_titles('```json\n["递归", "动态规划"]\n```', 2) == ["递归", "动态规划"]
+    assert parse_titles('标题：["递归"]', 2) is None
+    assert parse_titles('["递归", ""]', 2) is None
+    assert parse_titles('["递归", 1]', 2) is None
+    assert parse_titles("递归\n动态规划", 2) is None
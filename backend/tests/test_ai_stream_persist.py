@@ -0,0 +1,97 @@
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+
+BACKEND_ROOT = Path(__file__).resolve().parents[1]
+if str(BACKEND_ROOT) not in sys.path:
+    sys.path.insert(0, str(BACKEND_ROOT))
+
+
+from app.controller.ai import AIController  # noqa: E402
+from app.models.ai import AI, AIAnalysisGenerator  # noqa: E402
+from app.models.analysis import Analysis  # noqa: E402
+from app.controller.assignment import AssignmentController  # noqa: E402
+from app.models.assignment import Assignment  # noqa: E402
+from app.models.course import Course  # noqa: E402
+from app.schemas.assignment import TestSampleCreate  # noqa: E402
+
+
+@pytest.fixture
+def fake_llm(monkeypatch):
+    calls = {"stream": 0}
+
+    async def fake_stream(messages, **kwargs):
+        calls["stream"] += 1
+        for chunk in ["知识点一", "\n---\n", "知识点二"]:
+            yield chunk
+
+    async def fake_titles(contents, code=False):
+        return [f"标题{i}" for i in range(len(contents))]
+
+    monkeypatch.setattr(AI, "get_response_stream", fake_stream)
+    monkeypatch.setattr(AIAnalysisGenerator, "genTitles", fake_titles)
+    return calls
+
+
+async def create_assignment(monkeypatch) -> str:
+    async def no_pregen(course_id, assign_id):
+        return None
+
+    monkeypatch.setattr(AssignmentController, "pregen_basic_analysis", no_pregen)
+    await Course.create(id="c1", course_name="C")
+    await AssignmentController.set_assignment(
+        assignId=None, courseId="c1", title="两数之和", description="求和",
+        assignOriginalCode='[{"fileName": "main.cpp", "content": "int main(){}"}]', testSample=TestSampleCreate(input=["1"], expectOutput=["1"]), ddl=None,
+    )
+    return (await Assignment.first()).id
+
+
+def complete_payload(events):
+    complete = [e for e in events if "event: complete" in e]
+    assert len(complete) == 1
+    return json.loads(complete[0].split("data: ", 1)[1])
+
+
+@pytest.mark.asyncio
+async def test_stream_persists_and_replays_without_llm(db, fake_llm, monkeypatch):
+    assign_id = await create_assignment(monkeypatch)
+
+    first = [e async for e in AIController.getBasicStream("c1", assign_id, "knowledge")]
+    stored = await Analysis.get(assignment_id=assign_id)
+    assert [item["title"] for item in stored.knowledge_analysis["content"]] == ["标题0", "标题1"]
+
+    second = [e async for e in AIController.getBasicStream("c1", assign_id, "knowledge")]
+
+    assert fake_llm["stream"] == 1
+    assert complete_payload(second) == complete_payload(first)
+    assert any(e.startswith("event: progress") for e in second)
+
+
+@pytest.mark.asyncio
+async def test_saving_one_field_keeps_others(db):
+    await Assignment.create(id="a1", title="两数之和", description="求和", type="program")
+    analysis = json.dumps({"content": [{"title": "t", "content": "c"}], "summary": None, "showInEditor": False})
+
+    await AIController._save_analysis("a1", resolution=analysis)
+    await AIController._save_analysis("a1", knowledge_analysis=analysis)
+
+    assert await Analysis.filter(assignment_id="a1").count() == 1
+    stored = await Analysis.get(assignment_id="a1")
+    assert stored.resolution["content"][0]["title"] == "t"
+    assert stored.knowledge_analysis["content"][0]["title"] == "t"
+
+
+@pytest.mark.asyncio
+async def test_reconnect_with_last_event_id_resumes_instead_of_replaying(db, fake_llm, monkeypatch):
+    assign_id = await create_assignment(monkeypatch)
+
+    first = [e async for e in AIController.getBasicStream("c1", assign_id, "knowledge")]
+    last_id = first[1].split("\n", 1)[0][len("id: "):]
+
+    resumed = [e async for e in AIController.getBasicStream("c1", assign_id, "knowledge", last_id)]
+
+    assert resumed == first[2:]
+    assert fake_llm["stream"] == 1
@@ -0,0 +1,125 @@
+import sys
+from pathlib import Path
+
+import openai
+import pytest
+import pytest_asyncio
+from openai import AsyncOpenAI
+
+
+BACKEND_ROOT = Path(__file__).resolve().parents[1]
+if str(BACKEND_ROOT) not in sys.path:
+    sys.path.insert(0, str(BACKEND_ROOT))
+
+
+from app.models.ai import AI  # noqa: E402
+from app.models.ai_budget import AIPromptType  # noqa: E402
+from app.models.ai_governor import AIGovernor, _TokenBucket  # noqa: E402
+from app.models.ai_provider import AIProvider, AIProviderPool  # noqa: E402
+from app.models.ai_telemetry import AITelemetry  # noqa: E402
+from app.models.assignment import Assignment  # noqa: E402
+from app.models.course import Course  # noqa: E402
+from app.test.openai_standin import OpenAIStandIn, StandInConfig  # noqa: E402
+
+
+@pytest_asyncio.fixture
+async def standin(monkeypatch):
+    monkeypatch.setattr(AIGovernor, "_rpm", _TokenBucket(0))
+    monkeypatch.setattr(AIGovernor, "_tpm", _TokenBucket(0))
+    monkeypatch.setattr(AIProviderPool, "providers", list(AIProviderPool.providers))
+    AITelemetry.reset()
+
+    server = OpenAIStandIn(StandInConfig(ttft=0.05, tokens_per_second=200, canned=[(r"ping", "一二三四五六七八九十")]))
+    await server.start()
+    AIProviderPool.configure([AIProvider(
+        name="standin", base_url=server.base_url, model="standin",
+        client=AsyncOpenAI(api_key="test", base_url=server.base_url, max_retries=0),
+    )])
+    yield server
+    await server.close()
+    AITelemetry.reset()
+
+
+@pytest.mark.asyncio
+async def test_records_completion_with_usage(standin):
+    assert await AI.get_response("ping", use_cache=False, prompt_type=AIPromptType.SHORT, label="TITLE") == "一二三四五六七八九十"
+
+    record = AITelemetry.stats()["recent"][-1]
+    assert record["label"] == "TITLE"
+    assert record["promptType"] == "short"
+    assert record["outcome"] == "ok"
+    # 输出 token 数取自服务端返回的用量
+    assert record["tokensOut"] == 10
+    assert record["tokensIn"] > 0
+    assert record["latency"] >= 0.05
+    assert record["ttft"] is None
+
+
+@pytest.mark.asyncio
+async def test_records_stream_ttft_and_speed(standin):
+    chunks = [c async for c in AI.get_response_stream("ping", use_cache=False, label="RESOLUTION")]
+    assert "".join(chunks) == "一二三四五六七八九十"
+
+    stats = AITelemetry.stats()
+    record = stats["recent"][-1]
+    assert record["streaming"] is True
+    assert record["outcome"] == "ok"
+    assert 0.05 <= record["ttft"] < record["latency"]
+    assert record["tokensPerSecond"] > 0
+    assert stats["byPrompt"]["RESOLUTION"]["ttftP50"] == record["ttft"]
+
+
+@pytest.mark.asyncio
+async def test_records_cancelled_cached_and_failed_calls(standin):
+    stream = AI.get_response_stream("ping", use_cache=False, label="AGENT")
+    await stream.__anext__()
+    await stream.aclose()
+
+    await AI.get_response("ping", label="CACHED")
+    await AI.get_response("ping", label="CACHED")
+
+    standin.config.error_rate = 1.0
+    with pytest.raises(openai.InternalServerError):
+        await AI.get_response("ping", use_cache=False, label="FAILED")
+
+    by_prompt = AITelemetry.stats()["byPrompt"]
+    assert by_prompt["AGENT"]["outcomes"] == {"cancelled": 1}
+    assert by_prompt["CACHED"]["outcomes"] == {"ok": 1, "cached": 1}
+    assert by_prompt["FAILED"]["outcomes"] == {"error": 1}
+
+
+@pytest.mark.asyncio
+async def test_aggregates_per_assignment_and_course(db, standin):
+    course = await Course.create(id="c1", course_name="C")
+    assignment = await Assignment.create(id="a1", title="两数之和", description="求和", type="program")
+    await course.assignments.add(assignment)
+
+    with AITelemetry.scope("a1"):
+        await AI.get_response("ping", use_cache=False, label="COMPLEXITY")
+        await AI.get_response("ping", use_cache=False, label="TITLES")
+    await AI.get_response("ping", use_cache=False, label="CODE_STYLE")
+
+    report = await AITelemetry.report()
+    assert report["calls"] == 3
+    assert report["byAssignment"]["a1"]["calls"] == 2
+    assert report["byCourse"]["c1"]["calls"] == 2
+    assert report["byCourse"]["c1"]["tokensOut"] == 20
+
+
+@pytest.mark.asyncio
+async def test_assignment_aggregates_are_bounded(db, monkeypatch):
+    monkeypatch.setattr(AITelemetry, "ASSIGNMENTS", 2)
+    monkeypatch.setattr(AITelemetry, "TOP", 1)
+    AITelemetry.reset()
+
+    for assign_id, tokens_out in [("a1", 5), ("a2", 50), ("a3", 10)]:
+        with AITelemetry.scope(assign_id):
+            AITelemetry.finish(AITelemetry.start("TITLE", AIPromptType.SHORT), "ok", 10, tokens_out)
+
+    report = await AITelemetry.report()
+    # 最久没有调用的 a1 被淘汰，默认只列出用量最多的作业
+    assert report["assignments"] == 2
+    assert list(report["byAssignment"]) == ["a2"]
+    assert list((await AITelemetry.report("a3"))["byAssignment"]) == ["a3"]
+    assert (await AITelemetry.report("a1"))["byAssignment"] == {}
+    AITelemetry.reset()
@@ -0,0 +1,73 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+
+BACKEND_ROOT = Path(__file__).resolve().parents[1]
+if str(BACKEND_ROOT) not in sys.path:
+    sys.path.insert(0, str(BACKEND_ROOT))
+
+
+from app.controller.ai import AIController  # noqa: E402
+from app.controller.assignment import AssignmentController  # noqa: E402
+from app.models.course import Course  # noqa: E402
+from app.schemas.assignment import TestSampleCreate  # noqa: E402
+
+
+SAMPLE = TestSampleCreate(input=["1"], expectOutput=["1"])
+
+
+@pytest.fixture
+def queued(monkeypatch):
+    jobs: list[tuple[str, str]] = []
+
+    async def fake_create_job(course_id, assign_id, kind):
+        jobs.append((assign_id, kind))
+        return type("Job", (), {"jobId": "j"})()
+
+    monkeypatch.setattr(AIController, "createJob", fake_create_job)
+    return jobs
+
+
+async def create_assignment(course_id, **overrides):
+    args = dict(assignId=None, courseId=course_id, title="两数之和", description="求和", assignOriginalCode='["int main(){}"]', testSample=SAMPLE, ddl=None)
+    args.update(overrides)
+    await AssignmentController.set_assignment(**args)
+
+
+@pytest.mark.asyncio
+async def test_create_queues_basic_analysis(db, queued):
+    await Course.create(id="c1", course_name="C")
+
+    await create_assignment("c1")
+
+    assert len(queued) == 1
+    assert queued[0][1] == "basic"
+
+
+@pytest.mark.asyncio
+async def test_edit_queues_only_when_content_changed(db, queued):
+    await Course.create(id="c1", course_name="C")
+    await create_assignment("c1")
+    assign_id = queued[0][0]
+    queued.clear()
+
+    await create_assignment("c1", assignId=assign_id, ddl="2030-01-01T00:00:00Z")
+    assert queued == []
+
+    await create_assignment("c1", assignId=assign_id, description="求两个数的和")
+    assert queued == [(assign_id, "basic")]
+
+
+@pytest.mark.asyncio
+async def test_queue_failure_does_not_block_saving(db, monkeypatch):
+    async def broken(*args):
+        raise RuntimeError("AI queue is not started")
+
+    monkeypatch.setattr(AIController, "createJob", broken)
+    await Course.create(id="c1", course_name="C")
+
+    await create_assignment("c1")
+
+    assert await (await Course.get(id="c1")).assignments.all().count() == 1
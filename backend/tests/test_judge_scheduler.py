@@ -0,0 +1,170 @@
+import asyncio
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from unittest.mock import AsyncMock
+
+import pytest
+
+
+BACKEND_ROOT = Path(__file__).resolve().parents[1]
+if str(BACKEND_ROOT) not in sys.path:
+    sys.path.insert(0, str(BACKEND_ROOT))
+
+
+from app.models.judge_scheduler import JudgeClass, JudgeScheduler  # noqa: E402
+from app.models.playground import JudgeCache, JudgeCorePool, Playground  # noqa: E402
+from app.schemas.assignment import CodeLanguage, RunResult, RunStatus  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def single_slot(monkeypatch):
+    monkeypatch.setattr(JudgeScheduler, "slots", classmethod(lambda cls: 1))
+
+
+async def run_in_order(jobs: list[tuple[str, JudgeClass, int]]) -> list[str]:
+    """先占住唯一的槽位，再排入所有任务，返回实际执行顺序"""
+    order: list[str] = []
+    gate = asyncio.Event()
+
+    async def blocker():
+        await gate.wait()
+
+    def job(name):
+        async def _run():
+            order.append(name)
+        return _run
+
+    first = asyncio.create_task(JudgeScheduler.submit("blocker", JudgeClass.PLAYGROUND, blocker))
+    await asyncio.sleep(0)
+    waiting = []
+    for name, job_class, cost in jobs:
+        waiting.append(asyncio.create_task(JudgeScheduler.submit(name.split("-")[0], job_class, job(name), cost=cost)))
+        await asyncio.sleep(0)
+    gate.set()
+    await asyncio.gather(first, *waiting)
+    return order
+
+
+@pytest.mark.asyncio
+async def test_spamming_user_does_not_starve_others():
+    jobs = [(f"spam-{i}", JudgeClass.GRADED, 4) for i in range(4)] + [("alice-0", JudgeClass.GRADED, 4)]
+
+    order = await run_in_order(jobs)
+
+    assert order.index("alice-0") <= 1
+
+
+@pytest.mark.asyncio
+async def test_graded_runs_before_playground_and_urgent_first():
+    jobs = [
+        ("bob-play", JudgeClass.PLAYGROUND, 1),
+        ("bob-graded", JudgeClass.GRADED, 1),
+        ("carol-urgent", JudgeClass.GRADED_URGENT, 1),
+    ]
+
+    order = await run_in_order(jobs)
+
+    assert order == ["carol-urgent", "bob-graded", "bob-play"]
+
+
+def test_classify_uses_deadline_window():
+    soon = datetime.now(timezone.utc) + timedelta(minutes=5)
+    later = datetime.now(timezone.utc) + timedelta(days=3)
+
+    assert JudgeScheduler.classify(graded=True, deadline=soon) == JudgeClass.GRADED_URGENT
+    assert JudgeScheduler.classify(graded=True, deadline=later) == JudgeClass.GRADED
+    assert JudgeScheduler.classify(graded=False, deadline=soon) == JudgeClass.PLAYGROUND
+
+
+@pytest.mark.asyncio
+async def test_stats_expose_queue_depth_per_class():
+    gate = asyncio.Event()
+    running = asyncio.create_task(JudgeScheduler.submit("u1", JudgeClass.GRADED, gate.wait))
+    queued = asyncio.create_task(JudgeScheduler.submit("u2", JudgeClass.PLAYGROUND, gate.wait))
+    await asyncio.sleep(0)
+
+    stats = JudgeScheduler.stats()
+
+    assert stats["classes"]["graded"]["running"] == 1
+    assert stats["classes"]["playground"]["queued"] == 1
+    gate.set()
+    await asyncio.gather(running, queued)
+
+
+class FakeRuns(list):
+    """替代真实进程的运行记录：按开始顺序记下输入，并统计同时占用的核数"""
+    peak = 0
+
+
+@pytest.fixture
+def fake_runs(monkeypatch):
+    # 两个评测核，槽位数与核数一致；不编译也不启动进程
+    monkeypatch.setattr(JudgeCorePool, "cores", [0, 1])
+    monkeypatch.setattr(JudgeCorePool, "_free", None)
+    monkeypatch.setattr(JudgeScheduler, "slots", classmethod(lambda cls: len(JudgeCorePool.cores)))
+    monkeypatch.setattr(Playground, "_check_sandbox", AsyncMock(return_value=(False, None)))
+    monkeypatch.setattr(Playground, "compile_code", AsyncMock(return_value=(Path("main"), None)))
+    monkeypatch.setattr(JudgeCache, "runner", AsyncMock(return_value=None))
+    runs = FakeRuns()
+    active = 0
+
+    def execute_sync(cmd, cwd, stdin_data, timeout, input_cmd=None, cpu=None, runner=None):
+        nonlocal active
+        runs.append(stdin_data.decode())
+        active += 1
+        runs.peak = max(runs.peak, active)
+        time.sleep(0.02)
+        active -= 1
+        return RunResult(status=RunStatus.OK, exitCode=0, stdout=stdin_data.decode(), timeMs=20)
+
+    monkeypatch.setattr(Playground, "_execute_sync", execute_sync)
+    return runs
+
+
+@pytest.mark.asyncio
+async def test_playground_batch_does_not_delay_urgent_graded_job(fake_runs, tmp_path):
+    gate = asyncio.Event()
+    blocker = asyncio.create_task(JudgeScheduler.submit("u1", JudgeClass.GRADED, gate.wait))
+    await asyncio.sleep(0)
+    inputs = [f"batch-{i}" for i in range(20)]
+    width = JudgeScheduler.width(len(inputs))
+    batch = asyncio.create_task(JudgeScheduler.submit(
+        "u2",
+        JudgeClass.PLAYGROUND,
+        lambda: Playground.run_code_batch("", inputs, CodeLanguage.C_CPP, concurrency=width),
+        cost=len(inputs),
+        width=width,
+    ))
+    await asyncio.sleep(0)
+    urgent = asyncio.create_task(JudgeScheduler.submit(
+        "u3",
+        JudgeClass.GRADED_URGENT,
+        lambda: Playground.execute(["main"], cwd=tmp_path, input="urgent"),
+    ))
+
+    await asyncio.sleep(0.1)
+    gate.set()
+    _, outputs, _ = await asyncio.gather(blocker, batch, urgent)
+
+    # 紧急提交拿到空闲的核直接运行，不排在整批自测运行之后
+    assert fake_runs[0] == "urgent"
+    assert outputs == inputs
+
+
+@pytest.mark.asyncio
+async def test_batch_never_runs_wider_than_its_charged_slots(fake_runs, monkeypatch):
+    monkeypatch.setattr(JudgeCorePool, "cores", [0, 1, 2, 3])
+    inputs = [f"batch-{i}" for i in range(8)]
+
+    outputs = await JudgeScheduler.submit(
+        "u1",
+        JudgeClass.PLAYGROUND,
+        lambda: Playground.run_code_batch("", inputs, CodeLanguage.C_CPP, concurrency=2),
+        cost=len(inputs),
+        width=2,
+    )
+
+    assert outputs == inputs
+    assert fake_runs.peak == 2
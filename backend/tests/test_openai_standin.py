@@ -0,0 +1,88 @@
+import sys
+import time
+from pathlib import Path
+
+import openai
+import pytest
+import pytest_asyncio
+from openai import AsyncOpenAI
+
+
+BACKEND_ROOT = Path(__file__).resolve().parents[1]
+if str(BACKEND_ROOT) not in sys.path:
+    sys.path.insert(0, str(BACKEND_ROOT))
+
+
+from app.constants.prompt import AIPrompt  # noqa: E402
+from app.models.ai import AI, AIAnalysisGenerator  # noqa: E402
+from app.models.ai_provider import AIProvider, AIProviderPool  # noqa: E402
+from app.test.openai_standin import OpenAIStandIn, StandInConfig, split_tokens  # noqa: E402
+
+
+@pytest_asyncio.fixture
+async def standin():
+    server = OpenAIStandIn(StandInConfig(ttft=0.05, tokens_per_second=0, seed=1))
+    await server.start()
+    yield server
+    await server.close()
+
+
+def client(server: OpenAIStandIn) -> AsyncOpenAI:
+    return AsyncOpenAI(api_key="test", base_url=server.base_url, max_retries=0)
+
+
+@pytest.mark.asyncio
+async def test_completion_uses_canned_reply(standin):
+    standin.config.canned = [(r"ping", "pong")]
+    response = await client(standin).chat.completions.create(
+        model="standin", messages=[{"role": "user", "content": "ping"}],
+    )
+    assert response.choices[0].message.content == "pong"
+    assert response.usage.completion_tokens == 1
+
+
+@pytest.mark.asyncio
+async def test_stream_paces_tokens(standin):
+    standin.config.canned = [(r".*", "一二三四五六七八九十")]
+    standin.config.tokens_per_second = 100
+    started = time.monotonic()
+    stream = await client(standin).chat.completions.create(
+        model="standin", messages=[{"role": "user", "content": "数数"}], stream=True,
+    )
+    pieces = []
+    first = None
+    async for chunk in stream:
+        content = chunk.choices[0].delta.content
+        if content:
+            first = first or time.monotonic() - started
+            pieces.append(content)
+
+    assert pieces == list("一二三四五六七八九十")
+    assert first >= 0.05
+    # 首 token 后 10 个 token 按每秒 100 个输出
+    assert time.monotonic() - started >= 0.05 + 0.09
+    assert standin.stats["streams"] == 1
+
+
+@pytest.mark.asyncio
+async def test_injected_errors(standin):
+    standin.config.error_rate = 1.0
+    standin.config.error_status = 503
+    with pytest.raises(openai.InternalServerError):
+        await client(standin).chat.completions.create(model="standin", messages=[{"role": "user", "content": "hi"}])
+    assert standin.stats["errors"] == 1
+
+
+@pytest.mark.asyncio
+async def test_builtin_replies_drive_the_pipeline(standin, monkeypatch):
+    monkeypatch.setattr(AIProviderPool, "providers", list(AIProviderPool.providers))
+    AIProviderPool.configure([AIProvider(name="standin", base_url=standin.base_url, model="standin", client=client(standin))])
+
+    titles = await AIAnalysisGenerator.genTitles(["int a;", "int b;", "int c;"], code=True)
+    assert titles == ["标题1", "标题2", "标题3"]
+    complexity = await AI.get_response(AIPrompt.COMPLEXITY("int main() {}"), use_cache=False)
+    assert complexity == "O(n)\nO(1)"
+
+
+def test_split_tokens_roughly_matches_heuristic():
+    assert split_tokens("知识点abcdefgh") == ["知", "识", "点", "abcd", "efgh"]
@@ -0,0 +1,292 @@
+import asyncio
+import shutil
+import subprocess
+import sys
+import time
+from contextlib import asynccontextmanager
+from pathlib import Path
+from unittest.mock import AsyncMock
+
+import pytest
+
+
+BACKEND_ROOT = Path(__file__).resolve().parents[1]
+if str(BACKEND_ROOT) not in sys.path:
+    sys.path.insert(0, str(BACKEND_ROOT))
+
+
+from app.models.playground import JudgeCache, JudgeCorePool, Playground, _parse_cpu_list  # noqa: E402
+from app.schemas.assignment import CodeLanguage, RunStatus, TestGenerator, TestSampleCreate  # noqa: E402
+
+
+pytestmark = pytest.mark.skipif(shutil.which("g++") is None, reason="g++ is required")
+
+
+SUM_CODE = """
+#include <cstdio>
+int main() {
+    long long n, x, s = 0;
+    scanf("%lld", &n);
+    for (long long i = 0; i < n; i++) { scanf("%lld", &x); s += x; }
+    printf("%lld\\n", s);
+}
+"""
+
+GENERATOR_CODE = """
+#include <cstdio>
+#include <cstdlib>
+int main(int argc, char **argv) {
+    int seed = atoi(argv[1]);
+    int n = 200000 + seed;
+    srand(seed);
+    printf("%d\\n", n);
+    for (int i = 0; i < n; i++) printf("%d ", rand() % 1000);
+    printf("\\n");
+}
+"""
+
+# 父进程空转、子进程睡眠，两者的 pid 写入工作目录
+SPIN_CODE = """
+#include <cstdio>
+#include <unistd.h>
+int main() {
+    pid_t child = fork();
+    if (child == 0) { sleep(60); return 0; }
+    FILE *f = fopen("pids", "w");
+    fprintf(f, "%d %d\\n", getpid(), child);
+    fclose(f);
+    for (volatile long i = 0;; i++) {}
+}
+"""
+
+
+def _running(pid: int) -> bool:
+    """进程存在且不是僵尸进程"""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            return f.read().rsplit(")", 1)[1].split()[0] != "Z"
+    except FileNotFoundError:
+        return False
+
+
+@pytest.fixture(autouse=True)
+def unsandboxed(monkeypatch, tmp_path):
+    # 测试环境没有 firejail，直接运行；缓存写到临时目录
+    monkeypatch.setattr(Playground, "_check_sandbox", AsyncMock(return_value=(False, None)))
+    monkeypatch.setattr(JudgeCache, "CACHE_DIR", tmp_path / "cache")
+
+
+@pytest.mark.asyncio
+async def test_run_code_keeps_plain_output():
+    output = await Playground.run_code(SUM_CODE, "3\n1 2 3\n", CodeLanguage.C_CPP)
+
+    assert output == "6\n"
+
+
+@pytest.mark.asyncio
+async def test_run_code_reports_compile_error():
+    output = await Playground.run_code("int main( {", "", CodeLanguage.C_CPP)
+
+    assert output.startswith("Compile Error:")
+
+
+def test_parse_cpu_list_supports_ranges():
+    assert _parse_cpu_list("0, 2-4,7") == {0, 2, 3, 4, 7}
+
+
+def test_core_pool_never_hands_out_reserved_cores(monkeypatch):
+    monkeypatch.setattr("app.models.playground.os.sched_getaffinity", lambda pid: {0, 1, 2, 3}, raising=False)
+    try:
+        JudgeCorePool.configure(cores={0, 1, 2, 5}, reserved={0})
+
+        assert JudgeCorePool.cores == [1, 2]
+        assert JudgeCorePool.reserved == {0}
+    finally:
+        monkeypatch.undo()
+        JudgeCorePool.configure()
+
+
+@pytest.mark.asyncio
+@pytest.mark.skipif(not JudgeCorePool.pinning, reason="sched_setaffinity is required")
+async def test_execute_reports_pinned_core(tmp_path):
+    exe_path, _ = await Playground.compile_code(SUM_CODE, tmp_path)
+
+    result = await Playground.execute(Playground._build_run_cmd(tmp_path, exe_path, False), cwd=tmp_path, input="1\n5\n")
+
+    assert result.stdout == "5\n"
+    assert result.cpu in JudgeCorePool.cores
+
+
+
+@pytest.mark.asyncio
+@pytest.mark.skipif(not JudgeCorePool.pinning, reason="sched_setaffinity is required")
+async def test_execute_pins_only_the_program_without_preexec_fn(tmp_path, monkeypatch):
+    code = """
+#include <cstdio>
+#include <sched.h>
+int main() {
+    cpu_set_t set;
+    sched_getaffinity(0, sizeof(set), &set);
+    printf("%d %d\\n", CPU_COUNT(&set), sched_getcpu());
+}
+"""
+    exe_path, _ = await Playground.compile_code(code, tmp_path)
+    gen_path, _ = await Playground.compile_code(GENERATOR_CODE, tmp_path, name="gen")
+    await JudgeCache.runner()
+    calls = []
+    original = subprocess.Popen
+
+    def recording(args, **kwargs):
+        calls.append((args, kwargs))
+        return original(args, **kwargs)
+
+    monkeypatch.setattr(subprocess, "Popen", recording)
+
+    result = await Playground.execute(
+        Playground._build_run_cmd(tmp_path, exe_path, False),
+        cwd=tmp_path,
+        input_cmd=Playground._build_run_cmd(tmp_path, gen_path, False, ["1"]),
+    )
+
+    # 生成器原样启动、不绑核；被测程序由运行器绑核
+    assert all("preexec_fn" not in kwargs for _, kwargs in calls)
+    assert calls[0][0] == [str(gen_path), "1"]
+    assert calls[1][0][2] == str(result.cpu)
+    count, running_on = map(int, result.stdout.split())
+    assert (count, running_on) == (1, result.cpu)
+
+
+@pytest.mark.asyncio
+async def test_execute_reports_memory_of_the_program_itself(tmp_path):
+    code = """
+#include <cstdio>
+#include <cstring>
+#include <vector>
+int main() {
+    int mb; scanf("%d", &mb);
+    std::vector<char> a((size_t)mb << 20);
+    memset(a.data(), 1, a.size());
+    printf("%d\\n", a[a.size() - 1]);
+}
+"""
+    exe_path, _ = await Playground.compile_code(code, tmp_path)
+    run_cmd = Playground._build_run_cmd(tmp_path, exe_path, False)
+
+    small = await Playground.execute(run_cmd, cwd=tmp_path, input="1\n")
+    large = await Playground.execute(run_cmd, cwd=tmp_path, input="64\n")
+
+    # 不包含从测试进程继承的 RSS
+    assert small.memoryKb < 16 * 1024
+    assert large.memoryKb - small.memoryKb > 60 * 1024
+
+
+@pytest.mark.asyncio
+@pytest.mark.skipif(not Path("/proc/self/stat").exists(), reason="/proc is required")
+@pytest.mark.parametrize("with_runner", [True, False])
+async def test_execute_timeout_leaves_no_process_behind(tmp_path, monkeypatch, with_runner):
+    exe_path, _ = await Playground.compile_code(SPIN_CODE, tmp_path)
+    if not with_runner:
+        monkeypatch.setattr(JudgeCache, "runner", AsyncMock(return_value=None))
+
+    started = time.monotonic()
+    result = await Playground.execute(Playground._build_run_cmd(tmp_path, exe_path, False), cwd=tmp_path, timeout=1)
+
+    assert result.status == RunStatus.TIMEOUT
+    # 不等睡眠的子进程自然结束
+    assert time.monotonic() - started < 1 + Playground.KILL_GRACE + 2
+    pids = [int(pid) for pid in (tmp_path / "pids").read_text().split()]
+    assert len(pids) == 2
+    assert not any(_running(pid) for pid in pids)
+
+
+@pytest.mark.asyncio
+@pytest.mark.skipif(not Path("/proc/self/stat").exists(), reason="/proc is required")
+@pytest.mark.parametrize("cancel", [False, True])
+async def test_core_is_released_only_after_the_run_is_gone(tmp_path, monkeypatch, cancel):
+    exe_path, _ = await Playground.compile_code(SPIN_CODE, tmp_path)
+    pids_file = tmp_path / "pids"
+    original = JudgeCorePool.acquire
+    alive_at_release = []
+
+    @asynccontextmanager
+    async def recording():
+        async with original() as cpu:
+            try:
+                yield cpu
+            finally:
+                pids = [int(pid) for pid in pids_file.read_text().split()]
+                alive_at_release.append([_running(pid) for pid in pids])
+
+    monkeypatch.setattr(JudgeCorePool, "acquire", recording)
+    task = asyncio.create_task(
+        Playground.execute(Playground._build_run_cmd(tmp_path, exe_path, False), cwd=tmp_path, timeout=1)
+    )
+    if cancel:
+        while not pids_file.exists() or len(pids_file.read_text().split()) < 2:
+            await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+    else:
+        assert (await task).status == RunStatus.TIMEOUT
+
+    assert alive_at_release == [[False, False]]
+    assert JudgeCorePool.stats()["idle"] == len(JudgeCorePool.cores)
+
+
+@pytest.mark.asyncio
+async def test_judge_code_streams_generated_inputs_and_caches_expected_output():
+    generator = TestGenerator(generatorCode=GENERATOR_CODE, referenceCode=SUM_CODE, seeds=[1, 2])
+
+    result = await Playground.judge_code(
+        SUM_CODE,
+        TestSampleCreate(input=["2\n1 2\n"], expectOutput=["3"]),
+        generators=[generator],
+    )
+
+    assert result.score == 100
+    assert result.testRealOutput == ["3\n"]
+    assert (result.generatedTotal, result.generatedPassed) == (2, 2)
+    assert JudgeCache.load_expected(JudgeCache.expected_key(generator, 1)) is not None
+
+
+@pytest.mark.asyncio
+async def test_judge_code_fails_wrong_solution_on_generated_inputs():
+    generator = TestGenerator(generatorCode=GENERATOR_CODE, referenceCode=SUM_CODE, seeds=[3])
+    wrong = SUM_CODE.replace("s += x;", "s += x; if (i == 100000) s++;")
+
+    result = await Playground.judge_code(
+        wrong,
+        TestSampleCreate(input=["2\n1 2\n"], expectOutput=["3"]),
+        generators=[generator],
+    )
+
+    assert result.score == 50
+    assert (result.generatedTotal, result.generatedPassed) == (1, 0)
+
+
+@pytest.mark.asyncio
+async def test_run_code_batch_compiles_once_and_keeps_input_order(monkeypatch):
+    # 运行器只在首次运行时编译一次，不计入解法的编译次数
+    await JudgeCache.runner()
+    compile_calls = []
+    original = Playground.compile_code
+
+    async def counting_compile(code, workdir, name="main"):
+        compile_calls.append(name)
+        return await original(code, workdir, name)
+
+    monkeypatch.setattr(Playground, "compile_code", counting_compile)
+
+    outputs = await Playground.run_code_batch(SUM_CODE, ["1\n7\n", "2\n1 1\n", "3\n1 2 3\n"], CodeLanguage.C_CPP)
+
+    assert outputs == ["7\n", "2\n", "6\n"]
+    assert len(compile_calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_run_code_batch_repeats_compile_error_per_input():
+    outputs = await Playground.run_code_batch("int main( {", ["1", "2"], CodeLanguage.C_CPP)
+
+    assert len(outputs) == 2
+    assert all(output.startswith("Compile Error:") for output in outputs)
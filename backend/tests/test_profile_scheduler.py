@@ -0,0 +1,87 @@
+import asyncio
+import sys
+from pathlib import Path
+
+import pytest
+import pytest_asyncio
+
+
+BACKEND_ROOT = Path(__file__).resolve().parents[1]
+if str(BACKEND_ROOT) not in sys.path:
+    sys.path.insert(0, str(BACKEND_ROOT))
+
+
+from app.models.profile_scheduler import ProfileScheduler  # noqa: E402
+
+
+@pytest_asyncio.fixture
+async def fast_scheduler(monkeypatch):
+    monkeypatch.setattr(ProfileScheduler, "QUIET_SECONDS", 0.05)
+    monkeypatch.setattr(ProfileScheduler, "MAX_DELAY_SECONDS", 0.2)
+    yield ProfileScheduler
+    await ProfileScheduler.stop()
+
+
+class Runner:
+    def __init__(self, duration=0.0):
+        self.duration = duration
+        self.runs = 0
+        self.active = 0
+        self.peak = 0
+
+    async def __call__(self):
+        self.runs += 1
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        await asyncio.sleep(self.duration)
+        self.active -= 1
+
+
+@pytest.mark.asyncio
+async def test_burst_of_requests_runs_once_after_quiet_period(fast_scheduler):
+    runner = Runner()
+    for _ in range(5):
+        fast_scheduler.request("u1", runner)
+        await asyncio.sleep(0.01)
+
+    assert runner.runs == 0
+    await asyncio.sleep(0.1)
+
+    assert runner.runs == 1
+
+
+@pytest.mark.asyncio
+async def test_continuous_activity_runs_at_max_delay(fast_scheduler):
+    runner = Runner()
+    for _ in range(20):
+        fast_scheduler.request("u1", runner)
+        await asyncio.sleep(0.03)
+
+    # 0.6 秒内请求从未停顿超过安静时间，仍按最长延迟更新
+    assert 2 <= runner.runs <= 3
+
+
+@pytest.mark.asyncio
+async def test_requests_during_run_merge_into_one_follow_up(fast_scheduler):
+    runner = Runner(duration=0.1)
+    fast_scheduler.request("u1", runner)
+    await asyncio.sleep(0.07)
+    assert runner.active == 1
+
+    for _ in range(3):
+        fast_scheduler.request("u1", runner)
+    await asyncio.sleep(0.3)
+
+    assert runner.runs == 2
+    assert runner.peak == 1
+    assert fast_scheduler.stats()["pendingUsers"] == 0
+
+
+@pytest.mark.asyncio
+async def test_users_are_debounced_independently(fast_scheduler):
+    first, second = Runner(), Runner()
+    fast_scheduler.request("u1", first)
+    fast_scheduler.request("u2", second)
+    await asyncio.sleep(0.1)
+
+    assert (first.runs, second.runs) == (1, 1)
@@ -0,0 +1,125 @@
+import shutil
+import sys
+from pathlib import Path
+from unittest.mock import AsyncMock
+
+import pytest
+
+
+BACKEND_ROOT = Path(__file__).resolve().parents[1]
+if str(BACKEND_ROOT) not in sys.path:
+    sys.path.insert(0, str(BACKEND_ROOT))
+
+
+from app.models.ai import AIAnalysisGenerator  # noqa: E402
+from app.models.playground import Playground  # noqa: E402
+from app.models.profiler import ComplexityProfiler  # noqa: E402
+from app.schemas.assignment import Complexity  # noqa: E402
+from app.utils.complexity import fit_growth  # noqa: E402
+
+
+SIZES = [1_000, 2_000, 4_000, 8_000, 16_000, 32_000]
+
+
+@pytest.mark.parametrize(
+    ("expected", "f"),
+    [
+        ("O(n)", lambda n: 3 + 0.002 * n),
+        ("O(n^2)", lambda n: 5 + 1e-6 * n * n),
+        ("O(n^3)", lambda n: 1e-11 * n ** 3),
+    ],
+)
+def test_fit_growth_recognizes_standard_classes(expected, f):
+    assert fit_growth(SIZES, [f(n) for n in SIZES]) == expected
+
+
+def test_fit_growth_treats_flat_noisy_data_as_constant():
+    values = [12.0, 12.4, 11.8, 12.2, 12.1, 11.9]
+
+    assert fit_growth(SIZES, values, noise_floor=1.0) == "O(1)"
+
+
+def test_fit_growth_requires_three_points():
+    assert fit_growth([1_000, 2_000], [1.0, 2.0]) is None
+
+
+@pytest.mark.asyncio
+async def test_gen_complexity_falls_back_to_ai_without_generator(monkeypatch):
+    mocked = AsyncMock(return_value="O(n log n)\nO(n)")
+    monkeypatch.setattr("app.models.ai.AI.get_response", mocked)
+
+    complexity = await AIAnalysisGenerator.genComplexity("```cpp\nint main(){}\n```")
+
+    assert complexity == Complexity(time="O(n log n)", space="O(n)")
+
+
+@pytest.mark.asyncio
+async def test_gen_complexity_prefers_measured_result(monkeypatch):
+    mocked_ai = AsyncMock()
+    monkeypatch.setattr("app.models.ai.AI.get_response", mocked_ai)
+    monkeypatch.setattr(
+        "app.models.ai.ComplexityProfiler.profile",
+        AsyncMock(return_value=Complexity(time="O(n^2)", space="O(n)")),
+    )
+
+    complexity = await AIAnalysisGenerator.genComplexity("int main(){}", input_generator=lambda n: str(n))
+
+    assert complexity == Complexity(time="O(n^2)", space="O(n)")
+    mocked_ai.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+@pytest.mark.slow
+@pytest.mark.skipif(shutil.which("g++") is None, reason="g++ is required")
+async def test_profiler_measures_quadratic_solution(monkeypatch):
+    # 测试环境没有 firejail，直接运行
+    monkeypatch.setattr(Playground, "_check_sandbox", AsyncMock(return_value=(False, None)))
+    code = """
+#include <cstdio>
+#include <vector>
+int main() {
+    int n; scanf("%d", &n);
+    std::vector<int> a(n);
+    for (int i = 0; i < n; i++) scanf("%d", &a[i]);
+    long long s = 0;
+    for (int i = 0; i < n; i++)
+        for (int j = 0; j < n; j++)
+            s += (a[i] ^ a[j]) & 7;
+    printf("%lld\\n", s);
+}
+"""
+
+    complexity = await ComplexityProfiler.profile(
+        code,
+        lambda n: f"{n}\n" + " ".join(str(i) for i in range(n)),
+        sizes=[4_000, 8_000, 12_000, 16_000, 24_000, 32_000],
+    )
+
+    assert complexity is not None
+    assert complexity.time == "O(n^2)"
+
+
+@pytest.mark.asyncio
+@pytest.mark.skipif(shutil.which("g++") is None, reason="g++ is required")
+async def test_profiler_measures_linear_memory(monkeypatch):
+    monkeypatch.setattr(Playground, "_check_sandbox", AsyncMock(return_value=(False, None)))
+    code = """
+#include <cstdio>
+#include <vector>
+int main() {
+    int n; scanf("%d", &n);
+    std::vector<int> a(n);
+    for (int i = 0; i < n; i++) a[i] = i * 7;
+    long long s = 0;
+    for (int i = 0; i < n; i += 1000) s += a[i];
+    printf("%lld\\n", s);
+}
+"""
+
+    # 远小于测试进程自身的 RSS，内存必须按程序自身计量才能看出增长
+    complexity = await ComplexityProfiler.profile(
+        code, lambda n: f"{n}\n", sizes=[250_000, 500_000, 1_000_000, 2_000_000, 4_000_000],
+    )
+
+    assert complexity is not None
+    assert complexity.space == "O(n)"
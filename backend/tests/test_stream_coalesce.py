@@ -0,0 +1,92 @@
+import asyncio
+import json
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+
+BACKEND_ROOT = Path(__file__).resolve().parents[1]
+if str(BACKEND_ROOT) not in sys.path:
+    sys.path.insert(0, str(BACKEND_ROOT))
+
+
+from app.models.ai import AI, AIAnalysisGenerator  # noqa: E402
+from app.utils.ai import coalesce_chunks  # noqa: E402
+
+
+async def burst(chunks):
+    for chunk in chunks:
+        yield chunk
+
+
+@pytest.mark.asyncio
+async def test_flushes_when_buffer_reaches_max_bytes():
+    stats = {}
+    frames = [f async for f in coalesce_chunks(burst(["x" * 100] * 10), 10, 250, stats)]
+
+    assert frames == ["x" * 300] * 3 + ["x" * 100]
+    assert stats == {"chunks": 10, "frames": 4, "bytes": 1000}
+
+
+@pytest.mark.asyncio
+async def test_flushes_on_interval_while_upstream_is_idle():
+    async def slow():
+        yield "a"
+        await asyncio.sleep(0.3)
+        yield "b"
+
+    start = time.monotonic()
+    received = []
+    async for frame in coalesce_chunks(slow(), 0.02, 1024):
+        received.append((frame, time.monotonic() - start))
+
+    assert [frame for frame, _ in received] == ["a", "b"]
+    # 第一块不必等到上游下一块到达
+    assert received[0][1] < 0.2
+
+
+@pytest.mark.asyncio
+async def test_zero_interval_emits_every_chunk():
+    frames = [f async for f in coalesce_chunks(burst(["a", "b", "c"]), 0, 1024)]
+
+    assert frames == ["a", "b", "c"]
+
+
+@pytest.mark.asyncio
+async def test_early_exit_closes_upstream():
+    closed = asyncio.Event()
+
+    async def endless():
+        try:
+            while True:
+                yield "x"
+                await asyncio.sleep(0.001)
+        finally:
+            closed.set()
+
+    stream = coalesce_chunks(endless(), 10, 1)
+    assert await stream.__anext__() == "x"
+    await stream.aclose()
+
+    assert closed.is_set()
+
+
+@pytest.mark.asyncio
+async def test_analysis_stream_records_frame_stats(monkeypatch):
+    async def fake_stream(messages, **kwargs):
+        for token in ["解", "法", "一", "\n---\n", "解", "法", "二"]:
+            yield token
+
+    monkeypatch.setattr(AI, "get_response_stream", fake_stream)
+    before = AIAnalysisGenerator.frameStats()
+
+    frames = [f async for f in AIAnalysisGenerator._coalesced(AI.get_response_stream([]), "knowledge")]
+
+    stats = AIAnalysisGenerator.frameStats()
+    assert "".join(frames) == "解法一\n---\n解法二"
+    assert stats["streams"] == before["streams"] + 1
+    assert stats["recent"][-1]["chunks"] == 7
+    assert stats["recent"][-1]["frames"] == len(frames) < 7
+    json.dumps(stats)
@@ -0,0 +1,141 @@
+import asyncio
+import json
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+
+import pytest
+
+
+BACKEND_ROOT = Path(__file__).resolve().parents[1]
+if str(BACKEND_ROOT) not in sys.path:
+    sys.path.insert(0, str(BACKEND_ROOT))
+
+
+from app.constants.user import UserMatrixAI  # noqa: E402
+from app.database import add_missing_columns  # noqa: E402
+from app.models.ai import AIAnalysisGenerator  # noqa: E402
+from app.models.assignment import Assignment, AssignmentSubmission  # noqa: E402
+from app.models.user import User  # noqa: E402
+
+
+CALL_DELAY = 0.05
+
+
+class ProfileCalls(list):
+    peak = 0
+
+
+@pytest.fixture
+def profile_calls(monkeypatch):
+    calls = ProfileCalls()
+    active = 0
+
+    async def fake_call(kind, previous, submission_str):
+        nonlocal active
+        calls.append((kind, previous, submission_str))
+        active += 1
+        calls.peak = max(calls.peak, active)
+        await asyncio.sleep(CALL_DELAY)
+        active -= 1
+        return f"{kind}-{len(calls)}"
+
+    async def fake_code_style(previous, submission_str):
+        return await fake_call("style", previous, submission_str)
+
+    async def fake_knowledge(previous, submission_str):
+        return await fake_call("knowledge", previous, submission_str)
+
+    monkeypatch.setattr(AIAnalysisGenerator, "genUserCodeStyle", fake_code_style)
+    monkeypatch.setattr(AIAnalysisGenerator, "genUserKnowledgeStatus", fake_knowledge)
+    return calls
+
+
+async def submit(sub_id, assign_id, code, student_id=UserMatrixAI.username):
+    await AssignmentSubmission.create(
+        id=sub_id, assignment_id=assign_id, student_id=student_id,
+        sample_real_output="[]", submit_code=json.dumps([{"fileName": "main.cpp", "content": code}]),
+    )
+
+
+@pytest.mark.asyncio
+async def test_profile_only_sends_new_submissions(db, profile_calls):
+    await User.create(username=UserMatrixAI.username)
+    await Assignment.create(id="a1", title="两数之和", description="d", type="program")
+    await Assignment.create(id="a2", title="排序", description="d", type="program")
+    await submit("s1", "a1", "code-one")
+
+    await AIAnalysisGenerator.genUserProfile()
+
+    # 两份总结并发生成
+    assert profile_calls.peak == 2
+    assert all("code-one" in c[2] for c in profile_calls)
+    user = await User.get(username=UserMatrixAI.username)
+    assert user.profile_watermark is not None
+
+    profile_calls.clear()
+    await AIAnalysisGenerator.genUserProfile()
+    assert profile_calls == []
+
+    await submit("s2", "a2", "code-two")
+    await AIAnalysisGenerator.genUserProfile()
+
+    assert len(profile_calls) == 2
+    for kind, previous, submission_str in profile_calls:
+        assert "code-two" in submission_str and "code-one" not in submission_str
+        assert previous == (user.code_style if kind == "style" else user.knowledge_status)
+
+
+@pytest.mark.asyncio
+async def test_resubmission_is_picked_up_again(db, profile_calls):
+    await User.create(username=UserMatrixAI.username)
+    await Assignment.create(id="a1", title="两数之和", description="d", type="program")
+    await submit("s1", "a1", "first-try")
+    await AIAnalysisGenerator.genUserProfile()
+    profile_calls.clear()
+
+    submission = await AssignmentSubmission.get(id="s1")
+    submission.submit_code = json.dumps([{"fileName": "main.cpp", "content": "second-try"}])
+    await submission.save()
+    await AIAnalysisGenerator.genUserProfile()
+
+    assert len(profile_calls) == 2
+    assert all("second-try" in c[2] for c in profile_calls)
+
+
+@pytest.mark.asyncio
+async def test_profile_is_keyed_by_user(db, profile_calls):
+    await User.create(username=UserMatrixAI.username)
+    await User.create(username="alice")
+    await Assignment.create(id="a1", title="两数之和", description="d", type="program")
+    await Assignment.create(id="a2", title="排序", description="d", type="program")
+    await submit("s1", "a1", "default-code")
+    await submit("s2", "a2", "alice-code", student_id="alice")
+
+    await AIAnalysisGenerator.genUserProfile("alice")
+
+    assert len(profile_calls) == 2
+    assert all("alice-code" in c[2] and "default-code" not in c[2] for c in profile_calls)
+    assert (await User.get(username="alice")).profile_watermark is not None
+    assert (await User.get(username=UserMatrixAI.username)).profile_watermark is None
+
+
+@pytest.mark.asyncio
+async def test_startup_adds_profile_watermark_to_an_existing_users_table(db):
+    conn = User._meta.db
+    table = User._meta.db_table
+    # 模拟加列之前部署的旧表
+    await conn.execute_script(f'DROP TABLE "{table}"')
+    await conn.execute_script(
+        f'CREATE TABLE "{table}" ("id" INTEGER PRIMARY KEY AUTOINCREMENT, "username" VARCHAR(50) NOT NULL, '
+        '"code_style" TEXT, "knowledge_status" TEXT)'
+    )
+    await conn.execute_script(f'INSERT INTO "{table}" ("username") VALUES (\'{UserMatrixAI.username}\')')
+
+    await add_missing_columns()
+    await add_missing_columns()
+
+    user = await User.get(username=UserMatrixAI.username)
+    assert user.profile_watermark is None
+    user.profile_watermark = datetime.now(timezone.utc)
+    await user.save()